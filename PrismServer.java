@@ -0,0 +1,80 @@
+import java.io.BufferedReader;
+import java.io.File;
+import java.io.InputStreamReader;
+import java.io.PrintStream;
+
+import parser.ast.ModulesFile;
+import parser.ast.PropertiesFile;
+import prism.Prism;
+import prism.PrismDevNullLog;
+import prism.Result;
+
+/**
+ * Long-lived PRISM process used by prism_server.py.
+ *
+ * Reads one request per line on stdin and answers with one line prefixed by "@@VP4 " on stdout:
+ *   PING                          -> @@VP4 PONG
+ *   CHECK\t<model file>\t<prop>   -> @@VP4 OK\t<result>  |  @@VP4 ERROR\t<message>
+ *   QUIT                          -> exits
+ * The last loaded model is kept (and only rebuilt when the file changes), so several
+ * properties checked against the same model share one model build.
+ */
+public class PrismServer {
+    private static final String PREFIX = "@@VP4 ";
+
+    public static void main(String[] args) throws Exception {
+        // PRISM itself may print to stdout, so keep the protocol channel separate
+        PrintStream out = System.out;
+        System.setOut(System.err);
+
+        Prism prism = new Prism(new PrismDevNullLog());
+        prism.initialise();
+
+        BufferedReader in = new BufferedReader(new InputStreamReader(System.in));
+        ModulesFile modulesFile = null;
+        String loadedPath = null;
+        long loadedModified = -1;
+        long loadedLength = -1;
+
+        String line;
+        while ((line = in.readLine()) != null) {
+            line = line.trim();
+            if (line.isEmpty()) continue;
+            if (line.equals("QUIT")) break;
+            if (line.equals("PING")) {
+                out.println(PREFIX + "PONG");
+                out.flush();
+                continue;
+            }
+
+            String[] parts = line.split("\t", 3);
+            if (parts.length != 3 || !parts[0].equals("CHECK")) {
+                out.println(PREFIX + "ERROR\tMalformed request");
+                out.flush();
+                continue;
+            }
+
+            try {
+                File model = new File(parts[1]);
+                long modified = model.lastModified();
+                long length = model.length();
+                if (modulesFile == null || !parts[1].equals(loadedPath) || modified != loadedModified || length != loadedLength) {
+                    modulesFile = prism.parseModelFile(model);
+                    prism.loadPRISMModel(modulesFile);
+                    loadedPath = parts[1];
+                    loadedModified = modified;
+                    loadedLength = length;
+                }
+                PropertiesFile propertiesFile = prism.parsePropertiesString(modulesFile, parts[2]);
+                Result result = prism.modelCheck(propertiesFile, propertiesFile.getPropertyObject(0));
+                out.println(PREFIX + "OK\t" + result.getResult());
+            } catch (Exception e) {
+                modulesFile = null;
+                String message = String.valueOf(e.getMessage()).replace('\n', ' ').replace('\t', ' ');
+                out.println(PREFIX + "ERROR\t" + message);
+            }
+            out.flush();
+        }
+        prism.closeDown();
+    }
+}
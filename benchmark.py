@@ -0,0 +1,349 @@
+import contextlib
+import io
+import json
+import os
+import re
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from fire import Fire
+
+import native
+from translation import ground_problem
+
+# Scaling benchmarks over generated instances. Every family has a generator that writes
+# a domain directory (domain.pddl, problem.pddl, policies, properties) for a size
+# parameter; `run` compiles and verifies each instance in its own process and records
+#   ground_s, mdp_s, dtmc_s, verify_s   wall time of each stage (dtmc/verify per policy)
+#   peak_rss_mb, prism_rss_mb           peak RSS of the translator and of PRISM
+#   atoms, actions                      number of ground atoms and ground actions
+#   mdp_bytes, dtmc_bytes               size of the generated .prism files
+#   states, transitions, results        size of each DTMC's reachable model and the results
+# `compare` flags regressions of a results file against a stored baseline.
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+FACES = [f"v{i}" for i in range(1, 7)]
+
+
+def _write(path: str, text: str):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def _copy_data(source: str, out_dir: str, names: List[str]):
+    for name in names:
+        shutil.copyfile(os.path.join(DATA_DIR, source, name), os.path.join(out_dir, name))
+
+
+def maze(size: int, out_dir: str):
+    # size x size grid; every other column is a wall with one gap, alternating between the
+    # bottom and the top row, so that the agent has to snake from (1,1) to (size,size)
+    _copy_data("deterministic/maze", out_dir, ["domain.pddl", "unbiased_walk.json", "monotonic.json", "goal.pctl"])
+    positions = [f"p{i}" for i in range(1, size + 1)]
+    grid = [f"(inc {a} {b}) (dec {b} {a})" for a, b in zip(positions, positions[1:])]
+    walls = []
+    for x in range(2, size, 2):
+        gap = size if x % 4 == 2 else 1
+        walls.extend(f"(wall p{x} p{y})" for y in range(1, size + 1) if y != gap)
+    _write(os.path.join(out_dir, "problem.pddl"), f"""(define (problem maze-{size}x{size})
+  (:domain maze)
+  (:objects agent1 - agent {' '.join(positions)} - position)
+  (:init
+    {' '.join(grid)}
+    {' '.join(walls)}
+    (at agent1 p1 p1)
+  )
+  (:goal (at agent1 p{size} p{size}))
+)
+""")
+
+
+def _tower(blocks: List[str]) -> str:
+    return " ".join(f"(on {a} {b})" for a, b in zip(blocks, blocks[1:]))
+
+
+def blocksworld(size: int, out_dir: str):
+    # size blocks on the table, to be stacked into one tower
+    _copy_data("deterministic/blocksworld", out_dir, ["domain.pddl", "all_on_table.json", "stack.json", "goal.pctl", "picks_up.pctl"])
+    blocks = [f"b{i}" for i in range(1, size + 1)]
+    _write(os.path.join(out_dir, "problem.pddl"), f"""(define (problem blocks-{size})
+  (:domain blocks)
+  (:objects {' '.join(blocks)} - block)
+  (:init
+    {' '.join(f'(ontable {b}) (clear {b})' for b in blocks)}
+    (handempty)
+  )
+  (:goal (and {_tower(blocks)}))
+)
+""")
+
+
+def exploding_blocksworld(size: int, out_dir: str):
+    _copy_data("stochastic/exploding-blocksworld", out_dir,
+               ["domain.pddl", "all_on_table.json", "risky_stack.json", "goal.pctl", "picks_up.pctl", "safe_table.pctl"])
+    blocks = [f"b{i}" for i in range(1, size + 1)]
+    _write(os.path.join(out_dir, "problem.pddl"), f"""(define (problem exploding-stack-{size})
+  (:domain exploding-blocksworld)
+  (:objects {' '.join(blocks)} - block)
+  (:init
+    {' '.join(f'(ontable {b}) (clear {b})' for b in blocks)}
+    (handempty)
+    {' '.join(f'(no-destroyed {b}) (no-detonated {b})' for b in blocks)}
+    (no-destroyed-table)
+  )
+  (:goal (and {_tower(blocks)} (no-destroyed-table)))
+)
+""")
+
+
+def yahtzee(size: int, out_dir: str):
+    # size dice, each rolled once and optionally picked up and rolled a second time; the
+    # goal is that all dice show the same face. Generated rather than taken from
+    # data/stochastic/yahtzee, whose `d1=1` atoms are not valid PRISM identifiers
+    dice = [f"d{i}" for i in range(1, size + 1)]
+    roll = " ".join(f"1/6 (shows ?d {v})" for v in FACES)
+    _write(os.path.join(out_dir, "domain.pddl"), f"""(define (domain yahtzee)
+  (:requirements :typing :probabilistic-effects :negative-preconditions)
+  (:types die face)
+  (:constants {' '.join(FACES)} - face)
+  (:predicates (rolled ?d - die) (done ?d - die) (shows ?d - die ?v - face))
+
+  (:action roll
+   :parameters (?d - die)
+   :precondition (not (rolled ?d))
+   :effect (and (rolled ?d) (probabilistic {roll}))
+  )
+
+  (:action pick-up
+   :parameters (?d - die ?v - face)
+   :precondition (and (rolled ?d) (not (done ?d)) (shows ?d ?v))
+   :effect (and (done ?d) (not (rolled ?d)) (not (shows ?d ?v)))
+  )
+
+  (:action keep
+   :parameters (?d - die)
+   :precondition (and (rolled ?d) (not (done ?d)))
+   :effect (done ?d)
+  )
+)
+""")
+    goal = " ".join("(and " + " ".join(f"(shows {d} {v})" for d in dice) + ")" for v in FACES)
+    _write(os.path.join(out_dir, "problem.pddl"), f"""(define (problem yahtzee-{size})
+  (:domain yahtzee)
+  (:objects {' '.join(dice)} - die)
+  (:init)
+  (:goal (or {goal}))
+)
+""")
+    roll_rule = {"name": "roll", "if": "!rolled_1", "then": "roll_1"}
+    policies = {
+        "keep_all.json": [roll_rule, {"name": "keep", "if": "rolled_1 & !done_1", "then": "keep_1"}],
+        "keep_sixes.json": [
+            roll_rule,
+            {"name": "keep-six", "if": "rolled_1 & !done_1 & shows_1_v6", "then": "keep_1"},
+            {"name": "reroll", "if": "rolled_1 & !done_1 & shows_1_2 & !shows_1_v6", "then": "pick-up_1_2"},
+        ],
+    }
+    for name, policy in policies.items():
+        _write(os.path.join(out_dir, name), json.dumps(policy, indent=2))
+    _write(os.path.join(out_dir, "goal.pctl"), 'F "goal"')
+
+
+FAMILIES = {
+    "maze": (maze, [4, 8, 16, 24, 32]),
+    "blocksworld": (blocksworld, [2, 3, 4, 5]),
+    "exploding-blocksworld": (exploding_blocksworld, [2, 3, 4, 5]),
+    "yahtzee": (yahtzee, [1, 2, 3, 4]),
+}
+
+
+def _peak_rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+def _verify_prism(dtmc_file: str, properties: Dict[str, str], work_dir: str, timeout: Optional[float]) -> dict:
+    props_file = os.path.join(work_dir, "properties.props")
+    _write(props_file, "\n".join(f"P=? [{p}]" for p in properties.values()) + "\n")
+    output = subprocess.run(["prism", dtmc_file, props_file], capture_output=True, text=True, timeout=timeout)
+    states = re.search(r"^States:\s+(\d+)", output.stdout, re.M)
+    transitions = re.search(r"^Transitions:\s+(\d+)", output.stdout, re.M)
+    values = re.findall(r"^Result:\s+(\S+)", output.stdout, re.M)
+    if output.returncode != 0 or len(values) != len(properties):
+        values = ["Error"] * len(properties)
+    return {
+        "states": int(states.group(1)) if states else None,
+        "transitions": int(transitions.group(1)) if transitions else None,
+        "results": dict(zip(properties, values)),
+    }
+
+
+def _verify_native(dtmc_file: str, properties: Dict[str, str]) -> dict:
+    try:
+        dtmc = native.load(dtmc_file)
+    except native.NativeUnsupported as e:
+        return {"states": None, "transitions": None, "results": {key: f"Error ({e})" for key in properties}}
+    results = {}
+    for key, property in properties.items():
+        try:
+            results[key] = native.check(dtmc, property)
+        except native.NativeUnsupported as e:
+            results[key] = f"Error ({e})"
+    return {"states": dtmc.n, "transitions": len(dtmc.probs), "results": results}
+
+
+def instance(instance_dir: str, engine: str = "native", timeout: Optional[float] = None):
+    """Compiles and verifies one generated instance and prints its metrics as JSON."""
+    files = sorted(os.listdir(instance_dir))
+    policy_files = [f for f in files if f.endswith(".json")]
+    properties = {}
+    for property_file in (f for f in files if f.endswith(".pctl")):
+        with open(os.path.join(instance_dir, property_file), "r") as f:
+            properties[property_file] = f.read().strip()
+
+    record = {}
+    # The translator's progress output would mix with the JSON record
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        translator = ground_problem(os.path.join(instance_dir, "domain.pddl"), os.path.join(instance_dir, "problem.pddl"))
+        record["ground_s"] = time.perf_counter() - start
+        record["atoms"] = len(translator.ground_atoms)
+        record["actions"] = len(translator.ground_actions)
+
+        mdp_file = os.path.join(instance_dir, "mdp.prism")
+        start = time.perf_counter()
+        with open(mdp_file, "w") as f:
+            translator.write_mdp(f)
+        record["mdp_s"] = time.perf_counter() - start
+        record["mdp_bytes"] = os.path.getsize(mdp_file)
+
+        record["policies"] = {}
+        for policy_file in policy_files:
+            with open(os.path.join(instance_dir, policy_file), "r") as f:
+                policy = json.load(f)
+            dtmc_file = os.path.join(instance_dir, f"{os.path.splitext(policy_file)[0]}.prism")
+            start = time.perf_counter()
+            with open(dtmc_file, "w") as f:
+                translator.write_dtmc(f, policy)
+            metrics = {"dtmc_s": time.perf_counter() - start, "dtmc_bytes": os.path.getsize(dtmc_file)}
+
+            start = time.perf_counter()
+            if engine == "prism":
+                metrics.update(_verify_prism(dtmc_file, properties, instance_dir, timeout))
+            else:
+                metrics.update(_verify_native(dtmc_file, properties))
+            metrics["verify_s"] = time.perf_counter() - start
+            record["policies"][policy_file] = metrics
+
+    record["peak_rss_mb"] = _peak_rss_mb(resource.RUSAGE_SELF)
+    if engine == "prism":
+        record["prism_rss_mb"] = _peak_rss_mb(resource.RUSAGE_CHILDREN)
+    print(json.dumps(record))
+
+
+def run(
+    families: str = ",".join(FAMILIES),
+    sizes: Optional[str] = None,
+    out: str = "tmp/benchmark.json",
+    work_dir: str = "tmp/benchmark/",
+    engine: str = "native",
+    timeout: float = 600,
+):
+    """Runs every family at increasing sizes (`sizes` overrides the defaults, e.g. "2,4,8")
+    and writes the metrics of every instance to `out`. An instance that fails or times out
+    is recorded with an error and ends its family, as larger sizes would fail too."""
+    if isinstance(families, (list, tuple)): families = ",".join(families)
+    if isinstance(sizes, (list, tuple)): sizes = ",".join(map(str, sizes))
+    if engine == "prism" and shutil.which("prism") is None:
+        print("`prism` is not on the PATH, using the native engine.")
+        engine = "native"
+
+    instances = {}
+    for family in str(families).split(","):
+        generate, default_sizes = FAMILIES[family]
+        for size in ([int(s) for s in str(sizes).split(",")] if sizes else default_sizes):
+            name = f"{family}-{size}"
+            instance_dir = os.path.join(work_dir, name)
+            shutil.rmtree(instance_dir, ignore_errors=True)
+            os.makedirs(instance_dir)
+            generate(size, instance_dir)
+
+            print(f"Running {name}...")
+            command = [sys.executable, os.path.abspath(__file__), "instance", instance_dir, f"--engine={engine}", f"--timeout={timeout}"]
+            start = time.perf_counter()
+            try:
+                output = subprocess.run(command, capture_output=True, text=True, timeout=timeout)
+                if output.returncode != 0:
+                    record = {"error": output.stderr.strip().splitlines()[-1] if output.stderr.strip() else f"exit {output.returncode}"}
+                else:
+                    record = json.loads(output.stdout.strip().splitlines()[-1])
+            except subprocess.TimeoutExpired:
+                record = {"error": f"timeout after {timeout}s"}
+            record["total_s"] = time.perf_counter() - start
+            instances[name] = record
+
+            if "error" in record:
+                print(f"  {record['error']}")
+                break
+            states = [m["states"] for m in record["policies"].values() if m.get("states") is not None]
+            print(f"  {record['atoms']} atoms, {record['actions']} actions, up to {max(states, default=0)} states, "
+                  f"{record['total_s']:.2f}s, {record['peak_rss_mb']} MB")
+
+    os.makedirs(os.path.dirname(out) or ".", exist_ok=True)
+    with open(out, "w") as f:
+        json.dump({"engine": engine, "instances": instances}, f, indent=2)
+    print(f"Wrote {out}")
+
+
+def _flatten(record: dict, prefix: str = "") -> Dict[str, object]:
+    flat = {}
+    for key, value in record.items():
+        if isinstance(value, dict): flat.update(_flatten(value, f"{prefix}{key}/"))
+        else: flat[f"{prefix}{key}"] = value
+    return flat
+
+
+def compare(baseline: str, current: str = "tmp/benchmark.json", tolerance: float = 0.25, min_seconds: float = 0.05, min_mb: float = 5):
+    """Flags every metric of `current` that regressed against `baseline`: times and memory
+    more than `tolerance` (relative) and `min_seconds`/`min_mb` (absolute) above it, any
+    growth of the ground model or the generated files, and any changed result. Exits with
+    status 1 if there is a regression."""
+    with open(baseline, "r") as f:
+        old = _flatten(json.load(f)["instances"])
+    with open(current, "r") as f:
+        new = _flatten(json.load(f)["instances"])
+
+    regressions = []
+    for key in sorted(old.keys() & new.keys()):
+        before, after = old[key], new[key]
+        metric = key.rsplit("/", 1)[-1]
+        if metric.endswith("_s") or metric.endswith("_mb"):
+            slack = min_seconds if metric.endswith("_s") else min_mb
+            if after > before * (1 + tolerance) and after - before > slack:
+                regressions.append(f"{key}: {before:.2f} -> {after:.2f} (+{(after / before - 1) * 100 if before else float('inf'):.0f}%)")
+        elif metric in ("atoms", "actions", "states", "transitions") or metric.endswith("_bytes"):
+            if before is not None and after is not None and after > before:
+                regressions.append(f"{key}: {before} -> {after}")
+        elif before != after:
+            regressions.append(f"{key}: {before} -> {after}")
+
+    instances = lambda flat: {key.split("/", 1)[0] for key in flat}
+    for name in sorted(instances(old) - instances(new)):
+        regressions.append(f"{name}: missing")
+    for key in sorted(k for k in new if k.endswith("/error") and k not in old):
+        regressions.append(f"{key}: {new[key]}")
+
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print(f"{len(regressions)} regressions against `{baseline}`")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    Fire({"run": run, "instance": instance, "compare": compare})
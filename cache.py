@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+
+# Content-addressed on-disk cache:
+#   <cache_dir>/models/<key>/{mdp,dtmc}.prism (and model.npz)   key = hash(domain, problem, policy, translator sources[, properties])
+#   <cache_dir>/results/<key>.json              key = hash(model, property, PRISM options)
+# Entries are refreshed on every hit and the least recently used ones are evicted
+# once the cache grows past max_bytes.
+
+CACHE_DIR = os.environ.get("VP4_CACHE_DIR", "tmp/cache")
+MAX_CACHE_BYTES = int(os.environ.get("VP4_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+
+TRANSLATOR_SOURCES = ["translation.py", "expressions.py", "invariants.py", "ground_model.py", "symmetries.py"]
+
+
+def content_hash(*parts) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        data = part if isinstance(part, bytes) else str(part).encode("utf-8")
+        # Length-prefix every part so that ("ab", "c") and ("a", "bc") differ
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def file_hash(path: str) -> str:
+    with open(path, "rb") as f:
+        return content_hash(f.read())
+
+
+def translator_version() -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    return content_hash(*[file_hash(os.path.join(here, source)) for source in TRANSLATOR_SOURCES])
+
+
+def model_key(domain_file: str, problem_file: str, policy_file: str, properties: Optional[List[str]] = None) -> str:
+    # Models reduced to the cone of influence of some properties are keyed by those properties too
+    reduction = [] if properties is None else ["coi", *sorted(p.strip() for p in properties)]
+    return content_hash("model", file_hash(domain_file), file_hash(problem_file), file_hash(policy_file), translator_version(), *reduction)
+
+
+def result_key(model_file: str, property: str, options: Iterable[str] = ()) -> str:
+    return content_hash("result", file_hash(model_file), property.strip(), *options)
+
+
+class Cache:
+    def __init__(self, cache_dir: str = CACHE_DIR, max_bytes: int = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.models_dir = os.path.join(cache_dir, "models")
+        self.results_dir = os.path.join(cache_dir, "results")
+
+    def _touch(self, path: str):
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def get_model(self, key: str, names: List[str], dest_dir: str) -> bool:
+        entry = os.path.join(self.models_dir, key)
+        if not all(os.path.exists(os.path.join(entry, name)) for name in names):
+            return False
+        os.makedirs(dest_dir, exist_ok=True)
+        for name in names:
+            shutil.copyfile(os.path.join(entry, name), os.path.join(dest_dir, name))
+        self._touch(entry)
+        return True
+
+    def put_model(self, key: str, src_dir: str, names: List[str]):
+        os.makedirs(self.models_dir, exist_ok=True)
+        # Stage and rename so concurrent jobs never observe a half-written entry
+        staging = tempfile.mkdtemp(dir=self.models_dir, prefix=".staging_")
+        for name in names:
+            shutil.copyfile(os.path.join(src_dir, name), os.path.join(staging, name))
+        entry = os.path.join(self.models_dir, key)
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # The entry exists already: stored by another job first, or earlier with fewer files
+            # (e.g. without model.npz), so add the files it lacks
+            for name in names:
+                if os.path.isdir(entry) and not os.path.exists(os.path.join(entry, name)):
+                    os.replace(os.path.join(staging, name), os.path.join(entry, name))
+            shutil.rmtree(staging, ignore_errors=True)
+        self.evict()
+
+    def get_result(self, key: str) -> Optional[str]:
+        path = os.path.join(self.results_dir, f"{key}.json")
+        try:
+            with open(path, "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        self._touch(path)
+        return record["result"]
+
+    def put_result(self, key: str, result: str, **info):
+        os.makedirs(self.results_dir, exist_ok=True)
+        fd, staging = tempfile.mkstemp(dir=self.results_dir, prefix=".staging_")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"result": result, **info}, f)
+        os.replace(staging, os.path.join(self.results_dir, f"{key}.json"))
+        self.evict()
+
+    def _entries(self) -> List[Tuple[float, int, str]]:
+        entries = []
+        for parent in (self.models_dir, self.results_dir):
+            if not os.path.isdir(parent): continue
+            for name in os.listdir(parent):
+                if name.startswith(".staging_"): continue
+                path = os.path.join(parent, name)
+                try:
+                    if os.path.isdir(path):
+                        size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+                    else:
+                        size = os.path.getsize(path)
+                    entries.append((os.path.getmtime(path), size, path))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes: break
+            if os.path.isdir(path): shutil.rmtree(path, ignore_errors=True)
+            else:
+                try: os.remove(path)
+                except OSError: pass
+            total -= size
+
+    def clear(self):
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
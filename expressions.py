@@ -0,0 +1,147 @@
+import re
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+# Boolean guard expressions (as written in policy files and emitted PRISM guards)
+# are kept as nested tuples:
+#   ("const", bool) | ("atom", name) | ("not", e) | ("and", (e, ...)) | ("or", (e, ...))
+Expr = Tuple
+
+TRUE: Expr = ("const", True)
+FALSE: Expr = ("const", False)
+
+_TOKEN_RE = re.compile(r"\s*(\(|\)|&|\||!|[A-Za-z0-9_\-]+)")
+
+
+def tokenize(text: str) -> Iterator[str]:
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise ValueError(f"Unexpected character in guard `{text}` at position {pos}")
+        yield match.group(1)
+        pos = match.end()
+
+
+def parse(text: str) -> Expr:
+    tokens = list(tokenize(text))
+    pos = 0
+
+    def peek() -> Optional[str]:
+        return tokens[pos] if pos < len(tokens) else None
+
+    def take() -> str:
+        nonlocal pos
+        tok = peek()
+        if tok is None:
+            raise ValueError(f"Unexpected end of guard `{text}`")
+        pos += 1
+        return tok
+
+    def parse_or() -> Expr:
+        parts = [parse_and()]
+        while peek() == '|':
+            take()
+            parts.append(parse_and())
+        return parts[0] if len(parts) == 1 else ("or", tuple(parts))
+
+    def parse_and() -> Expr:
+        parts = [parse_unary()]
+        while peek() == '&':
+            take()
+            parts.append(parse_unary())
+        return parts[0] if len(parts) == 1 else ("and", tuple(parts))
+
+    def parse_unary() -> Expr:
+        tok = take()
+        if tok == '!':
+            return ("not", parse_unary())
+        if tok == '(':
+            inner = parse_or()
+            if take() != ')':
+                raise ValueError(f"Unbalanced parentheses in guard `{text}`")
+            return inner
+        if tok in ('&', '|', ')'):
+            raise ValueError(f"Unexpected `{tok}` in guard `{text}`")
+        if tok == 'true': return TRUE
+        if tok == 'false': return FALSE
+        return ("atom", tok.replace('-', '_'))
+
+    expr = parse_or()
+    if peek() is not None:
+        raise ValueError(f"Trailing input `{peek()}` in guard `{text}`")
+    return expr
+
+
+def substitute(expr: Expr, fold: Callable[[str], Optional[Union[bool, Expr]]]) -> Expr:
+    """Replace atoms for which `fold` returns a value (a bool or another expression)."""
+    kind = expr[0]
+    if kind == "atom":
+        val = fold(expr[1])
+        if val is None: return expr
+        if isinstance(val, bool): return TRUE if val else FALSE
+        return val
+    if kind == "not":
+        return ("not", substitute(expr[1], fold))
+    if kind in ("and", "or"):
+        return (kind, tuple(substitute(e, fold) for e in expr[1]))
+    return expr
+
+
+def simplify(expr: Expr) -> Expr:
+    kind = expr[0]
+    if kind == "not":
+        inner = simplify(expr[1])
+        if inner[0] == "const": return ("const", not inner[1])
+        if inner[0] == "not": return inner[1]
+        return ("not", inner)
+    if kind in ("and", "or"):
+        absorbing = (kind == "or")
+        parts = []
+        for e in expr[1]:
+            e = simplify(e)
+            if e[0] == "const":
+                if e[1] == absorbing: return e
+                continue
+            if e[0] == kind: parts.extend(e[1])
+            else: parts.append(e)
+        if not parts: return ("const", not absorbing)
+        return parts[0] if len(parts) == 1 else (kind, tuple(parts))
+    return expr
+
+
+def atoms(expr: Expr, acc: Optional[Set[str]] = None) -> Set[str]:
+    if acc is None: acc = set()
+    kind = expr[0]
+    if kind == "atom": acc.add(expr[1])
+    elif kind == "not": atoms(expr[1], acc)
+    elif kind in ("and", "or"):
+        for e in expr[1]: atoms(e, acc)
+    return acc
+
+
+def required_atoms(expr: Expr) -> List[str]:
+    """Atoms that must hold whenever `expr` holds (its positive top-level conjuncts)."""
+    parts = expr[1] if expr[0] == "and" else (expr,)
+    return [e[1] for e in parts if e[0] == "atom"]
+
+
+def evaluate(expr: Expr, state: Dict[str, bool]) -> bool:
+    kind = expr[0]
+    if kind == "const": return expr[1]
+    if kind == "atom": return state.get(expr[1], False)
+    if kind == "not": return not evaluate(expr[1], state)
+    if kind == "and": return all(evaluate(e, state) for e in expr[1])
+    return any(evaluate(e, state) for e in expr[1])
+
+
+def to_prism(expr: Expr) -> str:
+    kind = expr[0]
+    if kind == "const": return "true" if expr[1] else "false"
+    if kind == "atom": return expr[1]
+    if kind == "not":
+        inner = expr[1]
+        if inner[0] in ("atom", "const"): return f"!{to_prism(inner)}"
+        return f"!({to_prism(inner)})"
+    sep = " & " if kind == "and" else " | "
+    return sep.join(f"({to_prism(e)})" if e[0] in ("and", "or") else to_prism(e) for e in expr[1])
@@ -0,0 +1,160 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import expressions
+
+# Integer-indexed ground model. Atoms are interned to ids 0..n-1 and everything else
+# refers to them through flat NumPy arrays, with `*_ptr` offsets delimiting each
+# action's (outcome's, command's) slice as in CSR matrices:
+#   guards    literal lists: id for a positive, ~id for a negative literal. Guards that
+#             are not conjunctions of literals keep their PRISM text in `*_guard_text`
+#             (empty otherwise)
+#   outcomes  probability, add ids and delete ids; conditional assignments keep their
+#             PRISM value text in `cond_values`
+#   policy    the commands of a policy's DTMC: rule index (-1 for the probabilistic
+#             setup command), ground action id and guard (including `!not_setup`)
+# A model is saved to and loaded from one .npz file, without pickling.
+
+PROBLEM_FIELDS = [
+    "atoms", "init", "goal",
+    "action_names", "action_schemas", "guard_ptr", "guard_lits", "guard_text",
+    "outcome_ptr", "outcome_probs", "add_ptr", "adds", "del_ptr", "dels",
+    "cond_ptr", "cond_atoms", "cond_values",
+]
+POLICY_FIELDS = [
+    "rule_names", "command_rules", "command_actions",
+    "command_guard_ptr", "command_guard_lits", "command_guard_text",
+]
+
+
+def _literals(expr: expressions.Expr, atom_ids: Dict[str, int]) -> Optional[List[int]]:
+    parts = expr[1] if expr[0] == "and" else (expr,)
+    lits = []
+    for e in parts:
+        if e == expressions.TRUE: continue
+        if e[0] == "atom" and e[1] in atom_ids: lits.append(atom_ids[e[1]])
+        elif e[0] == "not" and e[1][0] == "atom" and e[1][1] in atom_ids: lits.append(~atom_ids[e[1][1]])
+        else: return None
+    return lits
+
+
+def _flatten(expr: expressions.Expr) -> expressions.Expr:
+    # Nested conjunctions, e.g. "((a & b)) & !not_setup", become one flat conjunction
+    if expr[0] != "and": return expr
+    parts = []
+    for e in expr[1]:
+        e = _flatten(e)
+        if e[0] == "and": parts.extend(e[1])
+        else: parts.append(e)
+    return ("and", tuple(parts))
+
+
+def _csr(lists: List[List]) -> Tuple[np.ndarray, List]:
+    ptr = np.zeros(len(lists) + 1, dtype=np.int64)
+    ptr[1:] = np.cumsum([len(l) for l in lists])
+    return ptr, [x for l in lists for x in l]
+
+
+def _strings(values: List[str]) -> np.ndarray:
+    return np.array(values, dtype=str) if values else np.zeros(0, dtype="<U1")
+
+
+class GroundModel:
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        self.arrays = arrays
+        for name, value in arrays.items():
+            setattr(self, name, value)
+        self.atom_ids = {atom: i for i, atom in enumerate(self.atoms.tolist())}
+
+    @property
+    def has_policy(self) -> bool:
+        return all(name in self.arrays for name in POLICY_FIELDS)
+
+    @classmethod
+    def from_translator(cls, translator, policy: Optional[dict] = None) -> "GroundModel":
+        """Interns the grounded problem of a `PPDDLToPRISM` (after `ground_actions_logic`) and,
+        if given, the commands of `policy`'s DTMC."""
+        atoms = translator.ground_atoms
+        atom_ids = {atom: i for i, atom in enumerate(atoms)}
+        arrays = {
+            "atoms": _strings(atoms),
+            "init": np.array([atom in translator.init_facts for atom in atoms], dtype=bool),
+            "goal": np.array(translator.goal_expression()),
+        }
+
+        guard_lists, guard_text = [], []
+        outcomes, adds, dels, conds, cond_values = [], [], [], [], []
+        for action in translator.ground_actions:
+            lits = _literals(_flatten(expressions.parse(action["guard"])), atom_ids)
+            guard_lists.append(lits or [])
+            guard_text.append("" if lits is not None else action["guard"])
+            outcomes.append(action["updates"])
+            for _, state_map in action["updates"]:
+                adds.append([atom_ids[a] for a, v in state_map.items() if v == "true"])
+                dels.append([atom_ids[a] for a, v in state_map.items() if v == "false"])
+                cond = [(atom_ids[a], v) for a, v in state_map.items() if v not in ("true", "false")]
+                conds.append([a for a, _ in cond])
+                cond_values.extend(v for _, v in cond)
+
+        arrays["action_names"] = _strings([action["name"] for action in translator.ground_actions])
+        arrays["action_schemas"] = _strings([action["schema"] for action in translator.ground_actions])
+        arrays["guard_ptr"], lits = _csr(guard_lists)
+        arrays["guard_lits"] = np.array(lits, dtype=np.int32)
+        arrays["guard_text"] = _strings(guard_text)
+        arrays["outcome_ptr"], _ = _csr(outcomes)
+        arrays["outcome_probs"] = np.array([p for updates in outcomes for p, _ in updates], dtype=np.float64)
+        for ptr_name, ids_name, lists in (("add_ptr", "adds", adds), ("del_ptr", "dels", dels), ("cond_ptr", "cond_atoms", conds)):
+            arrays[ptr_name], ids = _csr(lists)
+            arrays[ids_name] = np.array(ids, dtype=np.int32)
+        arrays["cond_values"] = _strings(cond_values)
+
+        if policy is not None:
+            arrays.update(cls._compile_policy(translator, policy, atom_ids))
+        return cls(arrays)
+
+    @staticmethod
+    def _compile_policy(translator, policy: dict, atom_ids: Dict[str, int]) -> Dict[str, np.ndarray]:
+        action_ids = {action["name"]: i for i, action in enumerate(translator.ground_actions)}
+        setup = ("not", ("atom", "not_setup")) if "not_setup" in atom_ids else expressions.TRUE
+        rules, actions, guard_lists, guard_text = [], [], [], []
+        for rule_index, _, guard, action in translator.policy_commands(policy):
+            if rule_index >= 0:
+                guard = expressions.simplify(("and", (guard, setup)))
+            lits = _literals(_flatten(guard), atom_ids)
+            rules.append(rule_index)
+            actions.append(action_ids[action])
+            guard_lists.append(lits or [])
+            guard_text.append("" if lits is not None else expressions.to_prism(guard))
+        ptr, lits = _csr(guard_lists)
+        return {
+            "rule_names": _strings([rule["name"] for rule in policy]),
+            "command_rules": np.array(rules, dtype=np.int32),
+            "command_actions": np.array(actions, dtype=np.int32),
+            "command_guard_ptr": ptr,
+            "command_guard_lits": np.array(lits, dtype=np.int32),
+            "command_guard_text": _strings(guard_text),
+        }
+
+    def save(self, path: str, compress: bool = False):
+        (np.savez_compressed if compress else np.savez)(path, **self.arrays)
+
+    @classmethod
+    def load(cls, path: str) -> "GroundModel":
+        with np.load(path, allow_pickle=False) as data:
+            missing = [name for name in PROBLEM_FIELDS if name not in data.files]
+            if missing:
+                raise ValueError(f"`{path}` is not a ground model (missing {', '.join(missing)})")
+            return cls({name: data[name] for name in data.files})
+
+    def literals(self, i: int, policy: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """(positive ids, negative ids) of action (or, with `policy`, command) `i`'s guard."""
+        ptr, lits = (self.command_guard_ptr, self.command_guard_lits) if policy else (self.guard_ptr, self.guard_lits)
+        lits = lits[ptr[i]:ptr[i + 1]]
+        return lits[lits >= 0], ~lits[lits < 0]
+
+    def outcomes(self, action: int) -> List[Tuple[float, np.ndarray, np.ndarray]]:
+        """(probability, add ids, delete ids) of every outcome of ground action `action`."""
+        return [(float(self.outcome_probs[o]), self.adds[self.add_ptr[o]:self.add_ptr[o + 1]],
+                 self.dels[self.del_ptr[o]:self.del_ptr[o + 1]])
+                for o in range(self.outcome_ptr[action], self.outcome_ptr[action + 1])]
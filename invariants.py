@@ -0,0 +1,126 @@
+from collections import defaultdict, deque
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+# Mutex groups (sets of atoms of which at most one is true in every reachable state),
+# found by invariant synthesis in the style of Fast Downward's translator.
+#
+# A candidate invariant is a set of parts (predicate, positions): the arguments at
+# `positions` are the invariant's parameters and the others are counted, e.g.
+# {("at", (0,))} claims that every robot is at at most one (x, y). For each binding of
+# the parameters (an instance), at most one atom may be true. A candidate holds if
+#   - the initial state has at most one true atom per instance, and
+#   - every action outcome that adds an atom of an instance adds no other atom of it and
+#     deletes (or re-adds) an atom of the instance that the action's precondition requires.
+# A candidate failing the second test is extended by the predicate of an atom the action
+# requires and deletes, e.g. {holding(*)} -> {holding(*), handempty}.
+# The test runs over the ground actions, so the invariants hold in the reachable model.
+
+Part = Tuple[str, Tuple[int, ...]]
+Candidate = FrozenSet[Part]
+
+MAX_PARTS = 6
+MAX_CANDIDATES = 2000
+
+
+def find_mutex_groups(atoms: Dict[str, Tuple[str, Tuple[str, ...]]], init: Set[str],
+                      actions: List[Tuple[Iterable[str], List[Dict[str, str]]]]) -> List[List[str]]:
+    """Disjoint mutex groups of at least two atoms.
+
+    `atoms` maps each state atom to its (predicate, arguments) and `actions` lists, per
+    ground action, the atoms its precondition requires and its outcomes as {atom: value}
+    assignments, where value is "true", "false" or anything else for conditional effects."""
+    by_pred = defaultdict(list)
+    for atom, (pred, _) in atoms.items():
+        by_pred[pred].append(atom)
+
+    adds = defaultdict(list)
+    unstable = set()
+    for a, (_, outcomes) in enumerate(actions):
+        for o, assignments in enumerate(outcomes):
+            for atom, value in assignments.items():
+                if atom not in atoms: continue
+                if value == "true": adds[atoms[atom][0]].append((a, o, atom))
+                elif value != "false": unstable.add(atoms[atom][0])
+
+    def check(candidate: Candidate):
+        # None if the candidate is an invariant, "fatal" if no extension can fix it,
+        # else the unbalanced add as (action, outcome, instance)
+        positions = dict(candidate)
+
+        def instance(atom: str) -> Optional[Tuple[str, ...]]:
+            pred, args = atoms[atom]
+            if pred not in positions: return None
+            return tuple(args[i] for i in positions[pred])
+
+        seen = set()
+        for atom in init:
+            if atom not in atoms or atoms[atom][0] not in positions: continue
+            inst = instance(atom)
+            if inst in seen: return "fatal"
+            seen.add(inst)
+
+        for pred in positions:
+            for a, o, atom in adds[pred]:
+                required, outcomes = actions[a]
+                assignments = outcomes[o]
+                inst = instance(atom)
+                for other, value in assignments.items():
+                    if value == "true" and other != atom and other in atoms and instance(other) == inst:
+                        return "fatal"
+                if not any(h in atoms and instance(h) == inst and (h == atom or assignments.get(h) == "false")
+                           for h in required):
+                    return (a, o, inst)
+        return None
+
+    def extensions(candidate: Candidate, failure) -> List[Candidate]:
+        a, o, inst = failure
+        required, outcomes = actions[a]
+        preds = {pred for pred, _ in candidate}
+        result = []
+        for h in required:
+            if h not in atoms or outcomes[o].get(h) != "false": continue
+            pred, args = atoms[h]
+            if pred in preds or pred in unstable or any(v not in args for v in inst): continue
+            result.append(candidate | {(pred, tuple(args.index(v) for v in inst))})
+        return result
+
+    queue = deque()
+    for pred in sorted(by_pred):
+        if pred in unstable: continue
+        arity = len(atoms[by_pred[pred][0]][1])
+        for mask in range(2 ** arity):
+            fixed = tuple(i for i in range(arity) if mask >> i & 1)
+            if arity == 0 or len(fixed) < arity:
+                queue.append(frozenset({(pred, fixed)}))
+
+    invariants = []
+    seen = set(queue)
+    explored = 0
+    while queue and explored < MAX_CANDIDATES:
+        candidate = queue.popleft()
+        explored += 1
+        failure = check(candidate)
+        if failure is None:
+            invariants.append(candidate)
+        elif failure != "fatal" and len(candidate) < MAX_PARTS:
+            for extended in extensions(candidate, failure):
+                if extended not in seen:
+                    seen.add(extended)
+                    queue.append(extended)
+
+    instances = defaultdict(set)
+    for candidate in invariants:
+        for pred, positions in candidate:
+            for atom in by_pred[pred]:
+                args = atoms[atom][1]
+                instances[(candidate, tuple(args[i] for i in positions))].add(atom)
+
+    # Largest groups first; what remains of a group after removing used atoms is still a group
+    groups = []
+    used = set()
+    for group in sorted((sorted(g) for g in instances.values()), key=lambda g: (-len(g), g)):
+        group = [atom for atom in group if atom not in used]
+        if len(group) < 2: continue
+        groups.append(group)
+        used.update(group)
+    return groups
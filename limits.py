@@ -0,0 +1,141 @@
+import contextlib
+import multiprocessing
+import resource
+import signal
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+# Per-job wall-clock and memory limits. `run_limited` runs a job in a child process and
+# enforces both limits from the parent: the child is killed at the deadline, and a child
+# that dies under its memory cap is reported as OOM. The parent is never capped, and a job
+# stuck in C code (e.g. a solver whose allocation failed) cannot outlive its deadline.
+# Inside the child, `job_limits` caps the address space and arms a SIGALRM that raises
+# JobTimeout wherever the job is in Python, so it can stop cleanly and report what it
+# finished. PRISM runs in its own JVM: it is started without the cap and bounded with
+# -javamaxmem/-cuddmaxmem instead (see run.prism_memory_args), and its subprocess gets the
+# job's remaining time as timeout.
+
+TIMEOUT = "Timeout"
+OOM = "OOM"
+
+
+class JobTimeout(Exception):
+    """The job ran past its wall-clock limit."""
+
+
+class JobOutOfMemory(Exception):
+    """The job (or PRISM) ran out of its memory limit."""
+
+
+_deadline: Optional[float] = None
+_memory: Optional[int] = None
+
+# How long the parent waits past the deadline for the child to stop on its own
+GRACE_SECONDS = 5.0
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the active job's deadline, None without a time limit."""
+    if _deadline is None:
+        return None
+    return max(_deadline - time.monotonic(), 0.01)
+
+
+def memory_limit() -> Optional[int]:
+    """The active job's memory limit in MB, None without one."""
+    return _memory
+
+
+def _raise_timeout(signum, frame):
+    raise JobTimeout()
+
+
+@contextlib.contextmanager
+def job_limits(timeout: Optional[float] = None, memory: Optional[int] = None) -> Iterator[None]:
+    global _deadline, _memory
+    # Signals can only be handled on the main thread; elsewhere only PRISM gets the deadline
+    use_alarm = timeout is not None and hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread()
+    if use_alarm:
+        previous_handler = signal.signal(signal.SIGALRM, _raise_timeout)
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    if memory is not None:
+        soft, hard = resource.getrlimit(resource.RLIMIT_AS)
+        cap = memory * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_AS, (cap if hard == resource.RLIM_INFINITY else min(cap, hard), hard))
+    _deadline = time.monotonic() + timeout if timeout is not None else None
+    _memory = memory
+    try:
+        yield
+    except MemoryError:
+        raise JobOutOfMemory()
+    finally:
+        _deadline = _memory = None
+        if use_alarm:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            signal.signal(signal.SIGALRM, previous_handler)
+        if memory is not None:
+            resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+
+
+def uncapped():
+    # preexec_fn for subprocesses: lift the job's address-space cap again (the JVM reserves
+    # far more address space than it uses)
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    resource.setrlimit(resource.RLIMIT_AS, (hard, hard))
+
+
+def _child(function: Callable, timeout: Optional[float], memory: Optional[int], conn):
+    try:
+        with job_limits(timeout, memory):
+            result = function(lambda item: conn.send(("progress", item)))
+        conn.send(("done", result))
+    except JobTimeout:
+        conn.send(("error", TIMEOUT))
+    except JobOutOfMemory:
+        conn.send(("error", OOM))
+    finally:
+        conn.close()
+
+
+def run_limited(function: Callable[[Callable[[Any], None]], Any], timeout: Optional[float] = None, memory: Optional[int] = None,
+                on_progress: Optional[Callable[[Any], None]] = None) -> Any:
+    """Runs `function(progress)` in a child process limited to `timeout` seconds and an address
+    space of `memory` MB, and returns its result. Whatever the child passes to `progress` is
+    handed to `on_progress` in the parent as it comes in, so the parent keeps it even if the
+    child is killed. Raises JobTimeout or JobOutOfMemory when a limit is hit."""
+    if timeout is None and memory is None:
+        return function(on_progress or (lambda item: None))
+    context = multiprocessing.get_context("fork")
+    receiver, sender = context.Pipe(duplex=False)
+    child = context.Process(target=_child, args=(function, timeout, memory, sender))
+    child.start()
+    sender.close()
+    deadline = time.monotonic() + timeout + GRACE_SECONDS if timeout is not None else None
+    try:
+        while True:
+            wait = None if deadline is None else deadline - time.monotonic()
+            if wait is not None and wait <= 0:
+                raise JobTimeout()
+            if not receiver.poll(wait):
+                continue
+            try:
+                kind, item = receiver.recv()
+            except EOFError:
+                # The child died without a word: killed for its memory (or crashed in C code)
+                child.join()
+                if memory is not None:
+                    raise JobOutOfMemory()
+                raise RuntimeError(f"Job process exited with status {child.exitcode}")
+            if kind == "progress":
+                if on_progress is not None:
+                    on_progress(item)
+            elif kind == "done":
+                return item
+            else:
+                raise JobTimeout() if item == TIMEOUT else JobOutOfMemory()
+    finally:
+        receiver.close()
+        if child.is_alive():
+            child.kill()
+        child.join()
@@ -1,10 +1,132 @@
+import contextlib
+import json
 import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from fire import Fire
-from run import run_single
+from typing import Optional
+import limits
+import profiling
+import results as result_files
+from run import compile_policies, verify_properties, verify_property
+
+# Phases summed into each column of the profile table
+PROFILE_COLUMNS = {
+    "ground": ["preprocess", "parse", "ground_state_variables", "ground_actions_logic"],
+    "generate": ["generate_mdp", "generate_dtmc", "write_ir", "symmetries"],
+    "check": ["prism", "prism_server", "native", "smc", "export_explicit"],
+}
+
+def run_job(domain_dir, problem_file, policy_files, property_files, work_dir="tmp/", batch=True, server=False, use_cache=True, write_mdp=True, engine="prism", coi=False, save_ir=False, profile=False, timeout=None, memory=None, prism_engine=None, symmetry=False, log_file=None):
+    # Returns the results per policy and property, and with `profile` the job's profile record (see profiling.py).
+    # A job that runs out of `timeout` seconds or `memory` MB reports Timeout or OOM for every result it did not get to.
+    # With `log_file`, every policy's results are appended to that results log as soon as they are in (see results.py).
+    job_results = {policy_file: {} for policy_file in policy_files}
+    options = result_files.job_options(engine, prism_engine, coi, symmetry, timeout, memory)
+    def log(policy_file, results, **timing):
+        if log_file:
+            result_files.append_log(log_file, [result_files.log_record(domain_dir, problem_file, policy_file, property_file, result, options, **timing) for property_file, result in results.items()])
+
+    def job(progress):
+        # Runs in the job's own process when it is limited (see limits.run_limited); every policy's
+        # results are passed back as soon as they are in, so a killed job keeps what it finished
+        with (profiling.profile(domain_dir=domain_dir, problem=problem_file) if profile else contextlib.nullcontext()) as profiled:
+            check_job(domain_dir, problem_file, policy_files, property_files, {policy_file: {} for policy_file in policy_files}, work_dir, batch, server, use_cache, write_mdp, engine, coi, save_ir, prism_engine, symmetry,
+                      lambda policy_file, results, **timing: progress((policy_file, dict(results), timing)))
+        return profiled.record() if profile else None
+
+    def collect(item):
+        policy_file, results, timing = item
+        job_results[policy_file].update(results)
+        log(policy_file, results, **timing)
+
+    record = None
+    try:
+        record = limits.run_limited(job, timeout, memory, collect)
+    except (limits.JobTimeout, limits.JobOutOfMemory) as e:
+        status = limits.TIMEOUT if isinstance(e, limits.JobTimeout) else limits.OOM
+        print(f"Job for problem `{problem_file}` stopped: {status}")
+        for policy_file in policy_files:
+            unfinished = {property_file: status for property_file in property_files if property_file not in job_results[policy_file]}
+            job_results[policy_file].update(unfinished)
+            log(policy_file, unfinished)
+        record = {"status": status} if profile else None
+    if record is not None:
+        record["results"] = job_results
+    return job_results, record
+
+def check_job(domain_dir, problem_file, policy_files, property_files, job_results, work_dir="tmp/", batch=True, server=False, use_cache=True, write_mdp=True, engine="prism", coi=False, save_ir=False, prism_engine=None, symmetry=False, log=None):
+    # Ground the problem once, generate every policy's DTMC from it, then check every property against each DTMC.
+    # Results are filled into job_results as they come in, and passed to `log` with their timings per policy.
+    start = time.monotonic()
+    property_paths = [os.path.join(domain_dir, property_file) for property_file in property_files]
+    properties = None
+    if coi:
+        properties = []
+        for path in property_paths:
+            with open(path, "r") as f:
+                properties.append(f.read().strip())
+    # The smc engine simulates the ground model, so it needs the IR
+    policy_dirs = compile_policies(domain_dir, problem_file, policy_files, work_dir, use_cache, write_mdp, properties, save_ir or engine == "smc", symmetry)
+    compile_seconds = time.monotonic() - start
+
+    for policy_file in policy_files:
+        print(f'RUNNING FOR: {problem_file} {policy_file} {property_files}')
+        start = time.monotonic()
+        policy_dir = policy_dirs[policy_file]
+        dtmc_file = os.path.join(policy_dir, "dtmc.prism")
+        if batch:
+            results = verify_properties(dtmc_file, property_paths, policy_dir, server, use_cache, engine, prism_engine, symmetry)
+        else:
+            results = {path: verify_property(dtmc_file, path, policy_dir, server, use_cache, engine, prism_engine, symmetry) for path in property_paths}
+
+        for property_file, path in zip(property_files, property_paths):
+            res = results[path]
+            print(f"Result for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`: ")
+            print(res)
+            job_results[policy_file][property_file] = res if res is not None else "Error"
+        if log is not None:
+            log(policy_file, job_results[policy_file], compile_seconds=compile_seconds, check_seconds=time.monotonic() - start)
+
+def run_job_isolated(domain_dir, problem_file, policy_files, property_files, batch=True, server=False, use_cache=True, write_mdp=True, engine="prism", coi=False, save_ir=False, profile=False, timeout=None, memory=None, prism_engine=None, symmetry=False, log_file=None, scratch_dir="tmp/"):
+    # Each parallel job gets its own scratch directory so PRISM inputs and outputs never collide.
+    # It is removed when the job ends, however it ends.
+    os.makedirs(scratch_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix="job_", dir=scratch_dir)
+    try:
+        return run_job(domain_dir, problem_file, policy_files, property_files, work_dir, batch, server, use_cache, write_mdp, engine, coi, save_ir, profile, timeout, memory, prism_engine, symmetry, log_file)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
 
 def main(
     domain_dir: str = "data/deterministic/blocksworld",
+    jobs: int = 1,
+    batch: bool = True,
+    server: bool = False,
+    no_cache: bool = False,
+    skip_mdp: bool = False,
+    engine: str = "prism",
+    coi: bool = False,
+    save_ir: bool = False,
+    profile: bool = False,
+    timeout: Optional[float] = None,
+    memory: Optional[int] = None,
+    prism_engine: Optional[str] = None,
+    symmetry: bool = False,
+    shard: Optional[str] = None,
+    shard_dir: str = "tmp/shards/",
+    log: str = result_files.LOG_FILE,
+    resume: bool = False,
+    scratch_dir: Optional[str] = None,
 ):
+    # With `shard` ("i/N"), only runs the i-th of N slices of the (problem, policy, property)
+    # jobs and writes their results to `shard_dir` for `python3 results.py merge` (see results.py).
+    # Every finished job is appended to the results log `log`, which the tables are printed from.
+    # With `resume`, jobs that already have a result in the log under the same options are skipped.
+    # With `scratch_dir` (e.g. the RAM-backed /dev/shm), every job generates and checks its models in
+    # its own directory there, which is removed afterwards; otherwise sequential jobs use tmp/.
     problem_files = [f for f in os.listdir(domain_dir) if f.endswith(".pddl")]
     if "domain.pddl" in problem_files:
         problem_files.remove("domain.pddl")
@@ -21,58 +143,88 @@ def main(
     print(policy_files)
     print(property_files)
 
-    results = {}
+    options = result_files.job_options(engine, prism_engine, coi, symmetry, timeout, memory)
+    all_jobs = result_files.job_list(problem_files, policy_files, property_files)
+    pending = all_jobs
+    if shard is not None:
+        index, count = result_files.parse_shard(shard)
+        pending = result_files.partition(all_jobs, index, count)
+        print(f"Shard {index}/{count}: {len(pending)} of {len(all_jobs)} jobs")
+        problem_files = [problem_file for problem_file in problem_files if any(job[0] == problem_file for job in pending)]
+    if resume:
+        finished = result_files.finished_jobs(result_files.read_log(log, domain_dir, options))
+        print(f"Resuming: {sum(job in finished for job in pending)} of {len(pending)} jobs already in `{log}`")
+        pending = [job for job in pending if job not in finished]
 
-    for policy_file in policy_files:
-        results[policy_file] = {}
-        for problem_file in problem_files:
-            results[policy_file][problem_file] = {}
-            compile = True
-            for property_file in property_files:
-                print(f'RUNNING FOR: {problem_file} {policy_file} {property_file}')
-                res = run_single(domain_dir, problem_file, policy_file, property_file, compile_dtmc=compile)
-                results[policy_file][problem_file][property_file] = res if res is not None else "Error"
-                compile = False
-    
-    # --- Formatting Logic ---
-    print(f"\nResults for domain `{domain_dir}`")
-    
-    # Calculate column widths
-    # 1. First column width = max length of problem filenames (or at least 15 chars)
-    if problem_files:
-        col0_width = max(len(p) for p in problem_files) + 4
+    # One run per problem: the grounded problem is shared by all policies
+    runs = result_files.group_jobs(pending)
+    profiles = {}
+    if jobs <= 1:
+        for problem_file, run_policies, run_properties in runs:
+            if scratch_dir is not None:
+                _, profiles[problem_file] = run_job_isolated(domain_dir, problem_file, run_policies, run_properties, batch, server, not no_cache, not skip_mdp, engine, coi, save_ir, profile, timeout, memory, prism_engine, symmetry, log, scratch_dir)
+                continue
+            _, profiles[problem_file] = run_job(domain_dir, problem_file, run_policies, run_properties, batch=batch, server=server, use_cache=not no_cache, write_mdp=not skip_mdp, engine=engine, coi=coi, save_ir=save_ir, profile=profile, timeout=timeout, memory=memory, prism_engine=prism_engine, symmetry=symmetry, log_file=log)
     else:
-        col0_width = 15
-        
-    # 2. Property column widths = max length of property name (or at least 10 chars)
-    # We strip .pctl for the header name
-    prop_names = [p.split('.pctl')[0] for p in property_files]
-    prop_widths = [max(len(n), 10) + 2 for n in prop_names]
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                pool.submit(run_job_isolated, domain_dir, problem_file, run_policies, run_properties, batch, server, not no_cache, not skip_mdp, engine, coi, save_ir, profile, timeout, memory, prism_engine, symmetry, log, scratch_dir or "tmp/"): (problem_file, run_policies, run_properties)
+                for problem_file, run_policies, run_properties in runs
+            }
+            for future in as_completed(futures):
+                problem_file, run_policies, run_properties = futures[future]
+                try:
+                    _, profiles[problem_file] = future.result()
+                except Exception as e:
+                    print(f"Job {problem_file} failed: {e}")
+                    profiles[problem_file] = None
+                    result_files.append_log(log, [result_files.log_record(domain_dir, problem_file, policy_file, property_file, "Error", options) for policy_file in run_policies for property_file in run_properties])
 
-    for policy_file in policy_files:
-        print(f"Policy `{policy_file}`:")
-        
-        # Print Header Row
-        # Empty block for the "Problem" column
-        print(f"{'':<{col0_width}}", end="")
-        for i, name in enumerate(prop_names):
-            print(f"| {name:<{prop_widths[i]}}", end="")
-        print("|")
-        
-        # Print Separator Line
-        total_width = col0_width + sum(w + 2 for w in prop_widths) + len(prop_widths) # rough estimate
-        print("-" * total_width)
-
-        # Print Data Rows
-        for problem_file in problem_files:
-            print(f"{problem_file:<{col0_width}}", end="")
-            for i, property_file in enumerate(property_files):
-                val = str(results[policy_file][problem_file][property_file])
-                print(f"| {val:<{prop_widths[i]}}", end="")
-            print("|")
-        print("\n")
+    results = result_files.logged_results(result_files.read_log(log, domain_dir, options))
+    if shard is not None:
+        result_files.write_shard(result_files.shard_file(shard_dir, domain_dir, index, count), domain_dir, index, count, all_jobs, options, results)
+
+    result_files.print_tables(domain_dir, problem_files, policy_files, property_files, results)
 
+    if profile:
+        print_profile(domain_dir, problem_files, profiles)
     return
 
+def print_profile(domain_dir, problem_files, profiles, profile_file="tmp/profile.jsonl"):
+    # One JSON record per job, plus a table of where each job spent its time
+    os.makedirs(os.path.dirname(profile_file), exist_ok=True)
+    with open(profile_file, "a") as f:
+        for problem_file in problem_files:
+            if profiles.get(problem_file) is not None:
+                f.write(json.dumps(profiles[problem_file]) + "\n")
+    print(f"Profile for domain `{domain_dir}` (seconds; records appended to `{profile_file}`)")
+
+    headers = [*PROFILE_COLUMNS, "prism build", "prism check", "states", "peak MB"]
+    col0_width = max([len(p) for p in problem_files] + [11]) + 4
+    print(f"{'':<{col0_width}}" + "".join(f"| {h:<12}" for h in headers) + "|")
+    print("-" * (col0_width + 14 * len(headers) + 1))
+    for problem_file in problem_files:
+        if problem_file not in profiles:
+            # All of the problem's jobs were already logged (`resume`) or belong to another shard
+            print(f"{problem_file:<{col0_width}}| skipped")
+            continue
+        record = profiles[problem_file]
+        if record is None:
+            print(f"{problem_file:<{col0_width}}| Error")
+            continue
+        if "status" in record:
+            # The job was stopped by its limits before it could report its phases
+            print(f"{problem_file:<{col0_width}}| {record['status']}")
+            continue
+        totals = record["totals"]
+        checks = [entry for entry in record["phases"] if entry["phase"] in PROFILE_COLUMNS["check"]]
+        row = [f"{sum(totals.get(phase, 0.0) for phase in phases):.3f}" for phases in PROFILE_COLUMNS.values()]
+        row.append(f"{sum(entry.get('model_construction_s', 0.0) for entry in checks):.3f}")
+        row.append(f"{sum(entry.get('checking_s', 0.0) for entry in checks):.3f}")
+        row.append(str(max((entry["states"] for entry in checks if "states" in entry), default="-")))
+        row.append(str(max(record["peak_rss_mb"], record.get("prism_rss_mb", 0.0))))
+        print(f"{problem_file:<{col0_width}}" + "".join(f"| {v:<12}" for v in row) + "|")
+    print()
+
 if __name__ == "__main__":
     Fire(main)
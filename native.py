@@ -0,0 +1,547 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+try:
+    import scipy.sparse
+    import scipy.sparse.linalg
+except ImportError:
+    scipy = None
+
+# Native explicit-state DTMC backend: reads a generated DTMC file, explores the states
+# reachable from the initial state (choosing uniformly among enabled commands, as PRISM
+# does for DTMCs) and solves reachability-style path properties directly:
+#   F phi, G phi, X phi, phi U psi, and their step-bounded variants (F<=k phi, ...)
+# Anything outside this fragment raises NativeUnsupported so the caller can fall back to PRISM.
+
+MAX_STATES = 2_000_000
+
+
+class NativeUnsupported(Exception):
+    """The model or property uses a feature the native engine does not handle."""
+
+
+_TOKEN_RE = re.compile(r"""\s*(?:
+    (?P<num>\d+\.\d+(?:[eE][-+]?\d+)?|\d+(?:[eE][-+]?\d+)?)
+  | (?P<label>"[^"]*")
+  | (?P<id>[A-Za-z_][A-Za-z0-9_]*)
+  | (?P<op><=>|=>|->|<=|>=|!=|\.\.|[!&|=<>?:()+\-*/'\[\];,])
+)""", re.VERBOSE)
+
+
+def _tokenize(text: str) -> List[str]:
+    text = re.sub(r"//[^\n]*", "", text)
+    tokens, pos = [], 0
+    while True:
+        while pos < len(text) and text[pos].isspace():
+            pos += 1
+        if pos >= len(text):
+            return tokens
+        match = _TOKEN_RE.match(text, pos)
+        if not match:
+            raise NativeUnsupported(f"Unexpected input `{text[pos:pos + 20]}`")
+        tokens.append(match.group(match.lastgroup))
+        pos = match.end()
+
+
+# Expressions are parsed into tuples:
+#   ("val", v) | ("id", name) | ("label", name) | ("not", e) | ("neg", e)
+#   ("and", [e, ...]) | ("or", [e, ...]) | ("bin", op, a, b) | ("ite", c, a, b)
+class _Parser:
+    def __init__(self, tokens: List[str]):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self, offset: int = 0) -> Optional[str]:
+        pos = self.pos + offset
+        return self.tokens[pos] if pos < len(self.tokens) else None
+
+    def take(self) -> str:
+        tok = self.peek()
+        if tok is None:
+            raise NativeUnsupported("Unexpected end of input")
+        self.pos += 1
+        return tok
+
+    def expect(self, tok: str):
+        got = self.take()
+        if got != tok:
+            raise NativeUnsupported(f"Expected `{tok}`, found `{got}`")
+
+    def expr(self) -> Tuple:
+        cond = self.implies()
+        if self.peek() == '?':
+            self.take()
+            a = self.expr()
+            self.expect(':')
+            return ("ite", cond, a, self.expr())
+        return cond
+
+    def implies(self) -> Tuple:
+        left = self.iff()
+        while self.peek() == '=>':
+            self.take()
+            left = ("bin", "=>", left, self.iff())
+        return left
+
+    def iff(self) -> Tuple:
+        left = self.or_()
+        while self.peek() == '<=>':
+            self.take()
+            left = ("bin", "<=>", left, self.or_())
+        return left
+
+    def or_(self) -> Tuple:
+        parts = [self.and_()]
+        while self.peek() == '|':
+            self.take()
+            parts.append(self.and_())
+        return parts[0] if len(parts) == 1 else ("or", parts)
+
+    def and_(self) -> Tuple:
+        parts = [self.not_()]
+        while self.peek() == '&':
+            self.take()
+            parts.append(self.not_())
+        return parts[0] if len(parts) == 1 else ("and", parts)
+
+    def not_(self) -> Tuple:
+        if self.peek() == '!':
+            self.take()
+            return ("not", self.not_())
+        return self.eq()
+
+    def eq(self) -> Tuple:
+        left = self.rel()
+        while self.peek() in ('=', '!='):
+            left = ("bin", self.take(), left, self.rel())
+        return left
+
+    def rel(self) -> Tuple:
+        left = self.add()
+        while self.peek() in ('<', '<=', '>', '>='):
+            left = ("bin", self.take(), left, self.add())
+        return left
+
+    def add(self) -> Tuple:
+        left = self.mul()
+        while self.peek() in ('+', '-'):
+            left = ("bin", self.take(), left, self.mul())
+        return left
+
+    def mul(self) -> Tuple:
+        left = self.unary()
+        while self.peek() in ('*', '/'):
+            left = ("bin", self.take(), left, self.unary())
+        return left
+
+    def unary(self) -> Tuple:
+        if self.peek() == '-':
+            self.take()
+            return ("neg", self.unary())
+        return self.primary()
+
+    def primary(self) -> Tuple:
+        tok = self.take()
+        if tok == '(':
+            inner = self.expr()
+            self.expect(')')
+            return inner
+        if tok == 'true': return ("val", True)
+        if tok == 'false': return ("val", False)
+        if tok[0].isdigit():
+            return ("val", float(tok) if any(c in tok for c in ".eE") else int(tok))
+        if tok[0] == '"': return ("label", tok[1:-1])
+        if tok[0].isalpha() or tok[0] == '_':
+            if self.peek() == '(':
+                raise NativeUnsupported(f"Function `{tok}` is not supported")
+            return ("id", tok)
+        raise NativeUnsupported(f"Unexpected `{tok}`")
+
+
+_PY_OPS = {"=": "==", "!=": "!=", "<": "<", "<=": "<=", ">": ">", ">=": ">=", "+": "+", "-": "-", "*": "*", "/": "/"}
+
+
+class Model:
+    """A DTMC in the PRISM subset vp4 generates: bool/int variables, constants, formulas, labels and commands."""
+
+    def __init__(self, text: str, constants: Optional[Dict[str, Any]] = None):
+        # `constants` gives values to the model's undefined constants (like PRISM's -const)
+        self.variables: List[str] = []
+        self.init: List[Any] = []
+        self.given = dict(constants or {})
+        self.constants: Dict[str, Any] = {}
+        self.formulas: Dict[str, Tuple] = {}
+        self.labels: Dict[str, Tuple] = {}
+        self.commands: List[Tuple[Tuple, List[Tuple[Tuple, List[Tuple[str, Tuple]]]]]] = []
+        self._parse(_Parser(_tokenize(text)))
+        self.var_index = {name: i for i, name in enumerate(self.variables)}
+
+    def _parse(self, p: _Parser):
+        model_type = p.take()
+        if model_type not in ("dtmc", "probabilistic"):
+            raise NativeUnsupported(f"Model type `{model_type}` is not supported")
+        while p.peek() is not None:
+            tok = p.take()
+            if tok == "const":
+                if p.peek() in ("int", "double", "bool"): p.take()
+                name = p.take()
+                if p.peek() != '=':
+                    if name not in self.given:
+                        raise NativeUnsupported(f"Constant `{name}` has no value")
+                    self.constants[name] = self.given[name]
+                else:
+                    p.expect('=')
+                    self.constants[name] = self._evaluate(p.expr())
+                p.expect(';')
+            elif tok == "formula":
+                name = p.take()
+                p.expect('=')
+                self.formulas[name] = p.expr()
+                p.expect(';')
+            elif tok == "label":
+                name = p.take()[1:-1]
+                p.expect('=')
+                self.labels[name] = p.expr()
+                p.expect(';')
+            elif tok == "module":
+                p.take()
+                while p.peek() != "endmodule":
+                    if p.peek() == '[': self._parse_command(p)
+                    else: self._parse_variable(p)
+                p.take()
+            elif tok == "rewards":
+                while p.take() != "endrewards": pass
+            elif tok == "global":
+                self._parse_variable(p)
+            else:
+                raise NativeUnsupported(f"Unexpected `{tok}` in model")
+
+    def _parse_variable(self, p: _Parser):
+        name = p.take()
+        p.expect(':')
+        if p.peek() == "bool":
+            p.take()
+            init = False
+        else:
+            p.expect('[')
+            init = self._evaluate(p.add())
+            p.expect('..')
+            p.add()
+            p.expect(']')
+        if p.peek() == "init":
+            p.take()
+            init = self._evaluate(p.expr())
+        p.expect(';')
+        self.variables.append(name)
+        self.init.append(init)
+
+    def _parse_command(self, p: _Parser):
+        p.expect('[')
+        if p.peek() != ']': p.take()
+        p.expect(']')
+        guard = p.expr()
+        p.expect('->')
+        updates = []
+        while True:
+            # A lone update may omit its probability
+            if p.peek() == '(' and p.peek(2) == "'" or p.peek() == "true" and p.peek(1) in (';', '+'):
+                prob = ("val", 1.0)
+            else:
+                prob = p.expr()
+                p.expect(':')
+            updates.append((prob, self._parse_assignments(p)))
+            if p.peek() != '+': break
+            p.take()
+        p.expect(';')
+        self.commands.append((guard, updates))
+
+    def _parse_assignments(self, p: _Parser) -> List[Tuple[str, Tuple]]:
+        if p.peek() == "true":
+            p.take()
+            return []
+        assignments = []
+        while True:
+            p.expect('(')
+            name = p.take()
+            p.expect("'")
+            p.expect('=')
+            assignments.append((name, p.expr()))
+            p.expect(')')
+            if p.peek() != '&': return assignments
+            p.take()
+
+    def _evaluate(self, ast: Tuple) -> Any:
+        return eval(self.to_python(ast, lambda name: None), {})
+
+    def to_python(self, ast: Tuple, label=None) -> str:
+        kind = ast[0]
+        if kind == "val": return repr(ast[1])
+        if kind == "id":
+            name = ast[1]
+            if name in self.constants: return repr(self.constants[name])
+            if name in self.formulas: return f"({self.to_python(self.formulas[name], label)})"
+            if name in getattr(self, "var_index", {}): return f"s[{self.var_index[name]}]"
+            raise NativeUnsupported(f"Unknown identifier `{name}`")
+        if kind == "label":
+            if label is None:
+                raise NativeUnsupported(f"Label `{ast[1]}` used outside a property")
+            return label(ast[1])
+        if kind == "not": return f"(not {self.to_python(ast[1], label)})"
+        if kind == "neg": return f"(-{self.to_python(ast[1], label)})"
+        if kind in ("and", "or"):
+            return "(" + f" {kind} ".join(self.to_python(e, label) for e in ast[1]) + ")"
+        if kind == "ite":
+            return f"({self.to_python(ast[2], label)} if {self.to_python(ast[1], label)} else {self.to_python(ast[3], label)})"
+        _, op, a, b = ast
+        a, b = self.to_python(a, label), self.to_python(b, label)
+        if op == "=>": return f"((not {a}) or {b})"
+        if op == "<=>": return f"({a} == {b})"
+        return f"({a} {_PY_OPS[op]} {b})"
+
+
+def _compile_explorer(model: Model):
+    # One generated function returns the enabled commands of a state, and one lambda per
+    # update computes the successor (all right-hand sides read the old state)
+    lines = ["def enabled(s):", "    e = []"]
+    for i, (guard, _) in enumerate(model.commands):
+        lines.append(f"    if {model.to_python(guard)}: e.append({i})")
+    lines.append("    return e")
+    namespace = {}
+    exec("\n".join(lines), namespace)
+
+    updates = []
+    for _, command_updates in model.commands:
+        compiled = []
+        for prob, assignments in command_updates:
+            assigned = {model.var_index[name]: model.to_python(value) for name, value in assignments}
+            successor = ", ".join(assigned.get(i, f"s[{i}]") for i in range(len(model.variables)))
+            compiled.append((eval(f"lambda s: {model.to_python(prob)}"), eval(f"lambda s: ({successor},)")))
+        updates.append(compiled)
+    return namespace["enabled"], updates
+
+
+class DTMC:
+    """The reachable fragment of a model as a sparse transition matrix (state 0 is the initial state)."""
+
+    def __init__(self, model: Model, max_states: int = MAX_STATES):
+        self.model = model
+        enabled, updates = _compile_explorer(model)
+
+        init = tuple(model.init)
+        index = {init: 0}
+        self.states = [init]
+        rows, cols, probs, deadlocks = [], [], [], []
+        i = 0
+        while i < len(self.states):
+            s = self.states[i]
+            commands = enabled(s)
+            successors = {}
+            if not commands:
+                # Deadlocks become self-loops, as PRISM does by default
+                deadlocks.append(i)
+                successors[s] = 1.0
+            share = 1.0 / len(commands) if commands else 0.0
+            for c in commands:
+                for prob, update in updates[c]:
+                    t = update(s)
+                    successors[t] = successors.get(t, 0.0) + share * prob(s)
+            for t, p in successors.items():
+                j = index.get(t)
+                if j is None:
+                    j = index[t] = len(self.states)
+                    self.states.append(t)
+                    if j >= max_states:
+                        raise NativeUnsupported(f"More than {max_states} reachable states")
+                rows.append(i)
+                cols.append(j)
+                probs.append(p)
+            i += 1
+
+        self.n = len(self.states)
+        self.rows = np.array(rows, dtype=np.int64)
+        self.cols = np.array(cols, dtype=np.int64)
+        self.probs = np.array(probs, dtype=np.float64)
+        self.deadlock = np.zeros(self.n, dtype=bool)
+        self.deadlock[deadlocks] = True
+
+    def satisfying(self, ast: Tuple) -> np.ndarray:
+        def label(name: str) -> str:
+            if name == "init": return "(k == 0)"
+            if name == "deadlock": return "bool(deadlock[k])"
+            if name in self.model.labels: return f"({self.model.to_python(self.model.labels[name], label)})"
+            raise NativeUnsupported(f"Unknown label `{name}`")
+        check = eval(f"lambda s, k: {self.model.to_python(ast, label)}", {"deadlock": self.deadlock})
+        return np.fromiter((bool(check(s, k)) for k, s in enumerate(self.states)), dtype=bool, count=self.n)
+
+    def step(self, x: np.ndarray) -> np.ndarray:
+        # (P x)[i] = sum_j P[i, j] x[j]
+        return np.bincount(self.rows, weights=self.probs * x[self.cols], minlength=self.n)
+
+    def _can_reach(self, phi: np.ndarray, psi: np.ndarray) -> np.ndarray:
+        # Backward search from psi through phi states
+        order = np.argsort(self.cols, kind="stable")
+        preds = self.rows[order]
+        starts = np.searchsorted(self.cols[order], np.arange(self.n + 1))
+        reached = psi.copy()
+        stack = list(np.flatnonzero(psi))
+        while stack:
+            j = stack.pop()
+            for i in preds[starts[j]:starts[j + 1]]:
+                if not reached[i] and phi[i]:
+                    reached[i] = True
+                    stack.append(i)
+        return reached
+
+    def until(self, phi: np.ndarray, psi: np.ndarray) -> np.ndarray:
+        # Graph precomputation as in PRISM: states that cannot reach psi have probability 0,
+        # states that cannot reach those have probability 1, and only the rest are solved for
+        prob0 = ~self._can_reach(phi, psi)
+        prob1 = ~self._can_reach(phi & ~psi, prob0)
+        x = prob1.astype(np.float64)
+        maybe = ~prob0 & ~prob1
+        m = int(maybe.sum())
+        if m == 0:
+            return x
+        pos = np.cumsum(maybe) - 1
+        inner = maybe[self.rows] & maybe[self.cols]
+        exits = maybe[self.rows] & prob1[self.cols]
+        b = np.bincount(pos[self.rows[exits]], weights=self.probs[exits], minlength=m)
+        x[maybe] = _solve(pos[self.rows[inner]], pos[self.cols[inner]], self.probs[inner], b, m)
+        return x
+
+    def bounded_until(self, phi: np.ndarray, psi: np.ndarray, k: int) -> np.ndarray:
+        x = psi.astype(np.float64)
+        for _ in range(k):
+            x = np.where(psi, 1.0, np.where(phi, self.step(x), 0.0))
+        return x
+
+
+def _solve(rows: np.ndarray, cols: np.ndarray, probs: np.ndarray, b: np.ndarray, m: int,
+           epsilon: float = 1e-12, max_iterations: int = 1_000_000) -> np.ndarray:
+    # Solves x = A x + b for the substochastic matrix A given in coordinate form
+    if scipy is not None:
+        a = scipy.sparse.csr_matrix((probs, (rows, cols)), shape=(m, m))
+        x = scipy.sparse.linalg.spsolve((scipy.sparse.identity(m, format="csr") - a).tocsc(), b)
+        return np.atleast_1d(x)
+    if m <= 2000:
+        a = np.zeros((m, m))
+        np.add.at(a, (rows, cols), probs)
+        return np.linalg.solve(np.eye(m) - a, b)
+    x = np.zeros(m)
+    for _ in range(max_iterations):
+        new = b + np.bincount(rows, weights=probs * x[cols], minlength=m)
+        if np.max(np.abs(new - x)) < epsilon:
+            return new
+        x = new
+    return x
+
+
+def _bound(p: _Parser) -> Optional[int]:
+    if p.peek() == '<=':
+        p.take()
+        return int(p.take())
+    if p.peek() == '<':
+        p.take()
+        return int(p.take()) - 1
+    if p.peek() in ('>', '>=', '['):
+        raise NativeUnsupported("Only upper step bounds are supported")
+    return None
+
+
+def parse_expression(text: str) -> Tuple:
+    p = _Parser(_tokenize(text))
+    ast = p.expr()
+    if p.peek() is not None:
+        raise NativeUnsupported(f"Unexpected `{p.peek()}` in `{text}`")
+    return ast
+
+
+def parse_property(property: str) -> Tuple[str, Optional[int], Optional[Tuple], Tuple]:
+    """(operator, step bound, left, right) of a path formula: `F`, `G` and `X` have no left operand."""
+    p = _Parser(_tokenize(property))
+    if p.peek() == 'P':
+        raise NativeUnsupported("Nested P operators are not supported")
+    if p.peek() in ('F', 'G', 'X'):
+        op = p.take()
+        bound = _bound(p)
+        if op == 'X' and bound is not None:
+            raise NativeUnsupported("Bounded X is not supported")
+        left, right = None, p.expr()
+    else:
+        op, left = 'U', p.expr()
+        p.expect('U')
+        bound = _bound(p)
+        right = p.expr()
+    if p.peek() is not None:
+        raise NativeUnsupported(f"Unexpected `{p.peek()}` in property `{property}`")
+    return op, bound, left, right
+
+
+def check(dtmc: DTMC, property: str) -> str:
+    """Probability (as PRISM prints it) that the initial state satisfies the path formula `property`."""
+    op, bound, left, right = parse_property(property)
+    phi = dtmc.satisfying(right)
+    if op == 'X':
+        x = dtmc.step(phi.astype(np.float64))
+    elif op == 'F':
+        x = _until(dtmc, np.ones(dtmc.n, dtype=bool), phi, bound)
+    elif op == 'G':
+        x = 1.0 - _until(dtmc, np.ones(dtmc.n, dtype=bool), ~phi, bound)
+    else:
+        x = _until(dtmc, dtmc.satisfying(left), phi, bound)
+    return repr(float(min(max(x[0], 0.0), 1.0)))
+
+
+def _until(dtmc: DTMC, phi: np.ndarray, psi: np.ndarray, bound: Optional[int]) -> np.ndarray:
+    return dtmc.until(phi, psi) if bound is None else dtmc.bounded_until(phi, psi, bound)
+
+
+def load(dtmc_file: str, max_states: int = MAX_STATES, constants: Optional[Dict[str, Any]] = None) -> DTMC:
+    with open(dtmc_file, "r") as f:
+        return DTMC(Model(f.read(), constants), max_states)
+
+
+def _format_value(value: Any) -> str:
+    if isinstance(value, bool): return "true" if value else "false"
+    return str(value)
+
+
+def export_explicit(dtmc: DTMC, base: str, properties: List[str] = ()) -> Tuple[List[str], List[str]]:
+    """Writes `<base>.tra/.sta/.lab` in PRISM's explicit format and returns the PRISM arguments importing them
+    together with the properties rewritten for the imported model.
+
+    Labels are written for `init`, `deadlock`, every label of the model referenced by a
+    property (always including `goal`) and every atom referenced by a property. Formulas do
+    not survive the export, so properties refer to them through labels of the same name."""
+    referenced = set(tok for property in properties for tok in _tokenize(property))
+    label_names = [name for name in dtmc.model.labels if name == "goal" or f'"{name}"' in referenced]
+    atom_names = [name for name in list(dtmc.model.variables) + list(dtmc.model.formulas)
+                  if name in referenced and name not in label_names]
+    formula_names = [name for name in atom_names if name in dtmc.model.formulas]
+    with open(f"{base}.sta", "w") as f:
+        f.write(f"({','.join(dtmc.model.variables)})\n")
+        for k, s in enumerate(dtmc.states):
+            f.write(f"{k}:({','.join(_format_value(v) for v in s)})\n")
+
+    with open(f"{base}.tra", "w") as f:
+        f.write(f"{dtmc.n} {len(dtmc.probs)}\n")
+        for i, j, p in zip(dtmc.rows.tolist(), dtmc.cols.tolist(), dtmc.probs.tolist()):
+            f.write(f"{i} {j} {p!r}\n")
+
+    labels = [np.arange(dtmc.n) == 0, dtmc.deadlock]
+    labels += [dtmc.satisfying(dtmc.model.labels[name]) for name in label_names]
+    labels += [dtmc.satisfying(("id", name)) for name in atom_names]
+    names = ["init", "deadlock"] + label_names + atom_names
+    with open(f"{base}.lab", "w") as f:
+        f.write(" ".join(f'{i}="{name}"' for i, name in enumerate(names)) + "\n")
+        members = np.stack(labels, axis=1)
+        for k in np.flatnonzero(members.any(axis=1)).tolist():
+            f.write(f"{k}: {' '.join(str(i) for i in np.flatnonzero(members[k]).tolist())}\n")
+
+    if formula_names:
+        pattern = re.compile(r'(?<!["\w])(' + "|".join(map(re.escape, formula_names)) + r')(?![\w"])')
+        properties = [pattern.sub(r'"\1"', property) for property in properties]
+    args = ["-importtrans", f"{base}.tra", "-importstates", f"{base}.sta", "-importlabels", f"{base}.lab", "-dtmc", "-explicit"]
+    return args, list(properties)
@@ -0,0 +1,209 @@
+import atexit
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+
+# Warm PRISM backend: a small Java shim (PrismServer.java) keeps a PRISM instance
+# loaded and answers check requests over its stdin/stdout, so repeated queries do
+# not pay JVM startup, class loading and (for the same model) the model build.
+
+SHIM_SOURCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "PrismServer.java")
+SHIM_BUILD_DIR = "tmp/prism_server"
+PREFIX = "@@VP4 "
+
+
+class PrismServerError(Exception):
+    """The server process died, hung or could not be started."""
+
+
+class PrismServerTimeout(PrismServerError):
+    """The server did not reply within the request's timeout."""
+
+
+class PrismCheckError(Exception):
+    """PRISM itself rejected the model or property."""
+
+
+def find_prism_dir() -> Optional[str]:
+    if os.environ.get("PRISM_DIR"):
+        return os.environ["PRISM_DIR"]
+    prism = shutil.which("prism")
+    if prism is None:
+        return None
+    # <PRISM_DIR>/bin/prism
+    return os.path.dirname(os.path.dirname(os.path.realpath(prism)))
+
+
+def prism_classpath(prism_dir: str) -> List[str]:
+    return [
+        os.path.join(prism_dir, "lib", "prism.jar"),
+        os.path.join(prism_dir, "classes"),
+        os.path.join(prism_dir, "lib", "*"),
+    ]
+
+
+def build_shim(prism_dir: str, build_dir: str = SHIM_BUILD_DIR) -> str:
+    class_file = os.path.join(build_dir, "PrismServer.class")
+    if os.path.exists(class_file) and os.path.getmtime(class_file) >= os.path.getmtime(SHIM_SOURCE):
+        return build_dir
+    if shutil.which("javac") is None:
+        raise PrismServerError("javac not found, cannot build PrismServer")
+    # Compile into a private directory and move the class into place, so that
+    # parallel jobs building the shim at the same time do not race
+    os.makedirs(build_dir, exist_ok=True)
+    staging_dir = tempfile.mkdtemp(dir=build_dir)
+    try:
+        command = ["javac", "-cp", os.pathsep.join(prism_classpath(prism_dir)), "-d", staging_dir, SHIM_SOURCE]
+        output_data = subprocess.run(command, capture_output=True, text=True)
+        if output_data.returncode != 0:
+            raise PrismServerError(f"Building PrismServer failed:\n{output_data.stderr}")
+        os.replace(os.path.join(staging_dir, "PrismServer.class"), class_file)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    return build_dir
+
+
+def server_command(prism_dir: str, build_dir: str, java_options: List[str] = []) -> List[str]:
+    classpath = os.pathsep.join(prism_classpath(prism_dir) + [os.path.abspath(build_dir)])
+    lib_dir = os.path.join(prism_dir, "lib")
+    return ["java", *java_options, f"-Djava.library.path={lib_dir}", "-cp", classpath, "PrismServer"]
+
+
+class PrismWorker:
+    def __init__(self, command: List[str], env: Optional[Dict[str, str]] = None, startup_timeout: float = 60.0):
+        self.command = command
+        self.env = env
+        self.startup_timeout = startup_timeout
+        self.proc = None
+        self.lines = None
+        self.last_used = 0.0
+
+    def start(self):
+        self.proc = subprocess.Popen(
+            self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1, env=self.env,
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_stdout, args=(self.proc, self.lines), daemon=True).start()
+        if not self.ping(self.startup_timeout):
+            self.close()
+            raise PrismServerError(f"PrismServer did not start: `{self.command}`")
+
+    @staticmethod
+    def _read_stdout(proc: subprocess.Popen, lines: queue.Queue):
+        for line in proc.stdout:
+            if line.startswith(PREFIX):
+                lines.put(line[len(PREFIX):].rstrip("\n"))
+        lines.put(None)
+
+    def alive(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def _request(self, request: str, timeout: Optional[float]) -> str:
+        if not self.alive():
+            raise PrismServerError("PrismServer is not running")
+        try:
+            self.proc.stdin.write(request + "\n")
+            self.proc.stdin.flush()
+            reply = self.lines.get(timeout=timeout)
+        except queue.Empty as e:
+            self.close()
+            raise PrismServerTimeout(f"No reply from PrismServer to `{request}` within {timeout}s") from e
+        except (BrokenPipeError, OSError) as e:
+            self.close()
+            raise PrismServerError(f"No reply from PrismServer to `{request}`") from e
+        if reply is None:
+            self.close()
+            raise PrismServerError("PrismServer exited")
+        self.last_used = time.monotonic()
+        return reply
+
+    def ping(self, timeout: float = 10.0) -> bool:
+        try:
+            return self._request("PING", timeout) == "PONG"
+        except PrismServerError:
+            return False
+
+    def check(self, model_file: str, prop: str, timeout: Optional[float] = None) -> str:
+        reply = self._request(f"CHECK\t{os.path.abspath(model_file)}\t{' '.join(prop.split())}", timeout)
+        status, _, payload = reply.partition("\t")
+        if status != "OK":
+            raise PrismCheckError(payload)
+        return payload
+
+    def close(self):
+        if self.proc is None:
+            return
+        try:
+            if self.proc.poll() is None:
+                self.proc.stdin.write("QUIT\n")
+                self.proc.stdin.flush()
+                self.proc.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.proc.kill()
+        self.proc = None
+
+
+class PrismWorkerPool:
+    def __init__(self, command: List[str], size: int = 1, health_interval: float = 30.0):
+        self.command = command
+        self.health_interval = health_interval
+        self.workers = [PrismWorker(command) for _ in range(size)]
+        self.idle = queue.Queue()
+        for worker in self.workers:
+            worker.start()
+            self.idle.put(worker)
+
+    def _healthy(self, worker: PrismWorker) -> bool:
+        if not worker.alive():
+            return False
+        if time.monotonic() - worker.last_used > self.health_interval:
+            return worker.ping()
+        return True
+
+    def check(self, model_file: str, prop: str, timeout: Optional[float] = None) -> str:
+        worker = self.idle.get()
+        try:
+            # One restart per request: a crash on the retry is reported to the caller. A timeout is
+            # reported right away, retrying it would only wait out the deadline a second time
+            for attempt in range(2):
+                if not self._healthy(worker):
+                    worker.close()
+                    worker.start()
+                try:
+                    return worker.check(model_file, prop, timeout)
+                except PrismServerError as e:
+                    if attempt == 1 or isinstance(e, PrismServerTimeout):
+                        raise
+        finally:
+            self.idle.put(worker)
+
+    def close(self):
+        for worker in self.workers:
+            worker.close()
+
+
+_pool = None
+_pool_failed = False
+
+
+def get_pool(size: int = 1) -> Optional[PrismWorkerPool]:
+    # One pool per process (so every --jobs worker keeps its own warm PRISM)
+    global _pool, _pool_failed
+    if _pool is not None or _pool_failed:
+        return _pool
+    try:
+        prism_dir = find_prism_dir()
+        if prism_dir is None:
+            raise PrismServerError("PRISM installation not found")
+        _pool = PrismWorkerPool(server_command(prism_dir, build_shim(prism_dir)), size)
+        atexit.register(_pool.close)
+    except (PrismServerError, OSError) as e:
+        print(f"Warm PRISM server unavailable ({e}), falling back to one-shot PRISM calls.")
+        _pool_failed = True
+    return _pool
@@ -0,0 +1,89 @@
+import contextlib
+import re
+import resource
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, Iterator, Optional
+
+# Per-phase metrics of one job. `profile()` activates a Profile for the duration of a job,
+# and the translator and run.py mark their phases with `phase(name)`, which does nothing
+# while no profile is active. Each phase records
+#   seconds          wall time
+#   rss_mb           peak RSS of the process at the end of the phase (high-water mark)
+#   rss_growth_mb    how much the phase raised that high-water mark
+# PRISM phases additionally record PRISM's own statistics (see parse_prism_output) and the
+# peak RSS of its process.
+
+_active: Optional["Profile"] = None
+
+
+def _rss_mb(who: int) -> float:
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    rss = resource.getrusage(who).ru_maxrss
+    return round(rss / (1024 ** 2 if sys.platform == "darwin" else 1024), 1)
+
+
+class Profile:
+    def __init__(self, info: dict):
+        self.info = info
+        self.phases = []
+
+    def record(self) -> dict:
+        totals = defaultdict(float)
+        for entry in self.phases:
+            totals[entry["phase"]] += entry["seconds"]
+        prism = [entry for entry in self.phases if entry["phase"] == "prism"]
+        record = {**self.info, "phases": self.phases, "totals": dict(totals), "peak_rss_mb": _rss_mb(resource.RUSAGE_SELF)}
+        if prism:
+            record["prism_rss_mb"] = max(entry["prism_rss_mb"] for entry in prism)
+        return record
+
+
+@contextlib.contextmanager
+def profile(**info) -> Iterator[Profile]:
+    global _active
+    previous, _active = _active, Profile(info)
+    try:
+        yield _active
+    finally:
+        _active = previous
+
+
+@contextlib.contextmanager
+def phase(name: str, **context) -> Iterator[dict]:
+    # The yielded entry can be extended by the caller, e.g. with PRISM's statistics
+    if _active is None:
+        yield {}
+        return
+    rss = _rss_mb(resource.RUSAGE_SELF)
+    entry = {"phase": name, **context}
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        entry["seconds"] = time.perf_counter() - start
+        entry["rss_mb"] = _rss_mb(resource.RUSAGE_SELF)
+        entry["rss_growth_mb"] = round(entry["rss_mb"] - rss, 1)
+        if name == "prism":
+            entry["prism_rss_mb"] = _rss_mb(resource.RUSAGE_CHILDREN)
+        _active.phases.append(entry)
+
+
+PRISM_STATS = {
+    "model_construction_s": (r"^Time for model construction:\s+([\d.]+)", float),
+    "checking_s": (r"^Time for model checking:\s+([\d.]+)", float),
+    "states": (r"^States:\s+(\d+)", int),
+    "transitions": (r"^Transitions:\s+(\d+)", int),
+    "bdd_nodes": (r"^Transition matrix:\s+(\d+) nodes", int),
+}
+
+
+def parse_prism_output(stdout: str) -> Dict[str, float]:
+    # Times are summed over all properties of the run; the model statistics are the first model's
+    stats = {}
+    for key, (pattern, kind) in PRISM_STATS.items():
+        values = [kind(v) for v in re.findall(pattern, stdout, re.M)]
+        if values:
+            stats[key] = sum(values) if key.endswith("_s") else values[0]
+    return stats
@@ -0,0 +1,244 @@
+import glob
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from fire import Fire
+
+# Sweeps split over several machines. `--shard i/N` gives every machine a fixed slice of the
+# sorted (problem, policy, property) job list: the same inputs always produce the same
+# slices, so the machines need no coordinator, only a shared directory. Each shard writes a
+# self-describing file (the full job list, its slice and its results), and `merge` combines
+# the files into the tables main.py prints.
+#
+# Every finished job is also appended to a JSON Lines log right away (one record per
+# problem, policy and property, with its options, timings and result). An interrupted sweep
+# keeps what it finished, `--resume` skips the jobs already logged, and the tables are
+# rendered from the log.
+
+Job = Tuple[str, str, str]
+
+LOG_FILE = "tmp/results.jsonl"
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    # "i/N", with shards numbered from 0
+    index, sep, count = str(shard).partition("/")
+    try:
+        index, count = int(index), int(count)
+    except ValueError:
+        index = count = -1
+    if not sep or count < 1 or not 0 <= index < count:
+        raise ValueError(f"Expected `--shard i/N` with 0 <= i < N, got `{shard}`")
+    return index, count
+
+
+def job_list(problem_files: List[str], policy_files: List[str], property_files: List[str]) -> List[Job]:
+    return [(problem_file, policy_file, property_file) for problem_file in sorted(problem_files) for policy_file in sorted(policy_files) for property_file in sorted(property_files)]
+
+
+def partition(jobs: List[Job], index: int, count: int) -> List[Job]:
+    # Contiguous slices, so all jobs of a problem land on one shard (or two at a slice
+    # boundary) and the problem is grounded as few times as possible
+    return jobs[index * len(jobs) // count:(index + 1) * len(jobs) // count]
+
+
+def group_jobs(jobs: List[Job]) -> List[Tuple[str, List[str], List[str]]]:
+    # Regroups a slice into (problem, policies, properties) runs of main.run_job. A slice
+    # boundary can cut a problem's policies short, so policies checking different property
+    # lists get separate runs
+    runs = {}
+    for problem_file, policy_file, property_file in jobs:
+        runs.setdefault(problem_file, {}).setdefault(policy_file, []).append(property_file)
+    grouped = []
+    for problem_file, policies in runs.items():
+        by_properties = {}
+        for policy_file, property_files in policies.items():
+            by_properties.setdefault(tuple(property_files), []).append(policy_file)
+        grouped.extend((problem_file, policy_files, list(property_files)) for property_files, policy_files in by_properties.items())
+    return grouped
+
+
+def shard_file(results_dir: str, domain_dir: str, index: int, count: int) -> str:
+    name = os.path.basename(os.path.normpath(domain_dir))
+    return os.path.join(results_dir, f"{name}.shard-{index}-of-{count}.json")
+
+
+def write_shard(path: str, domain_dir: str, index: int, count: int, jobs: List[Job], options: Dict[str, object], results: Dict[str, Dict[str, Dict[str, str]]]):
+    record = {
+        "domain_dir": domain_dir,
+        "shard": index,
+        "shards": count,
+        "options": options,
+        "jobs": [list(job) for job in jobs],
+        "results": [[*job, results.get(job[1], {}).get(job[0], {}).get(job[2], "Error")] for job in partition(jobs, index, count)],
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    # Write and rename, so a merge on another machine never reads a half-written file
+    staging = f"{path}.{os.getpid()}.tmp"
+    with open(staging, "w") as f:
+        json.dump(record, f, indent=1)
+    os.replace(staging, path)
+    print(f"Wrote shard {index}/{count} of `{domain_dir}` to `{path}`")
+
+
+def job_options(engine: str = "prism", prism_engine: Optional[str] = None, coi: bool = False, symmetry: bool = False, timeout: Optional[float] = None, memory: Optional[int] = None) -> Dict[str, object]:
+    # The options a result depends on: logged results are only reused under the same options
+    return {"engine": engine, "prism_engine": prism_engine, "coi": coi, "symmetry": symmetry, "timeout": timeout, "memory": memory}
+
+
+def log_record(domain_dir: str, problem_file: str, policy_file: str, property_file: str, result: str, options: Dict[str, object], **timing: float) -> dict:
+    return {
+        "domain_dir": domain_dir,
+        "problem": problem_file,
+        "policy": policy_file,
+        "property": property_file,
+        "result": result,
+        "options": options,
+        **{key: round(value, 6) for key, value in timing.items()},
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def append_log(log_file: str, records: List[dict]):
+    # One write per batch of records, so jobs appending concurrently do not interleave lines
+    if not records:
+        return
+    os.makedirs(os.path.dirname(log_file) or ".", exist_ok=True)
+    with open(log_file, "a") as f:
+        f.write("".join(json.dumps(record) + "\n" for record in records))
+
+
+def read_log(log_file: str, domain_dir: Optional[str] = None, options: Optional[Dict[str, object]] = None) -> List[dict]:
+    # The records of `domain_dir` run with `options` (all records if None). A job killed while
+    # writing can leave a truncated last line, which is skipped
+    records = []
+    if not os.path.exists(log_file):
+        return records
+    with open(log_file, "r") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if domain_dir is not None and os.path.normpath(record["domain_dir"]) != os.path.normpath(domain_dir):
+                continue
+            if options is not None and record["options"] != options:
+                continue
+            records.append(record)
+    return records
+
+
+def logged_results(records: List[dict]) -> Dict[str, Dict[str, Dict[str, str]]]:
+    # Results per policy, problem and property; later records replace earlier ones
+    results = {}
+    for record in records:
+        results.setdefault(record["policy"], {}).setdefault(record["problem"], {})[record["property"]] = record["result"]
+    return results
+
+
+def finished_jobs(records: List[dict]) -> set:
+    # Jobs that ended in "Error" are run again
+    results = logged_results(records)
+    return {(problem_file, policy_file, property_file) for policy_file, problems in results.items() for problem_file, values in problems.items() for property_file, result in values.items() if result != "Error"}
+
+
+def print_tables(domain_dir: str, problem_files: List[str], policy_files: List[str], property_files: List[str], results: Dict[str, Dict[str, Dict[str, str]]], missing: str = "-"):
+    # One table per policy: a row per problem, a column per property
+    print(f"\nResults for domain `{domain_dir}`")
+
+    # Calculate column widths
+    # 1. First column width = max length of problem filenames (or at least 15 chars)
+    if problem_files:
+        col0_width = max(len(p) for p in problem_files) + 4
+    else:
+        col0_width = 15
+
+    # 2. Property column widths = max length of property name (or at least 10 chars)
+    # We strip .pctl for the header name
+    prop_names = [p.split('.pctl')[0] for p in property_files]
+    prop_widths = [max(len(n), 10) + 2 for n in prop_names]
+
+    for policy_file in policy_files:
+        print(f"Policy `{policy_file}`:")
+
+        # Print Header Row
+        # Empty block for the "Problem" column
+        print(f"{'':<{col0_width}}", end="")
+        for i, name in enumerate(prop_names):
+            print(f"| {name:<{prop_widths[i]}}", end="")
+        print("|")
+
+        # Print Separator Line
+        total_width = col0_width + sum(w + 2 for w in prop_widths) + len(prop_widths) # rough estimate
+        print("-" * total_width)
+
+        # Print Data Rows
+        for problem_file in problem_files:
+            print(f"{problem_file:<{col0_width}}", end="")
+            for i, property_file in enumerate(property_files):
+                val = str(results.get(policy_file, {}).get(problem_file, {}).get(property_file, missing))
+                print(f"| {val:<{prop_widths[i]}}", end="")
+            print("|")
+        print("\n")
+
+
+def merge(*paths: str, out: Optional[str] = None):
+    """Combines shard files (or directories of them) into the per-policy tables of main.py.
+
+    Shards of several domains can be merged at once; each domain gets its own tables. Jobs
+    of shards that are missing are reported and shown as `-`. With `out`, the merged
+    results are also written as JSON, keyed by domain, policy, problem and property."""
+    files = []
+    for path in paths or ["tmp/shards/"]:
+        files.extend(sorted(glob.glob(os.path.join(path, "*.shard-*-of-*.json"))) if os.path.isdir(path) else [path])
+    if not files:
+        raise FileNotFoundError(f"No shard files in {list(paths)}")
+
+    domains = {}
+    for path in files:
+        with open(path, "r") as f:
+            record = json.load(f)
+        domain = domains.setdefault(record["domain_dir"], {"jobs": record["jobs"], "shards": record["shards"], "options": record["options"], "seen": set(), "results": {}})
+        if record["jobs"] != domain["jobs"] or record["shards"] != domain["shards"]:
+            raise ValueError(f"`{path}` was split from a different job list than the other shards of `{record['domain_dir']}`")
+        if record["options"] != domain["options"]:
+            print(f"Warning: `{path}` was run with options {record['options']}, other shards with {domain['options']}")
+        domain["seen"].add(record["shard"])
+        for problem_file, policy_file, property_file, result in record["results"]:
+            domain["results"].setdefault(policy_file, {}).setdefault(problem_file, {})[property_file] = result
+
+    merged = {}
+    for domain_dir, domain in domains.items():
+        jobs = [tuple(job) for job in domain["jobs"]]
+        missing = sorted(set(range(domain["shards"])) - domain["seen"])
+        if missing:
+            lost = sum(len(partition(jobs, index, domain["shards"])) for index in missing)
+            print(f"Warning: `{domain_dir}` is missing shards {missing} of {domain['shards']} ({lost} of {len(jobs)} jobs)")
+        problem_files, policy_files, property_files = (sorted({job[i] for job in jobs}) for i in range(3))
+        print_tables(domain_dir, problem_files, policy_files, property_files, domain["results"])
+        merged[domain_dir] = domain["results"]
+
+    if out:
+        with open(out, "w") as f:
+            json.dump(merged, f, indent=1)
+        print(f"Wrote `{out}`")
+
+
+def table(log_file: str = LOG_FILE, domain_dir: Optional[str] = None):
+    """Prints the per-policy tables of every domain (or just `domain_dir`) in a results log,
+    e.g. while a sweep is still running. Runs with different options get separate tables."""
+    groups = {}
+    for record in read_log(log_file, domain_dir):
+        groups.setdefault((record["domain_dir"], json.dumps(record["options"], sort_keys=True)), []).append(record)
+    if not groups:
+        print(f"No results in `{log_file}`")
+    for (domain, options), records in groups.items():
+        print(f"\nOptions: {options}")
+        problem_files, policy_files, property_files = (sorted({record[key] for record in records}) for key in ("problem", "policy", "property"))
+        print_tables(domain, problem_files, policy_files, property_files, logged_results(records))
+
+
+if __name__ == "__main__":
+    Fire({"merge": merge, "table": table})
@@ -1,24 +1,287 @@
 from fire import Fire
 import json
+import math
+import re
 import subprocess
-from translation import pddl_to_mdp
-from typing import Optional
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from translation import ground_problem
+from ground_model import GroundModel
+import prism_server
+import profiling
+import limits
+import native
+import simulate
+import symmetries
+import cache
+from typing import Dict, List, Optional, Tuple
+import contextlib
 import os
+import shutil
+import signal
 
-def verify_property(dtmc_file: str, property_file: str) -> Optional[str]:
+def verify_property_warm(dtmc_file: str, property: str) -> Optional[str]:
+    # Raises PrismServerError if the warm server is unusable, so the caller can fall back
+    pool = prism_server.get_pool()
+    if pool is None:
+        raise prism_server.PrismServerError("No warm PRISM server")
+    try:
+        return pool.check(dtmc_file, f"P=? [{property}]", limits.remaining())
+    except prism_server.PrismCheckError as e:
+        print(f"PRISM server rejected `{property}` on `{dtmc_file}`: {e}\nAborting verify_property.")
+        return None
+
+MODEL_FILES = ["mdp.prism", "dtmc.prism"]
+
+def cacheable(result: Optional[str]) -> bool:
+    return result is not None and not result.startswith("Error") and result not in (limits.TIMEOUT, limits.OOM)
+
+ENGINES = ["prism", "native", "explicit", "smc"]
+
+def engine_options(engine: str, prism_engine: Optional[str] = None, symmetry: bool = False) -> List[str]:
+    # Results from different engines are cached separately
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine `{engine}`, expected one of {ENGINES}")
+    if prism_engine is not None and prism_engine not in PRISM_ENGINE_CHOICES:
+        raise ValueError(f"Unknown PRISM engine `{prism_engine}`, expected one of {PRISM_ENGINE_CHOICES}")
+    options = [] if engine == "prism" else [f"engine={engine}"]
+    if engine == "smc":
+        options.append(f"smc={simulate.CONFIDENCE},{simulate.ERROR},{simulate.MAX_STEPS}")
+    if symmetry:
+        options.append("symmetry")
+    return options + ([f"prism_engine={prism_engine}"] if prism_engine else [])
+
+# PRISM's own engines. "auto" picks one from the size of the DTMC, "portfolio" races the
+# automatic choice against the opposite kind of engine and keeps the first answer.
+PRISM_ENGINES = ["mtbdd", "sparse", "hybrid", "explicit"]
+PRISM_ENGINE_CHOICES = PRISM_ENGINES + ["auto", "portfolio"]
+# Up to 2^20 states the model is cheapest to build explicitly; beyond that PRISM's symbolic
+# engines scale better, fully symbolic (mtbdd) once even hybrid's vectors get too large
+EXPLICIT_MAX_BITS = 20
+HYBRID_MAX_BITS = 64
+# Memory estimate per potential state for the engine that holds the model, and PRISM's
+# default -javamaxmem/-cuddmaxmem (MB)
+BYTES_PER_STATE = 64
+MAX_MODEL_MB = 4096
+PRISM_DEFAULT_MB = 1024
+
+VARIABLE_DECLARATION = re.compile(r"^\s*\w+\s*:\s*(?:bool|\[(-?\d+)\.\.(-?\d+)\])")
+
+def model_stats(dtmc_file: str) -> Dict[str, int]:
+    # State bits (booleans and bounded ints) and commands of a generated model
+    bits = commands = 0
+    with open(dtmc_file, "r") as f:
+        for line in f:
+            if line.lstrip().startswith("["):
+                commands += 1
+                continue
+            match = VARIABLE_DECLARATION.match(line)
+            if match:
+                bits += 1 if match.group(1) is None else max(math.ceil(math.log2(int(match.group(2)) - int(match.group(1)) + 1)), 1)
+    return {"bits": bits, "commands": commands}
+
+def choose_prism_engine(stats: Dict[str, int]) -> str:
+    if stats["bits"] <= EXPLICIT_MAX_BITS: return "explicit"
+    if stats["bits"] <= HYBRID_MAX_BITS: return "hybrid"
+    return "mtbdd"
+
+def prism_memory_args(stats: Dict[str, int], prism_engine: Optional[str]) -> List[str]:
+    # Explicit and sparse engines keep the model in the Java heap, the others in CUDD. The
+    # holder gets memory for the (bounded) state count, or most of the job's memory limit
+    symbolic = prism_engine not in ("explicit", "sparse")
+    limit = limits.memory_limit()
+    if limit is not None:
+        model_mb, other_mb = int(limit * 0.6), int(limit * 0.25)
+    else:
+        model_mb = min(max(2 ** min(stats["bits"], 40) * BYTES_PER_STATE // 1024 ** 2, PRISM_DEFAULT_MB), MAX_MODEL_MB)
+        other_mb = PRISM_DEFAULT_MB
+    java_mb, cudd_mb = (other_mb, model_mb) if symbolic else (model_mb, other_mb)
+    return ["-javamaxmem", f"{java_mb}m", "-cuddmaxmem", f"{cudd_mb}m"]
+
+def prism_engine_options(dtmc_file: str, prism_engine: Optional[str] = None) -> List[List[str]]:
+    # The PRISM options of each run to make: one set, or two to race in portfolio mode
+    if prism_engine is None and limits.memory_limit() is None:
+        return [[]]
+    stats = model_stats(dtmc_file)
+    chosen = choose_prism_engine(stats) if prism_engine in ("auto", "portfolio") else prism_engine
+    engines = [chosen]
+    if prism_engine == "portfolio":
+        engines.append("mtbdd" if chosen == "explicit" else "explicit")
+    return [([f"-{engine}"] if engine else []) + prism_memory_args(stats, engine) for engine in engines]
+
+def out_of_memory(output: subprocess.CompletedProcess) -> bool:
+    text = f"{output.stdout}\n{output.stderr}"
+    return "OutOfMemoryError" in text or "out of memory" in text.lower()
+
+def _start_prism(command: List[str]) -> subprocess.Popen:
+    # PRISM gets its own process group: bin/prism is a script that starts the JVM as its child,
+    # and both must go when the run is stopped. Within a job's limits, PRISM does not inherit
+    # the memory cap
+    return subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, start_new_session=True,
+                            preexec_fn=limits.uncapped if limits.memory_limit() is not None else None)
+
+def _stop_prism(proc: subprocess.Popen):
+    if proc.poll() is None:
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except OSError:
+            proc.kill()
+
+def _run_prism_once(command: List[str]) -> subprocess.CompletedProcess:
+    # Within a job's limits, PRISM gets the remaining time
+    proc = _start_prism(command)
+    try:
+        stdout, stderr = proc.communicate(timeout=limits.remaining())
+    except subprocess.TimeoutExpired:
+        _stop_prism(proc)
+        proc.communicate()
+        raise limits.JobTimeout()
+    except BaseException:
+        _stop_prism(proc)
+        proc.communicate()
+        raise
+    return subprocess.CompletedProcess(command, proc.returncode, stdout, stderr)
+
+def run_prism(command: List[str], results_file: str, option_sets: List[List[str]] = [[]]) -> subprocess.CompletedProcess:
+    # Runs `command` with each option set (see prism_engine_options) and -exportresults, and
+    # returns the first run that succeeds, or the last failure
+    if len(option_sets) == 1:
+        return _run_prism_once(command + option_sets[0] + ["-exportresults", results_file])
+
+    runs = []
+    pool = ThreadPoolExecutor(len(option_sets))
+    try:
+        for i, options in enumerate(option_sets):
+            run_results = f"{results_file}.{i}"
+            proc = _start_prism(command + options + ["-exportresults", run_results])
+            runs.append((proc, run_results))
+        futures = {pool.submit(proc.communicate): (proc, run_results) for proc, run_results in runs}
+        pending, failure = set(futures), None
+        while pending:
+            done, pending = wait(pending, timeout=limits.remaining(), return_when=FIRST_COMPLETED)
+            if not done:
+                raise limits.JobTimeout()
+            for future in done:
+                proc, run_results = futures[future]
+                stdout, stderr = future.result()
+                output = subprocess.CompletedProcess(proc.args, proc.returncode, stdout, stderr)
+                if proc.returncode == 0:
+                    if os.path.exists(run_results):
+                        os.replace(run_results, results_file)
+                    return output
+                failure = output
+        return failure
+    finally:
+        # Stop the slower engine
+        for proc, _ in runs:
+            _stop_prism(proc)
+        pool.shutdown(wait=True)
+        for _, run_results in runs:
+            if os.path.exists(run_results):
+                os.remove(run_results)
+
+def verify_property(dtmc_file: str, property_file: str, work_dir: str = "tmp/", server: bool = False, use_cache: bool = True, engine: str = "prism", prism_engine: Optional[str] = None, symmetry: bool = False) -> Optional[str]:
     with open(property_file, "r") as property_infile:
         property = property_infile.read().strip()
 
-    results_file = "tmp/results.txt"
+    if not use_cache:
+        return check_property(dtmc_file, property, work_dir, server, engine, prism_engine, symmetry)
+
+    store = cache.Cache()
+    key = cache.result_key(dtmc_file, property, engine_options(engine, prism_engine, symmetry))
+    result = store.get_result(key)
+    if result is not None:
+        print(f"Using cached result for `{property}`")
+        return result
+
+    result = check_property(dtmc_file, property, work_dir, server, engine, prism_engine, symmetry)
+    if cacheable(result):
+        store.put_result(key, result, property=property)
+    return result
+
+def symmetry_files(dtmc_file: str) -> Tuple[str, str]:
+    # The ground model and its symmetries, saved next to the DTMC by compile_single(symmetry=True)
+    return os.path.join(os.path.dirname(dtmc_file), "model.npz"), os.path.join(os.path.dirname(dtmc_file), "symmetries.npz")
+
+def check_native(dtmc_file: str, properties: Dict[str, str], symmetry: bool = False) -> Dict[str, Optional[str]]:
+    # Properties (or models) the native engine cannot handle are left as None for PRISM
+    results = {key: None for key in properties}
+    with profiling.phase("native") as entry:
+        try:
+            if symmetry and all(map(os.path.exists, symmetry_files(dtmc_file))):
+                # Each property is checked on the quotient under the symmetries that keep it
+                dtmcs = symmetries.quotients(*symmetry_files(dtmc_file), properties)
+            else:
+                dtmc = native.load(dtmc_file)
+                dtmcs = {key: dtmc for key in properties}
+        except native.NativeUnsupported as e:
+            print(f"Native engine cannot load `{dtmc_file}` ({e}), using PRISM.")
+            return results
+        entry.update(states=max((dtmc.n for dtmc in dtmcs.values()), default=0), transitions=max((len(dtmc.probs) for dtmc in dtmcs.values()), default=0))
+        for key, property in properties.items():
+            if key not in dtmcs:
+                print(f"Native engine cannot check `{property}`, using PRISM.")
+                continue
+            try:
+                results[key] = native.check(dtmcs[key], property)
+            except native.NativeUnsupported as e:
+                print(f"Native engine cannot check `{property}` ({e}), using PRISM.")
+    return results
+
+def check_smc(dtmc_file: str, properties: Dict[str, str]) -> Dict[str, Optional[str]]:
+    # Simulates the ground model saved next to the DTMC (model.npz); anything it cannot check is left as None for PRISM
+    model_file = os.path.join(os.path.dirname(dtmc_file), "model.npz")
+    if not os.path.exists(model_file):
+        print(f"No ground model `{model_file}` to simulate, using PRISM.")
+        return {key: None for key in properties}
+    with profiling.phase("smc"):
+        return simulate.check(model_file, properties)
+
+def prism_model_args(dtmc_file: str, properties: List[str], engine: str = "prism", symmetry: bool = False) -> Tuple[List[str], List[str]]:
+    symmetry = symmetry and all(map(os.path.exists, symmetry_files(dtmc_file)))
+    if engine != "explicit" and not symmetry:
+        return [dtmc_file], properties
+    # Enumerate the reachable states (or their quotient under the symmetries that keep every
+    # property) once in Python and let PRISM import them with its explicit engine
+    try:
+        with profiling.phase("export_explicit"):
+            dtmc = symmetries.quotient(*symmetry_files(dtmc_file), properties) if symmetry else native.load(dtmc_file)
+            return native.export_explicit(dtmc, os.path.splitext(dtmc_file)[0], properties)
+    except native.NativeUnsupported as e:
+        print(f"Cannot export `{dtmc_file}` explicitly ({e}), using the PRISM model.")
+        return [dtmc_file], properties
+
+def check_property(dtmc_file: str, property: str, work_dir: str = "tmp/", server: bool = False, engine: str = "prism", prism_engine: Optional[str] = None, symmetry: bool = False) -> Optional[str]:
+    if engine == "native":
+        result = check_native(dtmc_file, {property: property}, symmetry)[property]
+        if result is not None:
+            return result
+    elif engine == "smc":
+        result = check_smc(dtmc_file, {property: property})[property]
+        if result is not None:
+            return result
+
+    if server and engine == "prism" and prism_engine is None and not symmetry:
+        try:
+            with profiling.phase("prism_server"):
+                return verify_property_warm(dtmc_file, property)
+        except prism_server.PrismServerError as e:
+            print(f"Warm PRISM server failed ({e}), running PRISM directly.")
+
+    results_file = os.path.join(work_dir, "results.txt")
     if not os.path.exists(results_file):
         with open(results_file, "w") as f:
             f.write("")
 
     # Removed -fixdeadlocks to support older PRISM versions / standard usage
-    command = ["prism", dtmc_file, "-pctl", f"P=? [{property}]", "-exportresults", f"{results_file}"]
-    output_data = subprocess.run(command, capture_output=True, text=True)
+    model_args, (property,) = prism_model_args(dtmc_file, [property], engine, symmetry)
+    command = ["prism", *model_args, "-pctl", f"P=? [{property}]"]
+    with profiling.phase("prism") as entry:
+        output_data = run_prism(command, results_file, prism_engine_options(dtmc_file, prism_engine))
+        entry.update(profiling.parse_prism_output(output_data.stdout))
 
     if output_data.returncode != 0:
+        if out_of_memory(output_data):
+            return limits.OOM
         print(f"PRISM returned {output_data.returncode} on inputs `{command}` with info:\n--- stdout ---\n{output_data.stdout}\n--- stderr ---\n{output_data.stderr}\nAborting verify_property.")
         return None
     
@@ -32,29 +295,220 @@ def verify_property(dtmc_file: str, property_file: str) -> Optional[str]:
     return output_amount
 
 
+def parse_batch_results(results_raw: str) -> List[str]:
+    # -exportresults writes one block per property, separated by blank lines:
+    #   <property>:   (only present when several properties are checked)
+    #   Result
+    #   <value>
+    values = []
+    for block in results_raw.strip().split("\n\n"):
+        lines = [line.strip() for line in block.strip().splitlines() if line.strip()]
+        if "Result" in lines and lines.index("Result") + 1 < len(lines):
+            values.append(lines[lines.index("Result") + 1])
+    return values
+
+def verify_properties(dtmc_file: str, property_files: List[str], work_dir: str = "tmp/", server: bool = False, use_cache: bool = True, engine: str = "prism", prism_engine: Optional[str] = None, symmetry: bool = False) -> Dict[str, Optional[str]]:
+    if server and engine == "prism" and prism_engine is None and not symmetry and prism_server.get_pool() is not None:
+        # The warm server keeps the last model loaded, so this also builds the model only once
+        return {property_file: verify_property(dtmc_file, property_file, work_dir, server, use_cache) for property_file in property_files}
+
+    properties = {}
+    for property_file in property_files:
+        with open(property_file, "r") as property_infile:
+            properties[property_file] = property_infile.read().strip()
+
+    if not use_cache:
+        return check_properties(dtmc_file, properties, work_dir, engine, prism_engine, symmetry)
+
+    # Only the properties without a cached result for this exact model go to PRISM
+    store = cache.Cache()
+    keys = {property_file: cache.result_key(dtmc_file, property, engine_options(engine, prism_engine, symmetry)) for property_file, property in properties.items()}
+    results = {property_file: store.get_result(key) for property_file, key in keys.items()}
+    missing = {property_file: properties[property_file] for property_file, result in results.items() if result is None}
+    if len(missing) < len(properties):
+        print(f"Using cached results for {len(properties) - len(missing)} of {len(properties)} properties")
+
+    if missing:
+        for property_file, result in check_properties(dtmc_file, missing, work_dir, engine, prism_engine, symmetry).items():
+            results[property_file] = result
+            if cacheable(result):
+                store.put_result(keys[property_file], result, property=properties[property_file])
+    return results
+
+def check_properties(dtmc_file: str, properties: Dict[str, str], work_dir: str = "tmp/", engine: str = "prism", prism_engine: Optional[str] = None, symmetry: bool = False) -> Dict[str, Optional[str]]:
+    if engine in ("native", "smc"):
+        # The native engine explores (and smc simulates) the model once for all properties; PRISM gets the leftovers
+        results = check_native(dtmc_file, properties, symmetry) if engine == "native" else check_smc(dtmc_file, properties)
+        leftover = {key: properties[key] for key, result in results.items() if result is None}
+        if leftover:
+            results.update(check_properties(dtmc_file, leftover, work_dir, prism_engine=prism_engine, symmetry=symmetry))
+        return results
+
+    # Check every property in a single PRISM run so the JVM starts and the model is built only once
+    property_files = list(properties.keys())
+    properties = list(properties.values())
+    model_args, model_properties = prism_model_args(dtmc_file, properties, engine, symmetry)
+
+    props_file = os.path.join(work_dir, "properties.props")
+    with open(props_file, "w") as f:
+        f.write("\n".join(f"P=? [{property}]" for property in model_properties) + "\n")
+
+    results_file = os.path.join(work_dir, "results.txt")
+    if os.path.exists(results_file):
+        os.remove(results_file)
+
+    command = ["prism", *model_args, props_file]
+    with profiling.phase("prism") as entry:
+        output_data = run_prism(command, results_file, prism_engine_options(dtmc_file, prism_engine))
+        entry.update(profiling.parse_prism_output(output_data.stdout))
+    if output_data.returncode != 0 and out_of_memory(output_data):
+        # Checking the properties one by one would build the same model again
+        return {property_file: limits.OOM for property_file in property_files}
+
+    values = []
+    if output_data.returncode == 0 and os.path.exists(results_file):
+        with open(results_file, "r") as results_infile:
+            values = parse_batch_results(results_infile.read())
+
+    if len(values) != len(property_files):
+        # One bad property fails the whole batch, so fall back to checking them one at a time
+        print(f"Batch verification failed on inputs `{command}`, checking properties individually.")
+        return {property_file: check_property(dtmc_file, property, work_dir, engine=engine, prism_engine=prism_engine, symmetry=symmetry) for property_file, property in zip(property_files, properties)}
+
+    return dict(zip(property_files, values))
+
+
 def compile_single(
     domain_dir: str = "data/deterministic/blocksworld/",
     problem_file: str = "1.pddl",
     policy_file: str = "all_on_table.json", 
+    work_dir: str = "tmp/",
+    use_cache: bool = True,
+    write_mdp: bool = True,
+    write_ir: bool = False,
+    symmetry: bool = False,
 ):
     # 1. PDDL -> MDP
     domain_file_path = os.path.join(domain_dir, "domain.pddl")
     problem_file_path = os.path.join(domain_dir, problem_file)
     policy_file_path = os.path.join(domain_dir, policy_file)
+    write_ir = write_ir or symmetry
+    model_files = (MODEL_FILES if write_mdp else ["dtmc.prism"]) + (["model.npz"] if write_ir else []) + (["symmetries.npz"] if symmetry else [])
+
+    if use_cache:
+        store = cache.Cache()
+        key = cache.model_key(domain_file_path, problem_file_path, policy_file_path)
+        if store.get_model(key, model_files, work_dir):
+            print(f"Using cached models for problem `{problem_file}`, policy `{policy_file}`")
+            return
     
-    mdp_text, translator = pddl_to_mdp(domain_file_path, problem_file_path)
-    os.makedirs("tmp/", exist_ok=True)
-    with open("tmp/mdp.prism", "w") as f:
-        f.write(mdp_text)
+    translator = ground_problem(domain_file_path, problem_file_path)
+    os.makedirs(work_dir, exist_ok=True)
+    if write_mdp:
+        with open(os.path.join(work_dir, "mdp.prism"), "w") as f, profiling.phase("generate_mdp"):
+            translator.write_mdp(f)
 
     # 2. MDP + Policy -> DTMC (using translator)
     with open(policy_file_path, "r") as f:
         policy = json.load(f)
 
-    dtmc_text = translator.generate_dtmc(policy)
+    with open(os.path.join(work_dir, "dtmc.prism"), "w") as f, profiling.phase("generate_dtmc", policy=policy_file):
+        translator.write_dtmc(f, policy)
+    if write_ir:
+        with profiling.phase("write_ir", policy=policy_file):
+            model = GroundModel.from_translator(translator, policy)
+            model.save(os.path.join(work_dir, "model.npz"))
+    if symmetry:
+        with profiling.phase("symmetries", policy=policy_file):
+            symmetries.save(os.path.join(work_dir, "symmetries.npz"), symmetries.detect(translator, model))
+
+    if use_cache:
+        store.put_model(key, work_dir, model_files)
+
+def compile_policies(
+    domain_dir: str = "data/deterministic/blocksworld/",
+    problem_file: str = "1.pddl",
+    policy_files: List[str] = ["all_on_table.json"],
+    work_dir: str = "tmp/",
+    use_cache: bool = True,
+    write_mdp: bool = True,
+    properties: Optional[List[str]] = None,
+    write_ir: bool = False,
+    symmetry: bool = False,
+) -> Dict[str, str]:
+    # Ground the problem once and generate every policy's DTMC from the in-memory model.
+    # Returns the directory holding each policy's dtmc.prism (and mdp.prism if written).
+    # Given `properties`, each DTMC only keeps the atoms those properties depend on.
+    # With `write_ir`, the integer-indexed ground model and policy are saved as model.npz.
+    # With `symmetry`, so are the interchangeable objects of the model, as symmetries.npz.
+    domain_file_path = os.path.join(domain_dir, "domain.pddl")
+    problem_file_path = os.path.join(domain_dir, problem_file)
+    write_ir = write_ir or symmetry
+    model_files = (MODEL_FILES if write_mdp else ["dtmc.prism"]) + (["model.npz"] if write_ir else []) + (["symmetries.npz"] if symmetry else [])
+
+    translator = None
+    mdp_file = None
+    policy_dirs = {}
+    for policy_file in policy_files:
+        policy_file_path = os.path.join(domain_dir, policy_file)
+        policy_dir = os.path.join(work_dir, os.path.splitext(policy_file)[0])
+        policy_dirs[policy_file] = policy_dir
+
+        if use_cache:
+            store = cache.Cache()
+            key = cache.model_key(domain_file_path, problem_file_path, policy_file_path, properties)
+            if store.get_model(key, model_files, policy_dir):
+                print(f"Using cached models for problem `{problem_file}`, policy `{policy_file}`")
+                continue
 
-    with open("tmp/dtmc.prism", "w") as f:
-        f.write(dtmc_text)
+        # Only ground once some policy actually needs compiling
+        if translator is None:
+            translator = ground_problem(domain_file_path, problem_file_path)
+
+        # The MDP does not depend on the policy: stream it out once and copy the file
+        os.makedirs(policy_dir, exist_ok=True)
+        if write_mdp:
+            if mdp_file is None:
+                mdp_file = os.path.join(policy_dir, "mdp.prism")
+                with open(mdp_file, "w") as f, profiling.phase("generate_mdp"):
+                    translator.write_mdp(f)
+            else:
+                shutil.copyfile(mdp_file, os.path.join(policy_dir, "mdp.prism"))
+
+        with open(policy_file_path, "r") as f:
+            policy = json.load(f)
+        with open(os.path.join(policy_dir, "dtmc.prism"), "w") as f, profiling.phase("generate_dtmc", policy=policy_file):
+            translator.write_dtmc(f, policy, properties)
+        if write_ir:
+            with profiling.phase("write_ir", policy=policy_file):
+                model = GroundModel.from_translator(translator, policy)
+                model.save(os.path.join(policy_dir, "model.npz"))
+        if symmetry:
+            with profiling.phase("symmetries", policy=policy_file):
+                symmetries.save(os.path.join(policy_dir, "symmetries.npz"), symmetries.detect(translator, model))
+
+        if use_cache:
+            store.put_model(key, policy_dir, model_files)
+    return policy_dirs
+
+@contextlib.contextmanager
+def job_profile(enabled: bool, work_dir: str, **info):
+    # With `enabled`, profiles the job and saves its record, including the results the job
+    # fills into the yielded dict, as profile.json in work_dir
+    if not enabled:
+        yield {}
+        return
+    results = {}
+    with profiling.profile(**info) as job:
+        try:
+            yield results
+        finally:
+            record = job.record()
+            record["results"] = results
+            os.makedirs(work_dir, exist_ok=True)
+            with open(os.path.join(work_dir, "profile.json"), "w") as f:
+                json.dump(record, f, indent=2)
+            print(f"Profile written to `{os.path.join(work_dir, 'profile.json')}`")
 
 def run_single(
     domain_dir: str = "data/deterministic/blocksworld/",
@@ -63,23 +517,65 @@ def run_single(
     property_file: str = "property.pctl",
     run_prism: str = "True",
     compile_dtmc: bool = True,
+    work_dir: str = "tmp/",
+    server: bool = False,
+    use_cache: bool = True,
+    engine: str = "prism",
+    skip_mdp: bool = False,
+    profile: bool = False,
+    prism_engine: Optional[str] = None,
+    symmetry: bool = False,
 ):
-    # Prepare the DTMC, as needed
-    if compile_dtmc:
-        compile_single(domain_dir, problem_file, policy_file)
-    
-    property_file_path = os.path.join(domain_dir, property_file)
+    with job_profile(profile, work_dir, problem=problem_file, policy=policy_file, property=property_file) as results:
+        # Prepare the DTMC, as needed
+        if compile_dtmc:
+            compile_single(domain_dir, problem_file, policy_file, work_dir, use_cache, not skip_mdp, engine == "smc", symmetry)
 
-    # 3. Verify
-    if run_prism != "True":
-        return
+        property_file_path = os.path.join(domain_dir, property_file)
 
-    print(f"Verifying property using generated dtmc...")
-    result = verify_property("tmp/dtmc.prism", property_file_path)
+        # 3. Verify
+        if run_prism != "True":
+            return
 
-    print(f"Result for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`: ")
-    print(result)
-    return result
+        print(f"Verifying property using generated dtmc...")
+        result = verify_property(os.path.join(work_dir, "dtmc.prism"), property_file_path, work_dir, server, use_cache, engine, prism_engine, symmetry)
+        results[property_file] = result
+
+        print(f"Result for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`: ")
+        print(result)
+        return result
+
+def run_batch(
+    domain_dir: str = "data/deterministic/blocksworld/",
+    problem_file: str = "1.pddl",
+    policy_file: str = "all_on_table.json", 
+    property_files: List[str] = ["property.pctl"],
+    compile_dtmc: bool = True,
+    work_dir: str = "tmp/",
+    server: bool = False,
+    use_cache: bool = True,
+    engine: str = "prism",
+    skip_mdp: bool = False,
+    profile: bool = False,
+    prism_engine: Optional[str] = None,
+    symmetry: bool = False,
+) -> Dict[str, Optional[str]]:
+    with job_profile(profile, work_dir, problem=problem_file, policy=policy_file, properties=property_files) as profiled:
+        # Prepare the DTMC, as needed
+        if compile_dtmc:
+            compile_single(domain_dir, problem_file, policy_file, work_dir, use_cache, not skip_mdp, engine == "smc", symmetry)
+
+        property_file_paths = [os.path.join(domain_dir, property_file) for property_file in property_files]
+
+        print(f"Verifying {len(property_files)} properties using generated dtmc...")
+        results = verify_properties(os.path.join(work_dir, "dtmc.prism"), property_file_paths, work_dir, server, use_cache, engine, prism_engine, symmetry)
+        results = {property_file: results[path] for property_file, path in zip(property_files, property_file_paths)}
+        profiled.update(results)
+
+        for property_file, result in results.items():
+            print(f"Result for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`: ")
+            print(result)
+        return results
 
 if __name__ == "__main__":
     Fire(run_single)
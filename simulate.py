@@ -0,0 +1,272 @@
+import math
+import os
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+from fire import Fire
+
+import native
+from ground_model import GroundModel
+
+# Statistical model checking: estimates the probability of a path property by simulating
+# many runs of a policy's DTMC at once on its ground model (see ground_model.py). A batch
+# of states is a (runs x atoms) boolean array. Every step evaluates all command guards for
+# the whole batch, picks one enabled command per run uniformly at random (as PRISM does for
+# DTMCs), samples an outcome of its action and applies the outcome's delete, add and
+# conditional assignments. A run without an enabled command, or in a state that every
+# enabled command and outcome leads back to, stays where it is forever.
+#
+# `estimate` simulates as many runs as the Chernoff-Hoeffding bound needs for the estimate
+# to be within `error` of the true probability with probability `confidence`. `test` decides
+# whether the probability is at least a threshold with Wald's sequential probability ratio
+# test, which stops as soon as the runs so far are conclusive. Unbounded properties are
+# followed for at most `max_steps` steps; runs still undecided then widen the interval.
+
+CONFIDENCE = float(os.environ.get("VP4_SMC_CONFIDENCE", 0.95))
+ERROR = float(os.environ.get("VP4_SMC_ERROR", 0.01))
+MAX_STEPS = int(os.environ.get("VP4_SMC_MAX_STEPS", 10_000))
+BATCH = 4096
+# Bytes of guard literals gathered per step; larger models simulate smaller batches
+GUARD_BYTES = 1 << 28
+
+
+def chernoff_runs(confidence: float, error: float) -> int:
+    # Okamoto: P(|estimate - p| > error) <= 2 exp(-2 n error^2)
+    return math.ceil(math.log(2 / (1 - confidence)) / (2 * error ** 2))
+
+
+def gather(ptr: np.ndarray, items: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # (owner, index) of every entry of the CSR slices of `items`, owner being the position in `items`
+    starts, counts = ptr[items], ptr[items + 1] - ptr[items]
+    owner = np.repeat(np.arange(len(items)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return owner, np.repeat(starts, counts) + offsets
+
+
+class Simulator:
+    def __init__(self, model: GroundModel, seed: Optional[int] = None):
+        if not model.has_policy:
+            raise ValueError("The ground model has no policy to simulate")
+        self.model = model
+        self.rng = np.random.default_rng(seed)
+        self.labels = {"goal": native.parse_expression(str(model.goal))}
+
+        # Guards are evaluated per group of commands with the same number of literals: the
+        # group's literals gathered from a batch form a (runs x commands x literals) array.
+        # Column j of `enabled` is command order[j]; text guards come last.
+        lits, ptr = model.command_guard_lits, model.command_guard_ptr
+        sizes, text = np.diff(ptr), model.command_guard_text != ""
+        self.guard_groups, order = [], []
+        for size in np.unique(sizes[~text]).tolist():
+            members = np.flatnonzero((sizes == size) & ~text)
+            group = lits[(ptr[members][:, None] + np.arange(size)).ravel()]
+            self.guard_groups.append((len(members), size, np.where(group >= 0, group, ~group), group < 0))
+            order.extend(members.tolist())
+        self.text_guards = [native.parse_expression(guard) for guard in model.command_guard_text[text].tolist()]
+        self.order = np.array(order + np.flatnonzero(text).tolist(), dtype=np.int64)
+        self.batch = max(1, min(BATCH, GUARD_BYTES // max(len(lits), 1)))
+
+        # Cumulative outcome probabilities per action, padded with inf
+        counts = np.diff(model.outcome_ptr)
+        self.outcome_counts = counts
+        self.cumulative = np.full((len(counts), max(counts.max(initial=0), 1)), np.inf)
+        for a, (start, end) in enumerate(zip(model.outcome_ptr[:-1], model.outcome_ptr[1:])):
+            self.cumulative[a, :end - start] = np.cumsum(model.outcome_probs[start:end])
+
+        values, self.cond_value_ids = np.unique(model.cond_values, return_inverse=True)
+        self.cond_value_asts = [native.parse_expression(value) for value in values.tolist()]
+        self.absorbing_states = {}
+
+    def evaluate(self, ast: Tuple, states: np.ndarray) -> np.ndarray:
+        """Truth value of the state formula `ast` (see native.py) in every row of `states`."""
+        kind = ast[0]
+        if kind == "val":
+            if not isinstance(ast[1], bool):
+                raise native.NativeUnsupported("Only boolean state formulas are supported")
+            return np.full(len(states), ast[1])
+        if kind == "id":
+            if ast[1] not in self.model.atom_ids:
+                raise native.NativeUnsupported(f"Unknown atom `{ast[1]}`")
+            return states[:, self.model.atom_ids[ast[1]]]
+        if kind == "label":
+            if ast[1] == "init":
+                return (states == self.model.init).all(axis=1)
+            if ast[1] not in self.labels:
+                raise native.NativeUnsupported(f"Unknown label `{ast[1]}`")
+            return self.evaluate(self.labels[ast[1]], states)
+        if kind == "not":
+            return ~self.evaluate(ast[1], states)
+        if kind in ("and", "or"):
+            parts = [self.evaluate(e, states) for e in ast[1]]
+            return np.logical_and.reduce(parts) if kind == "and" else np.logical_or.reduce(parts)
+        if kind == "ite":
+            return np.where(self.evaluate(ast[1], states), self.evaluate(ast[2], states), self.evaluate(ast[3], states))
+        if kind == "bin" and ast[1] in ("=", "!=", "=>", "<=>"):
+            a, b = self.evaluate(ast[2], states), self.evaluate(ast[3], states)
+            if ast[1] == "=>": return ~a | b
+            return (a != b) if ast[1] == "!=" else (a == b)
+        raise native.NativeUnsupported("Only boolean state formulas are supported")
+
+    def enabled(self, states: np.ndarray) -> np.ndarray:
+        """Enabled commands of every run, in the column order of `self.order`."""
+        runs = len(states)
+        parts = [(states[:, atoms] != negated).reshape(runs, count, size).all(axis=2) for count, size, atoms, negated in self.guard_groups]
+        parts += [self.evaluate(guard, states)[:, None] for guard in self.text_guards]
+        return np.concatenate(parts, axis=1) if parts else np.zeros((runs, 0), dtype=bool)
+
+    def apply(self, states: np.ndarray, outcomes: np.ndarray) -> np.ndarray:
+        """Successors of `states` under one outcome each."""
+        m = self.model
+        successors = states.copy()
+        owner, i = gather(m.del_ptr, outcomes)
+        successors[owner, m.dels[i]] = False
+        owner, i = gather(m.add_ptr, outcomes)
+        successors[owner, m.adds[i]] = True
+        # Conditional assignments read the state before the step
+        owner, i = gather(m.cond_ptr, outcomes)
+        for value in np.unique(self.cond_value_ids[i]):
+            selected = self.cond_value_ids[i] == value
+            rows = owner[selected]
+            successors[rows, m.cond_atoms[i[selected]]] = self.evaluate(self.cond_value_asts[value], states[rows])
+        return successors
+
+    def absorbing(self, state: np.ndarray) -> bool:
+        # Whether every outcome of every enabled command leads back to `state` (memoized)
+        key = np.packbits(state).tobytes()
+        if key not in self.absorbing_states:
+            m = self.model
+            actions = m.command_actions[self.order[self.enabled(state[None])[0]]]
+            outcomes = np.concatenate([np.arange(m.outcome_ptr[a], m.outcome_ptr[a + 1]) for a in actions] or [np.zeros(0, dtype=np.int64)])
+            successors = self.apply(np.tile(state, (len(outcomes), 1)), outcomes)
+            self.absorbing_states[key] = bool((successors == state).all())
+        return self.absorbing_states[key]
+
+    def step(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(successor of every run, mask of the runs that can never leave their state)."""
+        m = self.model
+        enabled = self.enabled(states)
+        # np.nonzero on a 2-d array is much slower than on the flattened one
+        rows, columns = np.divmod(np.flatnonzero(enabled), enabled.shape[1])
+        counts = np.bincount(rows, minlength=len(states))
+        stuck = counts == 0
+        runs = np.flatnonzero(~stuck)
+
+        # The k-th enabled command of every run, k uniform
+        k = (self.rng.random(len(runs)) * counts[runs]).astype(np.int64)
+        actions = m.command_actions[self.order[columns[(np.cumsum(counts) - counts)[runs] + k]]]
+        u = self.rng.random(len(runs))
+        index = np.minimum((self.cumulative[actions] <= u[:, None]).sum(axis=1), self.outcome_counts[actions] - 1)
+
+        successors = states.copy()
+        successors[runs] = self.apply(states[runs], m.outcome_ptr[actions] + index)
+        for run in np.flatnonzero(~stuck & (successors == states).all(axis=1)):
+            stuck[run] = self.absorbing(states[run])
+        return successors, stuck
+
+    def simulate(self, property: str, runs: int, max_steps: int = MAX_STEPS) -> Tuple[np.ndarray, np.ndarray]:
+        """(runs satisfying `property`, runs still undecided after `max_steps` steps) of `runs` fresh runs."""
+        op, bound, left, right = native.parse_property(property)
+        if op == 'X':
+            successors, _ = self.step(np.tile(self.model.init, (runs, 1)))
+            return self.evaluate(right, successors), np.zeros(runs, dtype=bool)
+
+        # F and G as until: F psi = true U psi, G phi = !(true U !phi)
+        phi = left if op == 'U' else ("val", True)
+        psi = ("not", right) if op == 'G' else right
+        states = np.tile(self.model.init, (runs, 1))
+        active = np.arange(runs)
+        reached = np.zeros(runs, dtype=bool)
+        undecided = np.zeros(runs, dtype=bool)
+        steps = max_steps if bound is None else bound
+        for t in range(steps + 1):
+            hit = self.evaluate(psi, states)
+            reached[active[hit]] = True
+            live = ~hit & self.evaluate(phi, states)
+            if t == steps or not live.any():
+                undecided[active[live]] = bound is None
+                break
+            states, active = states[live], active[live]
+            states, stuck = self.step(states)
+            # A run that cannot leave its state never satisfies psi
+            states, active = states[~stuck], active[~stuck]
+            if not len(active):
+                break
+        if op == 'G':
+            return ~reached & ~undecided, undecided
+        return reached, undecided
+
+    def _runs(self, property: str, runs: int, max_steps: int, batch: Optional[int]):
+        # Simulates in batches of at most `batch` runs, yielding (satisfied, undecided) per batch
+        batch = batch or self.batch
+        while runs > 0:
+            size = min(batch, runs)
+            yield self.simulate(property, size, max_steps)
+            runs -= size
+
+    def estimate(self, property: str, confidence: float = CONFIDENCE, error: float = ERROR,
+                 max_steps: int = MAX_STEPS, batch: Optional[int] = None) -> Tuple[float, float, float]:
+        """(estimate, lower, upper) of the probability of `property`."""
+        runs = chernoff_runs(confidence, error)
+        satisfied = undecided = 0
+        for sat, und in self._runs(property, runs, max_steps, batch):
+            satisfied += int(sat.sum())
+            undecided += int(und.sum())
+        if undecided:
+            print(f"{undecided} of {runs} runs undecided after {max_steps} steps for `{property}`")
+        p = satisfied / runs
+        return p, max(p - error, 0.0), min((satisfied + undecided) / runs + error, 1.0)
+
+    def test(self, property: str, threshold: float, confidence: float = CONFIDENCE, error: float = ERROR,
+             max_steps: int = MAX_STEPS, batch: Optional[int] = None, max_runs: int = 10_000_000) -> Optional[bool]:
+        """Whether the probability of `property` is at least `threshold` (None if `max_runs` runs
+        were inconclusive). Both errors are bounded by 1 - confidence outside threshold +- error;
+        undecided runs count as not satisfying the property."""
+        p0, p1 = threshold + error, threshold - error
+        if not 0 < p1 < p0 < 1:
+            raise ValueError(f"threshold +- error must lie strictly between 0 and 1, got {threshold} +- {error}")
+        alpha = 1 - confidence
+        accept_low, accept_high = math.log((1 - alpha) / alpha), math.log(alpha / (1 - alpha))
+        ratio = 0.0
+        for sat, _ in self._runs(property, max_runs, max_steps, batch):
+            # Log-likelihood ratio of p <= p1 against p >= p0 after each run
+            steps = np.where(sat, math.log(p1 / p0), math.log((1 - p1) / (1 - p0)))
+            ratios = ratio + np.cumsum(steps)
+            decided = np.flatnonzero((ratios >= accept_low) | (ratios <= accept_high))
+            if len(decided):
+                return bool(ratios[decided[0]] <= accept_high)
+            ratio = ratios[-1]
+        return None
+
+
+def format_estimate(estimate: Tuple[float, float, float]) -> str:
+    p, lower, upper = estimate
+    return f"{p:.4f} [{lower:.4f}, {upper:.4f}]"
+
+
+def check(model_file: str, properties: Dict[str, str], seed: Optional[int] = None) -> Dict[str, Optional[str]]:
+    """Estimates for `properties` on the ground model in `model_file`, None where unsupported."""
+    simulator = Simulator(GroundModel.load(model_file), seed)
+    results = {}
+    for key, property in properties.items():
+        try:
+            results[key] = format_estimate(simulator.estimate(property))
+        except native.NativeUnsupported as e:
+            print(f"Simulation cannot check `{property}` ({e}).")
+            results[key] = None
+    return results
+
+
+def main(model_file: str, property: str, confidence: float = CONFIDENCE, error: float = ERROR,
+         threshold: Optional[float] = None, max_steps: int = MAX_STEPS, seed: Optional[int] = None):
+    """Estimates the probability of `property` on a saved ground model (model.npz), or with
+    `threshold`, tests whether it is at least that."""
+    simulator = Simulator(GroundModel.load(model_file), seed)
+    if threshold is None:
+        print(format_estimate(simulator.estimate(property, confidence, error, max_steps)))
+        return
+    result = simulator.test(property, threshold, confidence, error, max_steps)
+    print("Inconclusive" if result is None else f"P {'>=' if result else '<'} {threshold}")
+
+
+if __name__ == "__main__":
+    Fire(main)
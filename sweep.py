@@ -0,0 +1,118 @@
+import csv
+import itertools
+import json
+import os
+from typing import Dict, List, Optional, Union
+
+from fire import Fire
+
+import native
+import run
+from translation import ground_problem
+
+# Sensitivity of a property to outcome probabilities. The swept outcomes are lifted into
+# PRISM constants (see PPDDLToPRISM._lift_probabilities), so the DTMC is generated once and
+# PRISM checks the property for the whole range in one invocation (-const p=lo:step:hi).
+
+
+def parse_ranges(ranges: Union[str, List[str], Dict[str, str]]) -> Dict[str, str]:
+    # "schema:k=lo:step:hi" (or "=value") entries, comma separated or as a list
+    if isinstance(ranges, dict):
+        return {str(k): str(v) for k, v in ranges.items()}
+    if isinstance(ranges, str):
+        ranges = ranges.split(",")
+    parsed = {}
+    for entry in ranges:
+        parameter, sep, values = str(entry).partition("=")
+        if not sep:
+            raise ValueError(f"Expected `action:outcome=lo:step:hi` or `action:outcome=value`, got `{entry}`")
+        parsed[parameter.strip()] = values.strip()
+    return parsed
+
+
+def expand_range(values: str) -> List[float]:
+    # PRISM's range syntax: value, lo:hi (step 1) or lo:step:hi, bounds included
+    parts = [float(v) for v in values.split(":")]
+    if len(parts) == 1:
+        return parts
+    lo, step, hi = (parts[0], 1.0, parts[1]) if len(parts) == 2 else parts
+    count = int(round((hi - lo) / step + 1e-9))
+    return [round(lo + i * step, 12) for i in range(count + 1)]
+
+
+def check_prism(dtmc_file: str, property: str, constants: Dict[str, str], work_dir: str) -> List[List[str]]:
+    results_file = os.path.join(work_dir, "sweep.csv")
+    if os.path.exists(results_file):
+        os.remove(results_file)
+    const = ",".join(f"{name}={values}" for name, values in constants.items())
+    command = ["prism", dtmc_file, "-pctl", f"P=? [{property}]", "-const", const]
+    output_data = run.run_prism(command, f"{results_file}:csv")
+    if output_data.returncode != 0 or not os.path.exists(results_file):
+        raise RuntimeError(f"PRISM returned {output_data.returncode} on inputs `{command}` with info:\n--- stdout ---\n{output_data.stdout}\n--- stderr ---\n{output_data.stderr}")
+    with open(results_file, "r") as f:
+        rows = [row for row in csv.reader(f) if row]
+    # The header names the constants and "Result"; the rows are in the same order
+    return rows[1:]
+
+
+def check_native(dtmc_file: str, property: str, constants: Dict[str, str]) -> List[List[str]]:
+    # The native engine explores the model again for every combination of values
+    names = list(constants)
+    rows = []
+    for values in itertools.product(*(expand_range(constants[name]) for name in names)):
+        dtmc = native.load(dtmc_file, constants=dict(zip(names, values)))
+        rows.append([*map(str, values), native.check(dtmc, property)])
+    return rows
+
+
+def sweep(
+    domain_dir: str = "data/stochastic/exploding-blocksworld/",
+    problem_file: str = "3.pddl",
+    policy_file: str = "risky_stack.json",
+    property_file: str = "goal.pctl",
+    ranges: Union[str, List[str]] = "put-down-detonation:0=0:0.1:1",
+    work_dir: str = "tmp/sweep/",
+    engine: str = "prism",
+    out: Optional[str] = None,
+):
+    """Checks the property for every combination of the outcome probabilities in `ranges`.
+
+    Each entry of `ranges` is `action:outcome=lo:step:hi` (or `=value`), where outcome is
+    the index of the outcome in the action's probabilistic effect (0 if omitted). Prints
+    the results as a table and, with `out`, writes them as CSV."""
+    ranges = parse_ranges(ranges)
+    translator = ground_problem(os.path.join(domain_dir, "domain.pddl"), os.path.join(domain_dir, problem_file), parameters=list(ranges))
+    constants = {translator.parameter_name(parameter): values for parameter, values in ranges.items()}
+
+    os.makedirs(work_dir, exist_ok=True)
+    dtmc_file = os.path.join(work_dir, "dtmc.prism")
+    with open(os.path.join(domain_dir, policy_file), "r") as f:
+        policy = json.load(f)
+    with open(dtmc_file, "w") as f:
+        translator.write_dtmc(f, policy)
+    with open(os.path.join(domain_dir, property_file), "r") as f:
+        property = f.read().strip()
+
+    if engine == "native":
+        rows = check_native(dtmc_file, property, constants)
+    else:
+        rows = check_prism(dtmc_file, property, constants, work_dir)
+
+    header = [*constants, "Result"]
+    if not rows:
+        print(f"No results for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`")
+    widths = [max([len(h), *(len(row[i]) for row in rows)]) + 2 for i, h in enumerate(header)]
+    print(f"\nResults for problem `{problem_file}`, policy `{policy_file}`, property `{property_file}`:")
+    print("".join(f"| {h:<{w}}" for h, w in zip(header, widths)) + "|")
+    print("-" * (sum(widths) + 2 * len(widths) + 1))
+    for row in rows:
+        print("".join(f"| {v:<{w}}" for v, w in zip(row, widths)) + "|")
+
+    if out:
+        with open(out, "w", newline="") as f:
+            csv.writer(f).writerows([header, *rows])
+        print(f"Wrote `{out}`")
+
+
+if __name__ == "__main__":
+    Fire(sweep)
@@ -0,0 +1,340 @@
+import itertools
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+import native
+from ground_model import GroundModel
+from simulate import Simulator, gather
+
+# Object symmetries. Two objects of the same type are interchangeable when swapping them
+# maps the initial state (static facts included), every ground action and its outcomes and
+# the policy's commands onto themselves. `detect` finds every such pair when the model is
+# compiled and saves, for each, the permutation of the atom ids that swaps them. The pairs
+# under which the properties (and the goal, if they refer to it) are also invariant generate a group of object
+# permutations (all permutations within each class of interchangeable objects), and
+# `Quotient` explores the policy's DTMC over one canonical state per orbit of that group:
+# the lexicographically smallest image of the state. Every state of an orbit satisfies the
+# same properties with the same probability, so the quotient gives the same results with up
+# to n! fewer states for n interchangeable objects.
+
+# Largest group whose elements are enumerated to canonicalize states; beyond it only a
+# subgroup is used (still sound, just less reduction)
+MAX_GROUP = 5040
+
+
+def _rename(ast: Tuple, names: Dict[str, str], labels: Dict[str, Tuple] = {}) -> Tuple:
+    # Expression (see native.py) with atoms renamed and `labels` expanded, and the operands
+    # of & and | ordered so that equal expressions compare equal
+    kind = ast[0]
+    if kind == "id":
+        return ("id", names.get(ast[1], ast[1]))
+    if kind == "label" and ast[1] in labels:
+        return _rename(labels[ast[1]], names, labels)
+    if kind in ("and", "or"):
+        return (kind, tuple(sorted((_rename(e, names, labels) for e in ast[1]), key=repr)))
+    if kind in ("not", "neg"):
+        return (kind, _rename(ast[1], names, labels))
+    if kind == "bin":
+        return ("bin", ast[1], _rename(ast[2], names, labels), _rename(ast[3], names, labels))
+    if kind == "ite":
+        return ("ite", *(_rename(e, names, labels) for e in ast[1:]))
+    return ast
+
+
+def _invariant(ast: Optional[Tuple], names: Dict[str, str], labels: Dict[str, Tuple] = {}) -> bool:
+    return ast is None or _rename(ast, names, labels) == _rename(ast, {}, labels)
+
+
+class _Detector:
+    def __init__(self, translator, model: GroundModel):
+        self.model = model
+        self.atom_keys = {model.atom_ids[atom]: key for atom, key in translator.atom_args.items() if atom in model.atom_ids}
+        self.atom_ids = {key: i for i, key in self.atom_keys.items()}
+        self.action_keys = [(action["schema"], tuple(action["args"])) for action in translator.ground_actions]
+        self.action_ids = {key: i for i, key in enumerate(self.action_keys)}
+        self.init = {(atom.name, tuple(arg.name for arg in atom.arguments)) for atom in translator.problem.initial}
+
+        # Everything a swap of two objects can change, indexed by object
+        self.init_of, self.atoms_of, self.actions_of = defaultdict(list), defaultdict(list), defaultdict(list)
+        for fact in self.init:
+            for obj in set(fact[1]): self.init_of[obj].append(fact)
+        for i, (_, args) in self.atom_keys.items():
+            for obj in set(args): self.atoms_of[obj].append(i)
+        for i, (_, args) in enumerate(self.action_keys):
+            for obj in set(args): self.actions_of[obj].append(i)
+
+        lits, ptr = model.command_guard_lits, model.command_guard_ptr
+        self.command_lits = [frozenset(lits[ptr[c]:ptr[c + 1]].tolist()) for c in range(len(model.command_rules))]
+        self.command_text = [native.parse_expression(text) if text else None for text in model.command_guard_text.tolist()]
+        self.commands_of_action, self.commands_of_atom = defaultdict(list), defaultdict(list)
+        for c, action in enumerate(model.command_actions.tolist()):
+            self.commands_of_action[action].append(c)
+            for lit in self.command_lits[c]:
+                self.commands_of_atom[lit if lit >= 0 else ~lit].append(c)
+            for atom in _identifiers(self.command_text[c]):
+                if atom in model.atom_ids: self.commands_of_atom[model.atom_ids[atom]].append(c)
+
+    def atom_permutation(self, swap: Dict[str, str]) -> Optional[np.ndarray]:
+        """Atom ids after renaming objects by `swap`, None if some renamed atom does not exist."""
+        perm = np.arange(len(self.model.atoms))
+        for obj in swap:
+            for i in self.atoms_of[obj]:
+                pred, args = self.atom_keys[i]
+                j = self.atom_ids.get((pred, tuple(swap.get(a, a) for a in args)))
+                if j is None:
+                    return None
+                perm[i] = j
+        return perm
+
+    def is_symmetry(self, a: str, b: str) -> bool:
+        """Whether swapping objects `a` and `b` maps the model onto itself."""
+        m = self.model
+        swap = {a: b, b: a}
+        for pred, args in self.init_of[a] + self.init_of[b]:
+            if (pred, tuple(swap.get(x, x) for x in args)) not in self.init:
+                return False
+        perm = self.atom_permutation(swap)
+        if perm is None:
+            return False
+        names = {m.atoms[i]: m.atoms[j] for i, j in enumerate(perm.tolist()) if i != j}
+
+        def mapped(lits: Iterable[int]) -> frozenset:
+            return frozenset(int(perm[l]) if l >= 0 else ~int(perm[~l]) for l in lits)
+
+        # Actions, with their guards and outcomes
+        actions = {}
+        for i in set(self.actions_of[a] + self.actions_of[b]):
+            schema, args = self.action_keys[i]
+            j = self.action_ids.get((schema, tuple(swap.get(x, x) for x in args)))
+            if j is None:
+                return False
+            actions[i] = j
+            guard, image = m.guard_lits[m.guard_ptr[i]:m.guard_ptr[i + 1]], m.guard_lits[m.guard_ptr[j]:m.guard_ptr[j + 1]]
+            if mapped(guard.tolist()) != frozenset(image.tolist()) or self._outcomes(i, perm, names) != self._outcomes(j):
+                return False
+
+        # The policy's commands, as a multiset: PRISM picks uniformly among the enabled ones
+        affected = set(c for i in actions for c in self.commands_of_action[i])
+        affected.update(c for i in np.flatnonzero(perm != np.arange(len(perm))).tolist() for c in self.commands_of_atom[i])
+        def command(c: int, swapped: bool) -> Tuple:
+            action, lits, text = int(m.command_actions[c]), self.command_lits[c], self.command_text[c]
+            if swapped:
+                action, lits = actions.get(action, action), mapped(lits)
+            return action, lits, text and _rename(text, names if swapped else {})
+        return Counter(command(c, True) for c in affected) == Counter(command(c, False) for c in affected)
+
+    def _outcomes(self, action: int, perm: Optional[np.ndarray] = None, names: Dict[str, str] = {}) -> Counter:
+        # The outcomes of `action` (renamed by `perm` and `names`) as a multiset
+        m = self.model
+        result = Counter()
+        for o in range(m.outcome_ptr[action], m.outcome_ptr[action + 1]):
+            adds, dels = m.adds[m.add_ptr[o]:m.add_ptr[o + 1]], m.dels[m.del_ptr[o]:m.del_ptr[o + 1]]
+            conds = zip(m.cond_atoms[m.cond_ptr[o]:m.cond_ptr[o + 1]].tolist(), m.cond_values[m.cond_ptr[o]:m.cond_ptr[o + 1]].tolist())
+            if perm is not None:
+                adds, dels = perm[adds], perm[dels]
+                conds = ((int(perm[atom]), value) for atom, value in conds)
+            conds = frozenset((atom, _rename(native.parse_expression(value), names)) for atom, value in conds)
+            result[(float(m.outcome_probs[o]), frozenset(adds.tolist()), frozenset(dels.tolist()), conds)] += 1
+        return result
+
+
+def _identifiers(ast: Optional[Tuple]) -> List[str]:
+    # Identifiers in an expression (see native.py)
+    if ast is None: return []
+    if ast[0] == "id": return [ast[1]]
+    if ast[0] in ("and", "or"): return [a for e in ast[1] for a in _identifiers(e)]
+    return [a for e in ast[1:] if isinstance(e, tuple) for a in _identifiers(e)]
+
+
+def detect(translator, model: GroundModel) -> Dict[str, np.ndarray]:
+    """Every pair of interchangeable objects ("pairs") and the atom permutation swapping them ("perms")."""
+    detector = _Detector(translator, model)
+    constants = {c.name for c in (getattr(translator.domain, "constants", None) or [])}
+
+    # Only objects that occur the same way in the initial state can be interchangeable
+    def signature(obj: str) -> Tuple:
+        return tuple(sorted(Counter((pred, args.index(obj)) for pred, args in detector.init_of[obj]).items()))
+
+    pairs, perms = [], []
+    for objs in translator.objects.values():
+        by_signature = defaultdict(list)
+        for obj in objs:
+            if obj not in constants: by_signature[signature(obj)].append(obj)
+        for candidates in by_signature.values():
+            # Interchangeability is transitive, so each object is only tested against one
+            # object of every class found so far
+            classes = []
+            for obj in candidates:
+                for members in classes:
+                    if detector.is_symmetry(members[0], obj):
+                        members.append(obj)
+                        break
+                else:
+                    classes.append([obj])
+            for members in classes:
+                for a, b in itertools.combinations(members, 2):
+                    pairs.append((a, b))
+                    perms.append(detector.atom_permutation({a: b, b: a}))
+    return {
+        "pairs": np.array(pairs, dtype=str).reshape(-1, 2),
+        "perms": np.array(perms, dtype=np.int32).reshape(-1, len(model.atoms)),
+    }
+
+
+def save(path: str, symmetries: Dict[str, np.ndarray]):
+    np.savez(path, **symmetries)
+
+
+def load(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path, allow_pickle=False) as data:
+        return {name: data[name] for name in data.files}
+
+
+def group(model: GroundModel, symmetries: Dict[str, np.ndarray], properties: Iterable[str] = ()) -> np.ndarray:
+    """Atom permutations of the group generated by the swaps that keep every property (identity first)."""
+    parsed = [native.parse_property(property) for property in properties]
+    labels = {"goal": native.parse_expression(str(model.goal))}
+    atoms = model.atoms.tolist()
+    elements = np.arange(len(atoms))[None]
+    for perm in symmetries["perms"]:
+        names = {atoms[i]: atoms[j] for i, j in enumerate(perm.tolist()) if i != j}
+        if not all(_invariant(left, names, labels) and _invariant(right, names, labels) for _, _, left, right in parsed):
+            continue
+        if any((element == perm).all() for element in elements):
+            continue
+        closure = _closure(elements, perm)
+        if closure is not None:
+            elements = closure
+    return elements
+
+
+def _closure(elements: np.ndarray, generator: np.ndarray) -> Optional[np.ndarray]:
+    # The group generated by `elements` (a group) and `generator`, None if larger than MAX_GROUP
+    seen = {e.tobytes(): e for e in elements}
+    frontier = list(seen.values())
+    generators = [generator] + [e for e in elements[1:]]
+    while frontier:
+        new = []
+        for e in frontier:
+            for g in generators:
+                p = e[g]
+                key = p.tobytes()
+                if key not in seen:
+                    seen[key] = p
+                    new.append(p)
+                    if len(seen) > MAX_GROUP:
+                        return None
+        frontier = new
+    return np.array(list(seen.values()))
+
+
+class Quotient(native.DTMC):
+    """The reachable fragment of a ground model's DTMC over canonical orbit representatives
+    (state 0 is the initial state). Checked like a native.DTMC, and exported with
+    native.export_explicit with the atoms as variables."""
+
+    def __init__(self, model: GroundModel, elements: np.ndarray, max_states: int = native.MAX_STATES):
+        self.elements = elements
+        self.simulator = Simulator(model)
+        self.model = SimpleNamespace(variables=model.atoms.tolist(), labels=dict(self.simulator.labels), formulas={})
+
+        representatives, keys = self.canonical(model.init[None])
+        index = {keys[0].tobytes(): 0}
+        states = [representatives[0]]
+        rows, cols, probs, deadlocks = [], [], [], []
+        done = 0
+        while done < len(states):
+            sources = np.arange(done, len(states))
+            batch = np.array(states[done:])
+            done = len(states)
+
+            enabled = self.simulator.enabled(batch)
+            counts = enabled.sum(axis=1)
+            run, columns = np.divmod(np.flatnonzero(enabled), enabled.shape[1])
+            owner, outcomes = gather(model.outcome_ptr, model.command_actions[self.simulator.order[columns]])
+            origin = run[owner]
+            successors = self.simulator.apply(batch[origin], outcomes)
+            p = model.outcome_probs[outcomes] / counts[origin]
+            # Deadlocks become self-loops, as PRISM does by default
+            stuck = np.flatnonzero(counts == 0)
+            deadlocks.extend(sources[stuck].tolist())
+            origin = np.concatenate([origin, stuck])
+            successors = np.concatenate([successors, batch[stuck]])
+            p = np.concatenate([p, np.ones(len(stuck))])
+
+            successors, keys = self.canonical(successors)
+            for k, (state, key) in enumerate(zip(successors, keys)):
+                key = key.tobytes()
+                j = index.get(key)
+                if j is None:
+                    j = index[key] = len(states)
+                    states.append(state)
+                    if j >= max_states:
+                        raise native.NativeUnsupported(f"More than {max_states} reachable states")
+                cols.append(j)
+            rows.extend(sources[origin].tolist())
+            probs.extend(p.tolist())
+
+        self.representatives = np.array(states)
+        self.states = [tuple(state) for state in self.representatives.tolist()]
+        self.n = len(states)
+        # Merge the transitions to the same orbit
+        pairs, inverse = np.unique(np.array(rows, dtype=np.int64) * self.n + np.array(cols, dtype=np.int64), return_inverse=True)
+        self.rows, self.cols = np.divmod(pairs, self.n)
+        self.probs = np.bincount(inverse, weights=probs)
+        self.deadlock = np.zeros(self.n, dtype=bool)
+        self.deadlock[deadlocks] = True
+
+    def canonical(self, states: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(representative, packed key) of every state: its lexicographically smallest image."""
+        best, best_key = states.copy(), np.packbits(states, axis=1)
+        rows = np.arange(len(states))
+        for perm in self.elements[1:]:
+            image = states[:, perm]
+            key = np.packbits(image, axis=1)
+            differs = key != best_key
+            first = differs.argmax(axis=1)
+            smaller = differs.any(axis=1) & (key[rows, first] < best_key[rows, first])
+            best[smaller], best_key[smaller] = image[smaller], key[smaller]
+        return best, best_key
+
+    def satisfying(self, ast: Tuple) -> np.ndarray:
+        if ast == ("label", "deadlock"):
+            return self.deadlock.copy()
+        if ast == ("label", "init"):
+            return np.arange(self.n) == 0
+        return self.simulator.evaluate(ast, self.representatives)
+
+
+def _quotient(model: GroundModel, elements: np.ndarray, max_states: int) -> Quotient:
+    dtmc = Quotient(model, elements, max_states)
+    print(f"Symmetry reduction: group of {len(elements)} object permutations, {dtmc.n} states")
+    return dtmc
+
+
+def quotient(model_file: str, symmetries_file: str, properties: List[str], max_states: int = native.MAX_STATES) -> Quotient:
+    """The quotient of the ground model in `model_file` under the symmetries in `symmetries_file`
+    that keep all of `properties`."""
+    model = GroundModel.load(model_file)
+    return _quotient(model, group(model, load(symmetries_file), properties), max_states)
+
+
+def quotients(model_file: str, symmetries_file: str, properties: Dict[str, str], max_states: int = native.MAX_STATES) -> Dict[str, Quotient]:
+    """Like `quotient`, separately for each property: the group only has to keep that property,
+    and properties with the same group share one quotient. Properties the native engine cannot
+    parse are left out."""
+    model = GroundModel.load(model_file)
+    symmetries = load(symmetries_file)
+    shared, result = {}, {}
+    for key, property in properties.items():
+        try:
+            elements = group(model, symmetries, [property])
+        except native.NativeUnsupported:
+            continue
+        if elements.tobytes() not in shared:
+            shared[elements.tobytes()] = _quotient(model, elements, max_states)
+        result[key] = shared[elements.tobytes()]
+    return result
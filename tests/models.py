@@ -0,0 +1,57 @@
+import functools
+import json
+import os
+from typing import Dict, List, Optional
+
+import native
+import translation
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def domain_dir(domain: str) -> str:
+    return os.path.join(DATA_DIR, domain)
+
+
+def problems(domain: str) -> List[str]:
+    return sorted(f for f in os.listdir(domain_dir(domain)) if f.endswith(".pddl") and f != "domain.pddl")
+
+
+def policies(domain: str) -> List[str]:
+    return sorted(f for f in os.listdir(domain_dir(domain)) if f.endswith(".json"))
+
+
+def properties(domain: str) -> Dict[str, str]:
+    # Property file -> property, as main.py reads them
+    result = {}
+    for name in sorted(os.listdir(domain_dir(domain))):
+        if name.endswith(".pctl"):
+            with open(os.path.join(domain_dir(domain), name), "r") as f:
+                result[name] = f.read().strip()
+    return result
+
+
+def policy(domain: str, policy_file: str) -> list:
+    with open(os.path.join(domain_dir(domain), policy_file), "r") as f:
+        return json.load(f)
+
+
+@functools.lru_cache(maxsize=None)
+def ground(domain: str, problem_file: str, mutex_groups: bool = True) -> translation.PPDDLToPRISM:
+    # Grounding is the slow part; every test of a problem shares one translator
+    return translation.ground_problem(os.path.join(domain_dir(domain), "domain.pddl"), os.path.join(domain_dir(domain), problem_file), mutex_groups)
+
+
+def dtmc(path: str, domain: str, problem_file: str, policy_file: str, mutex_groups: bool = True, coi_properties: Optional[List[str]] = None) -> native.DTMC:
+    # Writes the policy's DTMC to `path` and loads it into the native engine
+    with open(path, "w") as f:
+        ground(domain, problem_file, mutex_groups).write_dtmc(f, policy(domain, policy_file), coi_properties)
+    return native.load(path)
+
+
+def check(dtmc: native.DTMC, property: str) -> Optional[float]:
+    # None where the native engine cannot check the property
+    try:
+        return float(native.check(dtmc, property))
+    except native.NativeUnsupported:
+        return None
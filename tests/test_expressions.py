@@ -0,0 +1,63 @@
+import pytest
+
+import expressions
+from expressions import FALSE, TRUE
+
+
+def test_parse_precedence():
+    # & binds tighter than |, ! tighter than both
+    assert expressions.parse("a | b & !c") == ("or", (("atom", "a"), ("and", (("atom", "b"), ("not", ("atom", "c"))))))
+    assert expressions.parse("(a | b) & c") == ("and", (("or", (("atom", "a"), ("atom", "b"))), ("atom", "c")))
+
+
+def test_parse_constants_and_dashes():
+    assert expressions.parse("true") == TRUE
+    assert expressions.parse("!false") == ("not", FALSE)
+    assert expressions.parse("at-robot_x1") == ("atom", "at_robot_x1")
+
+
+@pytest.mark.parametrize("text", ["a &", "(a | b", "a b", "& a", "a | )", "a $ b"])
+def test_parse_errors(text):
+    with pytest.raises(ValueError):
+        expressions.parse(text)
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("a & true", "a"),
+    ("a & false", "false"),
+    ("a | true", "true"),
+    ("a | false", "a"),
+    ("!!a", "a"),
+    ("!true", "false"),
+    ("true & true", "true"),
+    ("false | false", "false"),
+    ("a & (b & c)", "a & b & c"),
+    ("a | (b | !c)", "a | b | !c"),
+    ("a & (b | c)", "a & (b | c)"),
+    ("!(a & b)", "!(a & b)"),
+    ("(a | false) & (b & true)", "a & b"),
+])
+def test_simplify(text, expected):
+    assert expressions.to_prism(expressions.simplify(expressions.parse(text))) == expected
+
+
+def test_simplify_keeps_meaning():
+    expr = expressions.parse("(a & !b) | !(c | false) & (true | d)")
+    simplified = expressions.simplify(expr)
+    for bits in range(16):
+        state = {name: bool(bits >> i & 1) for i, name in enumerate("abcd")}
+        assert expressions.evaluate(simplified, state) == expressions.evaluate(expr, state)
+
+
+def test_substitute_folds_atoms():
+    expr = expressions.parse("a & (b | c)")
+    folded = expressions.substitute(expr, {"a": True, "b": False}.get)
+    assert expressions.to_prism(expressions.simplify(folded)) == "c"
+    assert expressions.substitute(expr, lambda atom: ("atom", "x") if atom == "c" else None) == expressions.parse("a & (b | x)")
+
+
+def test_atoms():
+    expr = expressions.parse("a & !(b | a) & c")
+    assert expressions.atoms(expr) == {"a", "b", "c"}
+    assert expressions.required_atoms(expr) == ["a", "c"]
+    assert expressions.required_atoms(expressions.parse("a | b")) == []
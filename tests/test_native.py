@@ -0,0 +1,63 @@
+import pytest
+
+import models
+import native
+
+
+@pytest.mark.parametrize("property, expected", [
+    ('F "goal"', ("F", None, None, ("label", "goal"))),
+    ('F<=3 "goal"', ("F", 3, None, ("label", "goal"))),
+    ("F<3 x", ("F", 2, None, ("id", "x"))),
+    ("G !a", ("G", None, None, ("not", ("id", "a")))),
+    ("X a", ("X", None, None, ("id", "a"))),
+    ("a U<=5 b", ("U", 5, ("id", "a"), ("id", "b"))),
+    ("!a & b U c | d", ("U", None, ("and", [("not", ("id", "a")), ("id", "b")]), ("or", [("id", "c"), ("id", "d")]))),
+    ("F x=2", ("F", None, None, ("bin", "=", ("id", "x"), ("val", 2)))),
+])
+def test_parse_property(property, expected):
+    assert native.parse_property(property) == expected
+
+
+@pytest.mark.parametrize("property", ["P=? [F a]", "F>3 a", "F[2,3] a", "X<=2 a", "F a b"])
+def test_parse_property_unsupported(property):
+    with pytest.raises(native.NativeUnsupported):
+        native.parse_property(property)
+
+
+# (domain, problem, policy, property, reachable states, probability) of the bundled domains,
+# under the DTMC semantics of the README: a rule fires only where its action is applicable
+PINNED = [
+    ("deterministic/blocksworld", "2.pddl", "stack.json", "goal.pctl", 22, 1 / 6),
+    ("deterministic/blocksworld", "3.pddl", "all_on_table.json", "goal.pctl", 7, 1.0),
+    ("deterministic/blocksworld", "4.pddl", "stack.json", "property.pctl", 2, 0.0),
+    ("deterministic/maze", "4.pddl", "unbiased_walk.json", "goal.pctl", 28, 1.0),
+    ("deterministic/maze", "4.pddl", "unbiased_walk_no_left.json", "goal.pctl", 17, 0.0),
+    ("deterministic/maze", "7.pddl", "monotonic.json", "goal.pctl", 9, 0.25),
+    ("deterministic/maze", "7.pddl", "unbiased_walk_no_left.json", "goal.pctl", 9, 0.2),
+    ("deterministic/maze-dir", "4.pddl", "right_hand_on_wall.json", "goal.pctl", 112, 1.0),
+    ("deterministic/maze-dir", "7.pddl", "monotonic.json", "goal.pctl", 13, 0.25),
+    ("deterministic/maze-dir", "8.pddl", "rhow.json", "goal.pctl", 1, 0.0),
+    ("stochastic/bomb-in-toilet", "3.pddl", "dunk_bomb.json", "goal.pctl", 16, 0.95),
+    ("stochastic/bomb-in-toilet", "4.pddl", "dunk_bomb.json", "eventually_clogged.pctl", 3, 0.05),
+    ("stochastic/bomb-in-toilet", "4.pddl", "dunk_safe.json", "goal.pctl", 2, 0.0),
+    ("stochastic/exploding-blocksworld", "1.pddl", "risky_stack.json", "safe_stack.pctl", 7, 0.45),
+    ("stochastic/exploding-blocksworld", "2.pddl", "all_on_table.json", "safe_table.pctl", 4, 0.6),
+    ("stochastic/exploding-blocksworld", "3.pddl", "all_on_table.json", "on_table.pctl", 12, 0.36),
+    ("stochastic/exploding-blocksworld", "5.pddl", "all_on_table.json", "goal.pctl", 8, 0.36),
+    ("stochastic/exploding-blocksworld", "7.pddl", "all_on_table.json", "on_table.pctl", 20, 0.1296),
+]
+
+
+@pytest.mark.parametrize("domain, problem_file, policy_file, property_file, states, expected", PINNED)
+def test_pinned_results(tmp_path, domain, problem_file, policy_file, property_file, states, expected):
+    dtmc = models.dtmc(str(tmp_path / "dtmc.prism"), domain, problem_file, policy_file)
+    assert dtmc.n == states
+    assert models.check(dtmc, models.properties(domain)[property_file]) == pytest.approx(expected, abs=1e-9)
+
+
+def test_bounded_properties(tmp_path):
+    dtmc = models.dtmc(str(tmp_path / "dtmc.prism"), "stochastic/bomb-in-toilet", "4.pddl", "dunk_bomb.json")
+    bounded = [models.check(dtmc, f'F<={k} "goal"') for k in range(4)]
+    assert bounded == sorted(bounded)
+    assert bounded[-1] <= models.check(dtmc, 'F "goal"') + 1e-12
+    assert models.check(dtmc, 'G !"goal"') == pytest.approx(1 - models.check(dtmc, 'F "goal"'))
@@ -0,0 +1,61 @@
+import pytest
+
+import models
+import symmetries
+from ground_model import GroundModel
+
+# Mutex groups, the cone of influence and symmetry reduction each shrink the model PRISM
+# or the native engine checks; none of them may change a result
+
+DOMAINS = ["deterministic/blocksworld", "deterministic/maze", "deterministic/maze-dir", "stochastic/bomb-in-toilet", "stochastic/exploding-blocksworld"]
+
+# ebw 6 under risky_stack has ~90k states; the other jobs check in well under a second
+JOBS = [
+    (domain, problem_file, policy_file)
+    for domain in DOMAINS for problem_file in models.problems(domain) for policy_file in models.policies(domain)
+    if (domain, problem_file, policy_file) != ("stochastic/exploding-blocksworld", "6.pddl", "risky_stack.json")
+]
+
+
+def results(dtmc, domain):
+    return {name: models.check(dtmc, property) for name, property in models.properties(domain).items()}
+
+
+@pytest.mark.parametrize("domain, problem_file, policy_file", JOBS)
+def test_mutex_groups(tmp_path, domain, problem_file, policy_file):
+    grouped = models.dtmc(str(tmp_path / "grouped.prism"), domain, problem_file, policy_file)
+    flat = models.dtmc(str(tmp_path / "flat.prism"), domain, problem_file, policy_file, mutex_groups=False)
+    assert grouped.n == flat.n
+    assert results(grouped, domain) == pytest.approx(results(flat, domain), abs=1e-9)
+
+
+@pytest.mark.parametrize("domain, problem_file, policy_file", JOBS)
+def test_cone_of_influence(tmp_path, domain, problem_file, policy_file):
+    full = models.dtmc(str(tmp_path / "full.prism"), domain, problem_file, policy_file)
+    for name, property in models.properties(domain).items():
+        reduced = models.dtmc(str(tmp_path / "coi.prism"), domain, problem_file, policy_file, coi_properties=[property])
+        assert reduced.n <= full.n
+        assert models.check(reduced, property) == pytest.approx(models.check(full, property), abs=1e-9), name
+
+
+@pytest.mark.parametrize("domain, problem_file, policy_file", JOBS)
+def test_symmetry_quotient(tmp_path, domain, problem_file, policy_file):
+    translator = models.ground(domain, problem_file)
+    model = GroundModel.from_translator(translator, models.policy(domain, policy_file))
+    model.save(str(tmp_path / "model.npz"))
+    symmetries.save(str(tmp_path / "symmetries.npz"), symmetries.detect(translator, model))
+    full = models.dtmc(str(tmp_path / "dtmc.prism"), domain, problem_file, policy_file)
+    for name, property in models.properties(domain).items():
+        quotient = symmetries.quotient(str(tmp_path / "model.npz"), str(tmp_path / "symmetries.npz"), [property])
+        assert quotient.n <= full.n
+        assert models.check(quotient, property) == pytest.approx(models.check(full, property), abs=1e-9), name
+
+
+def test_symmetry_reduces_interchangeable_packages(tmp_path):
+    # The packages of bomb-in-toilet 3 are interchangeable, so their permutations collapse
+    translator = models.ground("stochastic/bomb-in-toilet", "3.pddl")
+    model = GroundModel.from_translator(translator, models.policy("stochastic/bomb-in-toilet", "dunk_bomb.json"))
+    model.save(str(tmp_path / "model.npz"))
+    symmetries.save(str(tmp_path / "symmetries.npz"), symmetries.detect(translator, model))
+    quotient = symmetries.quotient(str(tmp_path / "model.npz"), str(tmp_path / "symmetries.npz"), ['F "goal"'])
+    assert (quotient.n, models.check(quotient, 'F "goal"')) == (4, pytest.approx(0.95))
@@ -0,0 +1,30 @@
+import pytest
+
+import models
+import simulate
+from ground_model import GroundModel
+
+# (domain, problem, policy, property): stochastic and deterministic policies with
+# probabilities strictly between 0 and 1, plus a bounded property
+CASES = [
+    ("deterministic/blocksworld", "2.pddl", "stack.json", 'F "goal"'),
+    ("deterministic/maze", "7.pddl", "unbiased_walk_no_left.json", 'F "goal"'),
+    ("stochastic/bomb-in-toilet", "3.pddl", "dunk_bomb.json", 'F "goal"'),
+    ("stochastic/exploding-blocksworld", "1.pddl", "risky_stack.json", 'F "goal"'),
+    ("stochastic/exploding-blocksworld", "7.pddl", "all_on_table.json", 'F<=3 "goal"'),
+]
+
+
+@pytest.mark.parametrize("domain, problem_file, policy_file, property", CASES)
+def test_estimate_contains_exact_result(tmp_path, domain, problem_file, policy_file, property):
+    exact = models.check(models.dtmc(str(tmp_path / "dtmc.prism"), domain, problem_file, policy_file), property)
+    simulator = simulate.Simulator(GroundModel.from_translator(models.ground(domain, problem_file), models.policy(domain, policy_file)), seed=1)
+    estimate, lower, upper = simulator.estimate(property, max_steps=500)
+    assert lower <= exact <= upper
+    assert estimate == pytest.approx(exact, abs=simulate.ERROR)
+
+
+def test_sequential_test():
+    simulator = simulate.Simulator(GroundModel.from_translator(models.ground("stochastic/bomb-in-toilet", "3.pddl"), models.policy("stochastic/bomb-in-toilet", "dunk_bomb.json")), seed=1)
+    assert simulator.test('F "goal"', 0.9) is True
+    assert simulator.test('F "goal"', 0.98, error=0.01) is False
@@ -1,8 +1,9 @@
 import re
-import tempfile
 import os
 import itertools
-from typing import List, Dict, Tuple, Any, Optional
+import functools
+from collections import defaultdict
+from typing import List, Dict, Tuple, Any, Optional, Set, Iterable, Iterator, TextIO
 
 # --- PLADO IMPORT & MONKEY PATCH ---
 import plado.parser
@@ -14,24 +15,50 @@ if hasattr(plado.parser, 'sanity_checks'):
     plado.parser.sanity_checks.make_checks = _dummy_make_checks
 plado.parser.make_checks = _dummy_make_checks
 
-from plado.parser import parse
+from plado.parser import parse_domain, parse_problem, LookaheadStreamer, tokenize
+from plado import pddl
+
+import expressions
+import invariants
+import profiling
+
+
+@functools.lru_cache(maxsize=8)
+def _parse_domain_text(d_text: str):
+    # The preprocessed domain only depends on the problem through the optional
+    # prob_setup_init action, so problems of one domain usually share one parse.
+    # Parsed domains are never mutated by the translator.
+    return parse_domain(LookaheadStreamer(tokenize(d_text)))
 
 
 class PPDDLToPRISM:
-    def __init__(self, domain_file: str, problem_file: str):
+    def __init__(self, domain_file: str, problem_file: str, mutex_groups: bool = True, parameters: Optional[List[str]] = None):
         print(f"--- PREPROCESSING: {problem_file} ---")
-        self.clean_domain, self.clean_problem = self._preprocess(domain_file, problem_file)
+        with profiling.phase("preprocess"):
+            d_text, p_text = self._preprocess(domain_file, problem_file)
 
-        try:
-            self.domain_file = self.clean_domain
-            self.problem_file = self.clean_problem
-            self.domain, self.problem = parse(self.clean_domain, self.clean_problem)
-        finally:
-            pass
+        # The preprocessed texts are parsed straight from memory, nothing is written to disk
+        with profiling.phase("parse"):
+            self.domain_file = domain_file
+            self.problem_file = problem_file
+            self.domain = _parse_domain_text(d_text)
+            self.problem = parse_problem(LookaheadStreamer(tokenize(p_text)))
 
         self.objects = self._collect_objects()
+        self.init_facts = self._collect_initial_facts()
+        self.static_predicates = self._find_static_predicates()
+        self.predicate_prefixes = tuple(self._predicate_to_prism(p.name, []) for p in self.domain.predicates)
+        self.mutex_groups = mutex_groups
+        self.parameters = parameters or []
+        self.parameter_values = {}
+        self.outcome_probabilities = {}
         self.ground_atoms = []
+        self.ground_atom_set = set()
+        self.atom_args = {}
+        self.reachable_facts = None
+        self.reachable_bindings = None
         self.ground_actions = []
+        self.action_templates = {}
         self.name_to_pred_map = {n:p for n, p in zip([p.name for p in self.domain.predicates], self.domain.predicates)}
 
     def _preprocess(self, d_path, p_path):
@@ -63,13 +90,7 @@ class PPDDLToPRISM:
                 else:
                     d_text += setup_action
 
-        def write_tmp(content, suffix):
-            tf = tempfile.NamedTemporaryFile(mode='w', suffix=suffix, delete=False)
-            tf.write(content)
-            tf.close()
-            return tf.name
-            
-        return write_tmp(d_text, "domain_fixed.pddl"), write_tmp(p_text, "problem_fixed.pddl")
+        return d_text, p_text
 
     def _extract_balanced_block(self, text, start_keyword):
         start_idx = text.find(start_keyword)
@@ -94,6 +115,145 @@ class PPDDLToPRISM:
             objs.setdefault(t, []).append(o.name)
         return objs
 
+    def _collect_initial_facts(self) -> set:
+        init_facts = set()
+        for atom in self.problem.initial:
+            args = [arg.name for arg in atom.arguments]
+            init_facts.add(self._predicate_to_prism(atom.name, args))
+        return init_facts
+
+    def _modified_predicates(self, effect: Any, acc: set):
+        if isinstance(effect, pddl.ProbabilisticEffect):
+            for outcome in effect.outcomes: self._modified_predicates(outcome.effect, acc)
+        elif isinstance(effect, pddl.ConjunctiveEffect):
+            for e in effect.effects: self._modified_predicates(e, acc)
+        elif isinstance(effect, pddl.AtomEffect):
+            acc.add(effect.name)
+        elif isinstance(effect, pddl.NegativeEffect):
+            acc.add(effect.atom.name)
+        elif isinstance(effect, (pddl.ConditionalEffect, pddl.UniversalEffect)):
+            self._modified_predicates(effect.effect, acc)
+
+    def _find_static_predicates(self) -> set:
+        # A predicate is static if no action effect (including the generated
+        # prob_setup_init action) ever adds or deletes one of its atoms.
+        modified = set()
+        for action in self.domain.actions:
+            self._modified_predicates(action.effect, modified)
+        return {p.name for p in self.domain.predicates if p.name not in modified}
+
+    def _fold_constant_atom(self, atom: str) -> Optional[bool]:
+        # Atoms that are not state variables are either static (true iff in the
+        # initial state) or never reachable (always false).
+        if atom in self.ground_atom_set: return None
+        if atom in self.init_facts: return True
+        if any(atom == p or atom.startswith(p + '_') for p in self.predicate_prefixes): return False
+        return None
+
+    def _fold_policy_guard(self, guard: str) -> expressions.Expr:
+        return expressions.simplify(expressions.substitute(expressions.parse(guard), self._fold_constant_atom))
+
+    def _relaxed_preconditions(self, expr: Any, positive: List[Tuple[str, List[str]]],
+                               negative: List[Tuple[str, List[str]]]):
+        # Only the literals of the top-level conjunction constrain the relaxed
+        # problem: positive atoms are joined against the reachable facts and
+        # negated static atoms are checked against the initial state. Anything
+        # else (fluent negations, disjunctions) is over-approximated as true.
+        if isinstance(expr, pddl.Conjunction):
+            for e in expr.sub_formulas: self._relaxed_preconditions(e, positive, negative)
+        elif isinstance(expr, pddl.Negation):
+            atom = expr.sub_formula
+            if isinstance(atom, pddl.Atom) and atom.name in self.static_predicates:
+                negative.append((atom.name, [arg.name for arg in atom.arguments]))
+        elif isinstance(expr, pddl.Atom):
+            positive.append((expr.name, [arg.name for arg in expr.arguments]))
+
+    def _add_effects(self, effect: Any, acc: List[Tuple[str, List[str]]]):
+        # Delete effects are ignored and conditional effects are assumed to fire.
+        if isinstance(effect, pddl.ProbabilisticEffect):
+            for outcome in effect.outcomes: self._add_effects(outcome.effect, acc)
+        elif isinstance(effect, pddl.ConjunctiveEffect):
+            for e in effect.effects: self._add_effects(e, acc)
+        elif isinstance(effect, pddl.ConditionalEffect):
+            self._add_effects(effect.effect, acc)
+        elif isinstance(effect, pddl.AtomEffect):
+            acc.append((effect.name, [arg.name for arg in effect.arguments]))
+
+    def _join_preconditions(self, params: List[Tuple[str, str]], preconditions: List[Tuple[str, List[str]]],
+                            negative: List[Tuple[str, List[str]]], facts_by_pred: Dict[str, set]):
+        param_names = [name for name, _ in params]
+        variables = set(param_names)
+        type_objects = {name: set(self._get_objects_for_type(t)) for name, t in params if t != "object"}
+
+        def extend(binding: Dict[str, str], remaining: List[Tuple[str, List[str]]]):
+            if not remaining:
+                free = [(name, t) for name, t in params if name not in binding]
+                for values in itertools.product(*[self._get_objects_for_type(t) for _, t in free]):
+                    full = dict(binding)
+                    full.update(zip([name for name, _ in free], values))
+                    if any(tuple(full.get(a, a) for a in args) in facts_by_pred.get(pred_name, ())
+                           for pred_name, args in negative):
+                        continue
+                    yield tuple(full[name] for name in param_names)
+                return
+            # Join the atom with the most already-bound arguments next
+            best = max(range(len(remaining)),
+                       key=lambda i: sum(1 for a in remaining[i][1] if a in binding or a not in variables))
+            pred_name, args = remaining[best]
+            rest = remaining[:best] + remaining[best + 1:]
+            for fact in facts_by_pred.get(pred_name, ()):
+                if len(fact) != len(args): continue
+                new_binding = dict(binding)
+                for arg, obj in zip(args, fact):
+                    if arg not in variables:
+                        if arg != obj: break
+                    elif arg in new_binding:
+                        if new_binding[arg] != obj: break
+                    elif arg in type_objects and obj not in type_objects[arg]:
+                        break
+                    else:
+                        new_binding[arg] = obj
+                else:
+                    yield from extend(new_binding, rest)
+
+        yield from extend({}, preconditions)
+
+    def _relaxed_reachability(self):
+        # Delete-relaxation fixpoint from the initial state: only atoms and
+        # ground actions reachable in the relaxed problem are ever grounded.
+        if self.reachable_facts is not None: return
+        schemas = []
+        for action in self.domain.actions:
+            params = [(ptype.name, ptype.type_name) for ptype in action.parameters]
+            preconditions, negative, adds = [], [], []
+            self._relaxed_preconditions(action.precondition, preconditions, negative)
+            self._add_effects(action.effect, adds)
+            schemas.append((action.name, params, preconditions, negative, adds))
+
+        facts_by_pred = defaultdict(set)
+        for atom in self.problem.initial:
+            facts_by_pred[atom.name].add(tuple(arg.name for arg in atom.arguments))
+        bindings = {name: set() for name, _, _, _, _ in schemas}
+
+        changed = True
+        while changed:
+            changed = False
+            for name, params, preconditions, negative, adds in schemas:
+                new_facts = []
+                for args in self._join_preconditions(params, preconditions, negative, facts_by_pred):
+                    if args in bindings[name]: continue
+                    bindings[name].add(args)
+                    var_map = dict(zip([p for p, _ in params], args))
+                    for pred_name, eff_args in adds:
+                        new_facts.append((pred_name, tuple(var_map.get(a, a) for a in eff_args)))
+                for pred_name, fact in new_facts:
+                    if fact not in facts_by_pred[pred_name]:
+                        facts_by_pred[pred_name].add(fact)
+                        changed = True
+
+        self.reachable_facts = facts_by_pred
+        self.reachable_bindings = bindings
+
     def _get_objects_for_type(self, type_name: str) -> List[str]:
         if type_name == "object":
             return [o for sublist in self.objects.values() for o in sublist]
@@ -105,34 +265,9 @@ class PPDDLToPRISM:
         clean_args = [a.replace('-', '_') for a in args]
         return f"{clean_pred}_{'_'.join(clean_args)}"
 
-    def _get_list_content(self, obj: Any) -> Optional[List[Any]]:
-        for attr in ['outcomes', 'effects', 'sub_formulas', 'parts', 'children', 'operands', 'effect_list']:
-            if hasattr(obj, attr):
-                val = getattr(obj, attr)
-                if isinstance(val, (list, tuple)): return val
-        return None
-
-    def _get_child_content(self, obj: Any) -> Any:
-        candidates = ['atom', 'expression', 'operand', 'effect', 'argument', 'op', 'condition', 'formula', 'prop']
-        for attr in candidates:
-            if hasattr(obj, attr):
-                val = getattr(obj, attr)
-                if val is not None: return val
-        for attr in dir(obj):
-            if attr.startswith('_'): continue
-            val = getattr(obj, attr)
-            if hasattr(val, 'name') or hasattr(val, 'predicate') or hasattr(val, 'op') or hasattr(val, 'sub_formulas'):
-                return val
-        return None
-
-    def _get_atom_details(self, obj: Any) -> Optional[Tuple[str, List[Any]]]:
-        if hasattr(obj, 'name') and hasattr(obj, 'arguments'): return obj.name, obj.arguments
-        elif hasattr(obj, 'predicate'): return obj.predicate.name, getattr(obj, 'arguments', [])
-        return None
-
     def _resolve_prob(self, prob_obj: Any) -> float:
-        if isinstance(prob_obj, float): return prob_obj
-        if isinstance(prob_obj, int): return float(prob_obj)
+        if isinstance(prob_obj, (float, int)): return float(prob_obj)
+        if isinstance(prob_obj, pddl.NumericConstant): prob_obj = prob_obj.value_str
         if isinstance(prob_obj, str):
             if '/' in prob_obj:
                 try:
@@ -141,36 +276,9 @@ class PPDDLToPRISM:
                 except: pass
             try: return float(prob_obj)
             except: pass
-
-        op = getattr(prob_obj, 'op', None) or getattr(prob_obj, 'operator', None)
-        op_str = str(op) if op else ""
-        children = getattr(prob_obj, 'children', None) or getattr(prob_obj, 'operands', None)
-        if children and len(children) == 2 and ('/' in op_str or 'div' in op_str.lower()):
-            left = self._resolve_prob(children[0])
-            right = self._resolve_prob(children[1])
-            if right != 0: return left / right
-
-        search_space = ['token', 'value', 'number', 'constant', 'val', 'text', 'string']
-        if hasattr(prob_obj, '__dict__'):
-            search_space.extend(prob_obj.__dict__.keys())
-            
-        for attr in search_space:
-            if attr.startswith('_'): continue
-            if hasattr(prob_obj, attr):
-                val = getattr(prob_obj, attr)
-                if val is not prob_obj and val is not None:
-                    if isinstance(val, (float, int)): return float(val)
-                    if isinstance(val, str):
-                        try: return float(val)
-                        except: pass
-                    if hasattr(val, 'text'):
-                        try: return self._resolve_prob(val.text)
-                        except: pass
-                    if not isinstance(val, (list, tuple, dict)):
-                        try:
-                            ret = self._resolve_prob(val)
-                            if ret != 1.0: return ret
-                        except: pass
+        if isinstance(prob_obj, pddl.Division):
+            right = self._resolve_prob(prob_obj.rhs)
+            if right != 0: return self._resolve_prob(prob_obj.lhs) / right
 
         s = str(prob_obj)
         frac_match = re.search(r'(\d+)\s*/\s*(\d+)', s)
@@ -183,195 +291,389 @@ class PPDDLToPRISM:
         return 1.0
 
     def ground_state_variables(self):
+        self._relaxed_reachability()
         for predicate in self.domain.predicates:
-            param_types = [ptype.type_name for ptype in predicate.parameters]
-            object_lists = [self._get_objects_for_type(t) for t in param_types]
-            for args in itertools.product(*object_lists):
-                atom_name = self._predicate_to_prism(predicate.name, args)
+            if predicate.name in self.static_predicates: continue
+            for args in self.reachable_facts.get(predicate.name, ()):
+                atom_name = self._predicate_to_prism(predicate.name, list(args))
                 self.ground_atoms.append(atom_name)
+                self.atom_args[atom_name] = (predicate.name, tuple(args))
         self.ground_atoms = sorted(list(set(self.ground_atoms)))
-
-    def _translate_expression(self, expr: Any, var_map: Dict[str, str]) -> str:
-        if not expr: return "true"
-        typename = type(expr).__name__.lower()
-        
-        children = self._get_list_content(expr)
-        if children is not None:
-            parts = [self._translate_expression(e, var_map) for e in children]
-            if 'or' in typename or 'disjunct' in typename:
-                return f"({' | '.join(parts)})" if parts else "false"
-            return f"({' & '.join(parts)})" if parts else "true"
-        
-        if 'not' in typename or 'neg' in typename:
-            child = self._get_child_content(expr)
-            if child: return f"!({self._translate_expression(child, var_map)})"
-            return "true"
-
-        atom_data = self._get_atom_details(expr)
-        if atom_data:
-            pred_name, args = atom_data
-            ground_args = [var_map.get(arg.name, arg.name) for arg in args]
-            return self._predicate_to_prism(pred_name, ground_args)
-        return "true"
-
-    def _effect_to_assignments(self, effect: Any, var_map: Dict[str, str]) -> List[Tuple[str, str]]:
-        if not effect: return []
-        typename = type(effect).__name__.lower()
-        if 'prob' in typename or hasattr(effect, 'outcomes'): return [] 
-
-        children = self._get_list_content(effect)
-        if children is not None:
-            assignments = []
-            for e in children: assignments.extend(self._effect_to_assignments(e, var_map))
-            return assignments
-
-        if 'not' in typename or 'neg' in typename:
-            child = self._get_child_content(effect)
-            if child:
-                pos = self._effect_to_assignments(child, var_map)
-                return [(k, "false") for k, _ in pos]
-            return []
-
-        if 'when' in typename or 'cond' in typename:
-            condition = getattr(effect, 'condition', None)
-            inner_effect = getattr(effect, 'effect', None)
-            if condition and inner_effect:
-                cond_str = self._translate_expression(condition, var_map)
-                inner_assigns = self._effect_to_assignments(inner_effect, var_map)
-                return [(var, f"({cond_str} ? {val} : {var})") for var, val in inner_assigns]
-            return []
-
-        atom_data = self._get_atom_details(effect)
-        if atom_data:
-            pred_name, args = atom_data
-            ground_args = [var_map.get(arg.name, arg.name) for arg in args]
-            atom = self._predicate_to_prism(pred_name, ground_args)
-            return [(atom, "true")]
+        self.ground_atom_set = set(self.ground_atoms)
+
+    # --- Action templates ---
+    # Every action schema is compiled once into a template in which an atom is (name, slots),
+    # each slot being the index of an action parameter or a constant object name. Grounding
+    # then only fills in object names and folds the atoms that are not state variables.
+
+    def _atom_template(self, atom: Any, param_index: Dict[str, int]) -> Tuple[str, Tuple]:
+        slots = tuple(param_index.get(arg.name, arg.name.replace('-', '_')) for arg in atom.arguments)
+        return (atom.name.replace('-', '_'), slots)
+
+    def _compile_condition(self, expr: Any, param_index: Dict[str, int]) -> Tuple:
+        if isinstance(expr, pddl.Conjunction):
+            return ("and", tuple(self._compile_condition(e, param_index) for e in expr.sub_formulas))
+        if isinstance(expr, pddl.Disjunction):
+            return ("or", tuple(self._compile_condition(e, param_index) for e in expr.sub_formulas))
+        if isinstance(expr, pddl.Negation):
+            return ("not", self._compile_condition(expr.sub_formula, param_index))
+        if isinstance(expr, pddl.Atom):
+            return ("atom", self._atom_template(expr, param_index))
+        if isinstance(expr, pddl.Falsity):
+            return ("false",)
+        return ("true",)
+
+    def _compile_assignments(self, effect: Any, param_index: Dict[str, int]) -> List[Tuple[Tuple, Any]]:
+        # (atom, value) pairs, value being "true", "false" or ("when", condition, value)
+        if isinstance(effect, pddl.ConjunctiveEffect):
+            return [a for e in effect.effects for a in self._compile_assignments(e, param_index)]
+        if isinstance(effect, pddl.AtomEffect):
+            return [(self._atom_template(effect, param_index), "true")]
+        if isinstance(effect, pddl.NegativeEffect):
+            return [(atom, "false") for atom, _ in self._compile_assignments(effect.atom, param_index)]
+        if isinstance(effect, pddl.ConditionalEffect):
+            condition = self._compile_condition(effect.condition, param_index)
+            return [(atom, ("when", condition, val)) for atom, val in self._compile_assignments(effect.effect, param_index)]
         return []
 
-    def _process_effects(self, effects: Any, var_map: Dict[str, str]) -> Optional[List[Tuple[float, str]]]:
-        if not effects: return [(1.0, "true")]
-        
-        all_children = []
-        container = self._get_list_content(effects)
-        if container is not None: all_children = container
-        else: all_children = [effects]
-
-        base_effects = []
-        prob_effect_obj = None
-
-        for child in all_children:
-            is_prob = False
-            if hasattr(child, 'outcomes') or hasattr(child, 'outcome'): is_prob = True
-            elif 'prob' in type(child).__name__.lower(): is_prob = True
-            
-            if is_prob: prob_effect_obj = child 
-            else: base_effects.append(child)
-
-        base_assigns = []
-        for b_eff in base_effects:
-            base_assigns.extend(self._effect_to_assignments(b_eff, var_map))
-
-        final_outcomes = []
-        if prob_effect_obj:
-            outcomes = getattr(prob_effect_obj, 'outcomes', getattr(prob_effect_obj, 'outcome', []))
-            total_prob = 0.0
-            if outcomes:
-                for outcome in outcomes:
-                    p_val = 1.0
-                    if hasattr(outcome, 'probability'):
-                        p_val = self._resolve_prob(outcome.probability)
-                    
-                    total_prob += p_val
-                    eff = getattr(outcome, 'effect', outcome)
-                    outcome_assigns = self._effect_to_assignments(eff, var_map)
-                    
-                    final_outcomes.append((p_val, outcome_assigns + base_assigns))
-            
-            if total_prob < (1.0 - 1e-6):
-                final_outcomes.append((1.0 - total_prob, base_assigns))
-        else:
-            final_outcomes.append((1.0, base_assigns))
-
+    def _compile_effects(self, effects: Any, param_index: Dict[str, int]) -> List[Tuple[float, List]]:
+        # Outcomes as (probability, assignments); deterministic effects are part of every outcome
+        if not effects: return [(1.0, [])]
+        children = effects.effects if isinstance(effects, pddl.ConjunctiveEffect) else (effects,)
+        base = []
+        probabilistic = None
+        for child in children:
+            if isinstance(child, pddl.ProbabilisticEffect): probabilistic = child
+            else: base.extend(self._compile_assignments(child, param_index))
+        if probabilistic is None:
+            return [(1.0, base)]
+
+        outcomes = []
+        total_prob = 0.0
+        for outcome in probabilistic.outcomes:
+            p_val = self._resolve_prob(outcome.probability)
+            total_prob += p_val
+            outcomes.append((p_val, self._compile_assignments(outcome.effect, param_index) + base))
+        if total_prob < (1.0 - 1e-6):
+            outcomes.append((1.0 - total_prob, base))
+        return outcomes
+
+    def _action_template(self, action: Any) -> Tuple[Tuple, List[Tuple[float, List]], List[Tuple[str, Tuple]]]:
+        # (guard, outcomes, atoms the precondition requires), compiled once per schema
+        if action.name not in self.action_templates:
+            param_index = {ptype.name: i for i, ptype in enumerate(action.parameters)}
+            positive = []
+            self._relaxed_preconditions(action.precondition, positive, [])
+            required = [(pred_name.replace('-', '_'), tuple(param_index.get(a, a.replace('-', '_')) for a in pred_args))
+                        for pred_name, pred_args in positive]
+            self.action_templates[action.name] = (self._compile_condition(action.precondition, param_index),
+                                                  self._compile_effects(action.effect, param_index), required)
+        return self.action_templates[action.name]
+
+    def _ground_atom(self, atom: Tuple[str, Tuple], args: List[str]) -> str:
+        name, slots = atom
+        if not slots: return name
+        return f"{name}_{'_'.join(args[s] if isinstance(s, int) else s for s in slots)}"
+
+    def _ground_condition(self, condition: Tuple, args: List[str]) -> str:
+        # Static atoms are folded to constants, so the connectives around them are simplified
+        kind = condition[0]
+        if kind == "atom":
+            atom = self._ground_atom(condition[1], args)
+            if atom not in self.ground_atom_set:
+                return "true" if atom in self.init_facts else "false"
+            return atom
+        if kind == "not":
+            inner = self._ground_condition(condition[1], args)
+            if inner in ("true", "false"): return "false" if inner == "true" else "true"
+            return f"!({inner})"
+        if kind == "or":
+            parts = [self._ground_condition(c, args) for c in condition[1]]
+            if "true" in parts: return "true"
+            parts = [p for p in parts if p != "false"]
+            return f"({' | '.join(parts)})" if parts else "false"
+        if kind == "and":
+            parts = [self._ground_condition(c, args) for c in condition[1]]
+            if "false" in parts: return "false"
+            parts = [p for p in parts if p != "true"]
+            return f"({' & '.join(parts)})" if parts else "true"
+        return kind
+
+    def _ground_value(self, value: Any, atom: str, args: List[str]) -> Optional[str]:
+        if isinstance(value, str): return value
+        _, condition, inner = value
+        cond_str = self._ground_condition(condition, args)
+        if cond_str == "false": return None
+        inner = self._ground_value(inner, atom, args)
+        if inner is None or cond_str == "true": return inner
+        return f"({cond_str} ? {inner} : {atom})"
+
+    def _ground_effects(self, outcomes: List[Tuple[float, List]], args: List[str]) -> List[Tuple[float, Dict[str, str]]]:
         results = []
-        for prob, assigns in final_outcomes:
+        for prob, assignments in outcomes:
             state_map = {}
-            for atom, val in assigns:
-                state_map[atom] = val
-            
-            if not state_map:
-                update_str = "true"
-            else:
-                parts = [f"({atom}' = {val})" for atom, val in state_map.items()]
-                update_str = " & ".join(parts)
-            results.append((prob, update_str))
+            for atom_template, value in assignments:
+                atom = self._ground_atom(atom_template, args)
+                # Deletes of never-reachable atoms are no-ops
+                if atom not in self.ground_atom_set: continue
+                val = self._ground_value(value, atom, args)
+                if val is not None: state_map[atom] = val
+            results.append((prob, state_map))
         return results
 
+    def _render_update(self, state_map: Dict[str, str], group_of: Dict[str, Tuple[str, int]]) -> str:
+        parts = []
+        group_assigns = defaultdict(list)
+        for atom, val in state_map.items():
+            if atom not in group_of:
+                parts.append(f"({atom}' = {val})")
+                continue
+            var, index = group_of[atom]
+            if var not in group_assigns: parts.append(var)
+            group_assigns[var].append((index, val))
+        for i, part in enumerate(parts):
+            if part not in group_assigns: continue
+            # Groups only contain atoms with unconditional effects, and at most one atom of a group is added
+            added = [index for index, val in group_assigns[part] if val == "true"]
+            if added:
+                parts[i] = f"({part}' = {added[0]})"
+            else:
+                deleted = " | ".join(f"{part} = {index}" for index, val in group_assigns[part])
+                parts[i] = f"({part}' = ({deleted}) ? 0 : {part})"
+        return " & ".join(parts) if parts else "true"
+
+    def _render_updates(self, outcomes: List[Tuple[float, Dict[str, str]]], group_of: Dict[str, Tuple[str, int]],
+                        schema: Optional[str] = None) -> str:
+        probabilities = self.outcome_probabilities.get(schema) or [prob for prob, _ in outcomes]
+        return " + ".join(f"{prob} : {self._render_update(state_map, group_of)}" for prob, (_, state_map) in zip(probabilities, outcomes))
+
+    def _lift_probabilities(self):
+        # Each parameter "schema:k" (or "schema" for k = 0) turns the probability of outcome k of
+        # the action schema into an undefined PRISM constant p_<schema>_<k>, whose value is given
+        # when checking the model (e.g. PRISM's -const). The last outcome that is not lifted takes
+        # the remaining probability, so the outcomes still sum to 1 for every value.
+        lifted = defaultdict(set)
+        for parameter in self.parameters:
+            schema, index = self._parse_parameter(parameter)
+            lifted[schema].add(index)
+        actions = {action.name: action for action in self.domain.actions}
+        for schema, indices in lifted.items():
+            if schema not in actions:
+                raise ValueError(f"Unknown action `{schema}` in parameter, expected one of {sorted(actions)}")
+            outcomes = self._action_template(actions[schema])[1]
+            if max(indices) >= len(outcomes):
+                raise ValueError(f"Action `{schema}` has {len(outcomes)} outcomes, cannot lift outcome {max(indices)}")
+            rest = [i for i in range(len(outcomes)) if i not in indices]
+            if not rest:
+                raise ValueError(f"Cannot lift every outcome of `{schema}`: one must take the remaining probability")
+            names = {i: self.parameter_name(f"{schema}:{i}") for i in sorted(indices)}
+            for i, name in names.items():
+                self.parameter_values[name] = outcomes[i][0]
+            fixed = sum(outcomes[i][0] for i in rest[:-1])
+            probabilities = [names.get(i, outcomes[i][0]) for i in range(len(outcomes))]
+            probabilities[rest[-1]] = f"({' - '.join([str(1.0 - fixed), *names.values()])})"
+            self.outcome_probabilities[schema] = probabilities
+
+    def _parse_parameter(self, parameter: str) -> Tuple[str, int]:
+        schema, _, index = parameter.partition(':')
+        return schema, int(index or 0)
+
+    def parameter_name(self, parameter: str) -> str:
+        """The PRISM constant of a lifted outcome probability "schema:k" (or "schema")."""
+        schema, index = self._parse_parameter(parameter)
+        return f"p_{self._predicate_to_prism(schema, [])}_{index}"
+
+    def _write_parameters(self) -> List[str]:
+        return [f"const double {name};" for name in self.parameter_values]
+
+    def _find_groups(self, commands: List[Tuple[List[str], List[Tuple[float, Dict[str, str]]]]],
+                     keep: Optional[Set[str]] = None) -> List[Tuple[str, List[str]]]:
+        # Mutex groups over the commands of one model: (required atoms, outcomes) per command
+        if not self.mutex_groups: return []
+        atom_args = self.atom_args if keep is None else {atom: self.atom_args[atom] for atom in keep}
+        actions = [(required, [state_map for _, state_map in outcomes]) for required, outcomes in commands]
+        groups = invariants.find_mutex_groups(atom_args, self.init_facts, actions)
+        named = []
+        for group in groups:
+            name = f"mutex_{len(named)}"
+            while name in self.ground_atom_set: name += "_"
+            named.append((name, group))
+        return named
+
     def ground_actions_logic(self):
+        self._relaxed_reachability()
         using_prob_setup = 'not_setup' in self.ground_atoms
 
         for action in self.domain.actions:
-            param_names = [ptype.name for ptype in action.parameters]
-            param_types = [ptype.type_name for ptype in action.parameters]
-            object_lists = [self._get_objects_for_type(t) for t in param_types]
+            guard_template, outcomes, required_atoms = self._action_template(action)
 
-            for args in itertools.product(*object_lists):
-                var_map = dict(zip(param_names, args))
+            for args in sorted(self.reachable_bindings[action.name]):
+                clean_args = [a.replace('-', '_') for a in args]
                 action_name = self._predicate_to_prism(action.name, list(args))
-                guard = self._translate_expression(action.precondition, var_map)
-                
+                guard = self._ground_condition(guard_template, clean_args)
+                # Never applicable (policies only pick applicable actions, see policy_commands)
+                if guard == "false": continue
+                precondition = guard
+
                 if using_prob_setup and action.name != 'prob_setup_init':
                     guard = f"({guard}) & !not_setup"
 
-                updates = self._process_effects(action.effect, var_map)
-                
-                if updates is not None:
-                    self.ground_actions.append({"name": action_name, "guard": guard, "updates": updates})
+                updates = self._ground_effects(outcomes, clean_args)
+                required = [atom for atom in (self._ground_atom(a, clean_args) for a in required_atoms) if atom in self.ground_atom_set]
+                self.ground_actions.append({"name": action_name, "schema": action.name, "args": args, "guard": guard,
+                                            "precondition": precondition, "updates": updates, "required": required})
 
         self.action_update_map = {action['name']: action['updates'] for action in self.ground_actions}
+        self.action_schema_map = {action['name']: action['schema'] for action in self.ground_actions}
+        self.action_precondition_map = {action['name']: action['precondition'] for action in self.ground_actions}
+        self.parsed_preconditions = {}
+        self._lift_probabilities()
+        # Index for unifying the action templates of policy rules with the ground actions
+        self.actions_by_schema = defaultdict(list)
+        for action in self.ground_actions:
+            self.actions_by_schema[self._predicate_to_prism(action['schema'], [])].append((action['args'], action['name']))
+
+    def _policy_bindings(self, action_template: str, object_lists: List[List[str]]) -> List[Tuple[Tuple[str, ...], str]]:
+        # Bind the numbered variables of a rule by unifying its action template with the
+        # ground actions; only variables that do not occur in the action are enumerated.
+        # Returns (objects for variables 1..n, ground action name) in object-product order.
+        template = action_template.replace('-', '_')
+        arity = len(object_lists)
+        allowed = [set(objs) for objs in object_lists]
+        position = [{} for _ in object_lists]
+        for i, objs in enumerate(object_lists):
+            for j, obj in reversed(list(enumerate(objs))): position[i][obj] = j
+
+        bindings = []
+        for schema, actions in self.actions_by_schema.items():
+            if template != schema and not template.startswith(schema + '_'): continue
+            tokens = template[len(schema) + 1:].split('_') if template != schema else []
+            for args, name in actions:
+                if len(args) != len(tokens): continue
+                binding = {}
+                for tok, arg in zip(tokens, args):
+                    if tok.isdigit() and 1 <= int(tok) <= arity:
+                        var = int(tok)
+                        if binding.setdefault(var, arg) != arg or arg not in allowed[var - 1]: break
+                    elif tok != arg.replace('-', '_'): break
+                else:
+                    bindings.append((binding, name))
 
-    def _write_initial_state(self) -> List[str]:
+        results = []
+        for binding, name in bindings:
+            free = [var for var in range(1, arity + 1) if var not in binding]
+            for values in itertools.product(*[object_lists[var - 1] for var in free]):
+                full = {**binding, **dict(zip(free, values))}
+                args = tuple(full[var] for var in range(1, arity + 1))
+                results.append((tuple(position[i][obj] for i, obj in enumerate(args)), args, name))
+        results.sort()
+        return [(args, name) for _, args, name in results]
+
+    def _ground_policy_guard(self, guard: expressions.Expr, args: Tuple[str, ...]) -> expressions.Expr:
+        # Replace the numbered segments of each atom by the bound objects and fold constants
+        values = {str(i + 1): obj.replace('-', '_') for i, obj in enumerate(args)}
+        def fold(atom: str):
+            parts = atom.split('_')
+            ground = '_'.join([parts[0]] + [values.get(part, part) for part in parts[1:]])
+            value = self._fold_constant_atom(ground)
+            return ("atom", ground) if value is None else value
+        return expressions.simplify(expressions.substitute(guard, fold))
+
+    def _referenced_atoms(self, text: str) -> Set[str]:
+        return {name for name in re.findall(r'\w+', text) if name in self.ground_atom_set}
+
+    def _cone_of_influence(self, roots: Set[str], actions: Iterable[str]) -> Set[str]:
+        # Closure of `roots` under "is assigned from": an atom is relevant if a relevant atom's
+        # update reads it. All other atoms can be dropped without changing the roots' behaviour.
+        reads = defaultdict(set)
+        for action in actions:
+            for _, state_map in self.action_update_map[action]:
+                for atom, val in state_map.items():
+                    reads[atom] |= self._referenced_atoms(val)
+        relevant = roots & self.ground_atom_set
+        frontier = list(relevant)
+        while frontier:
+            for atom in reads[frontier.pop()] - relevant:
+                relevant.add(atom)
+                frontier.append(atom)
+        return relevant
+
+    def _write_initial_state(self, groups: List[Tuple[str, List[str]]] = [], keep: Optional[Set[str]] = None) -> List[str]:
+        grouped = {atom for _, group in groups for atom in group}
         lines = []
-        init_facts = set()
-        for atom in self.problem.initial:
-            args = [arg.name for arg in atom.arguments]
-            init_facts.add(self._predicate_to_prism(atom.name, args))
-        
         for atom in self.ground_atoms:
-            val = "true" if atom in init_facts else "false"
+            if atom in grouped or (keep is not None and atom not in keep): continue
+            val = "true" if atom in self.init_facts else "false"
             lines.append(f"\t{atom} : bool init {val};")
+        # A mutex group is one int: 0 if none of its atoms holds, else the position of the true atom
+        for var, group in groups:
+            init = next((i + 1 for i, atom in enumerate(group) if atom in self.init_facts), 0)
+            lines.append(f"\t{var} : [0..{len(group)}] init {init};")
         return lines
 
-    def generate_goal_label(self) -> str:
+    def _write_atom_formulas(self, groups: List[Tuple[str, List[str]]]) -> List[str]:
+        # Grouped atoms stay available under their names for guards, labels, policies and properties
+        return [f"formula {atom} = ({var} = {i + 1});" for var, group in groups for i, atom in enumerate(group)]
+
+    def _group_index(self, groups: List[Tuple[str, List[str]]]) -> Dict[str, Tuple[str, int]]:
+        return {atom: (var, i + 1) for var, group in groups for i, atom in enumerate(group)}
+
+    def goal_expression(self) -> str:
         if not self.problem.goal: return ""
-        goal_expr = self._translate_expression(self.problem.goal, {})
-        return f'label "goal" = {goal_expr};'
+        return self._ground_condition(self._compile_condition(self.problem.goal, {}), [])
 
-    def generate_mdp(self) -> str:
-        lines = ["mdp", "", "module main"]
-        lines.extend(self._write_initial_state())
-        lines.append("")
+    def generate_goal_label(self) -> str:
+        if not self.problem.goal: return ""
+        return f'label "goal" = {self.goal_expression()};'
+
+    # The models are produced line by line, so that they can be written out as they are
+    # rendered instead of being held in memory as a whole (see write_mdp and write_dtmc)
+
+    def iter_mdp(self) -> Iterator[str]:
+        groups = self._find_groups([(action['required'], action['updates']) for action in self.ground_actions])
+        group_of = self._group_index(groups)
+        yield "mdp"
+        yield ""
+        if self.parameter_values:
+            yield from self._write_parameters()
+            yield ""
+        if groups:
+            yield from self._write_atom_formulas(groups)
+            yield ""
+        yield "module main"
+        yield from self._write_initial_state(groups)
+        yield ""
         for action in self.ground_actions:
-            updates_strs = []
-            for prob, update in action['updates']:
-                updates_strs.append(f"{prob} : {update}")
-            full_update = " + ".join(updates_strs)
-            lines.append(f"\t[{action['name']}] {action['guard']} -> {full_update};")
-        lines.append("endmodule")
-        return "\n".join(lines)
-    
-    def generate_dtmc(self, policy: dict) -> str:
-        lines = ["dtmc", "", "module main"]
-        lines.extend(self._write_initial_state())
+            full_update = self._render_updates(action['updates'], group_of, action['schema'])
+            yield f"\t[{action['name']}] {action['guard']} -> {full_update};"
+        yield "endmodule"
 
+    def generate_mdp(self) -> str:
+        return "\n".join(self.iter_mdp())
+
+    def write_mdp(self, f: TextIO):
+        _write_lines(f, self.iter_mdp())
+
+    def _applicable(self, guard: expressions.Expr, action: str) -> expressions.Expr:
+        # A rule only fires where its action is applicable: the guard is conjoined with the
+        # action's (statically folded) precondition, as in the MDP
+        if action not in self.parsed_preconditions:
+            self.parsed_preconditions[action] = expressions.parse(self.action_precondition_map[action])
+        return expressions.simplify(("and", (guard, self.parsed_preconditions[action])))
+
+    def policy_commands(self, policy: dict) -> List[Tuple[int, str, expressions.Expr, str]]:
+        # The commands of the policy's DTMC as (rule index, label, ground guard, ground action).
+        # The probabilistic setup command comes first with rule index -1; the guards of rule
+        # commands leave out the `!not_setup` they all get in the model. Every rule guard
+        # includes its action's precondition, so a rule whose action is not applicable does not
+        # fire (and the state falls through to the next rules, or to the `stuck` self-loop).
+        commands = []
         if "not_setup" in self.ground_atoms and "prob_setup_init" in self.action_update_map:
-            setup_updates = self.action_update_map["prob_setup_init"]
-            setup_str = " + ".join([f"{prob} : {update}" for prob, update in setup_updates])
-            lines.append(f"\t[prob_setup_init] not_setup -> {setup_str};")
-            
-        used_guards = []
+            commands.append((-1, "prob_setup_init", ("atom", "not_setup"), "prob_setup_init"))
+
+        action_param_map = {a.name: [p.type_name for p in a.parameters] for a in self.domain.actions}
         
-        for rule in policy:
+        for rule_index, rule in enumerate(policy):
             guard_str = rule['if']
             action_str = rule['then']
             rule_name = rule['name'].replace('-', '_').replace(' ', '_')
@@ -382,19 +684,13 @@ class PPDDLToPRISM:
             guard_vars = get_vars(guard_str)
             action_vars = get_vars(action_str)
             all_vars = set(guard_vars + action_vars)
-            
-            setup_guard = "& !not_setup" if "not_setup" in self.ground_atoms else ""
 
             if not all_vars:
                 clean_action = action_str.replace('-', '_')
                 if clean_action in self.action_update_map:
-                    updates = self.action_update_map[clean_action]
-                    update_str = " + ".join([f"{p} : {u}" for p, u in updates])
-                    clean_guard = guard_str.replace('-', '_') 
-                    
-                    full_guard = f"{clean_guard} {setup_guard}"
-                    lines.append(f"\t[{rule_name}] {full_guard} -> {update_str};")
-                    used_guards.append(f"({clean_guard})")
+                    clean_guard = self._applicable(self._fold_policy_guard(guard_str.replace('-', '_')), clean_action)
+                    if clean_guard == expressions.FALSE: continue
+                    commands.append((rule_index, rule_name, clean_guard, clean_action))
                 continue
 
             max_arity = max(all_vars)
@@ -428,7 +724,6 @@ class PPDDLToPRISM:
             if act_match:
                 act_name = act_match.group(1)
                 act_args = [a for a in act_match.group(2).split('_') if a]
-                action_param_map = {a.name: [p.type_name for p in a.parameters] for a in self.domain.actions}
                 param_types = action_param_map.get(act_name)
                 if param_types and len(act_args) == len(param_types):
                     for i, arg_idx_str in enumerate(act_args):
@@ -438,49 +733,106 @@ class PPDDLToPRISM:
                                 argument_types[idx] = param_types[i]
 
             object_lists = [self._get_objects_for_type(t) for t in argument_types]
+            guard_expr = expressions.parse(guard_str)
             
-            for args in itertools.product(*object_lists):
-                arg_map = {str(i+1): obj for i, obj in enumerate(args)}
-                sorted_vars = sorted(arg_map.keys(), key=len, reverse=True)
-
-                grounded_guard = guard_str
-                grounded_action = action_str
-
-                for v in sorted_vars:
-                    val = arg_map[v]
-                    grounded_guard = grounded_guard.replace(f"_{v}", f"_{val}")
-                    grounded_action = grounded_action.replace(f"_{v}", f"_{val}")
-
-                grounded_action = grounded_action.replace('-', '_')
-                grounded_guard = grounded_guard.replace('-', '_')
-
-                if grounded_action not in self.action_update_map:
+            for args, grounded_action in self._policy_bindings(action_str, object_lists):
+                grounded_guard = self._applicable(self._ground_policy_guard(guard_expr, args), grounded_action)
+                if grounded_guard == expressions.FALSE:
                     continue
-
-                action_update = self.action_update_map[grounded_action]
-                update_str = " + ".join([f"{p} : {u}" for p, u in action_update])
-                
-                full_guard = f"{grounded_guard} {setup_guard}"
-                lines.append(f"\t[{rule_name}] {full_guard} -> {update_str};")
-                used_guards.append(f"({grounded_guard})")
+                commands.append((rule_index, rule_name, grounded_guard, grounded_action))
+        return commands
+
+    def iter_dtmc(self, policy: dict, properties: Optional[List[str]] = None) -> Iterator[str]:
+        # Commands are collected as (label, guard, ground action, atoms the guard requires) and
+        # rendered once the mutex groups of this DTMC are known.
+        # Given the properties to check, the DTMC is reduced to their cone of influence.
+        # Every distinct grounded guard is defined once as a formula and each rule's
+        # disjunction of guards as another, so the catch-all only references the rules
+        guard_formulas = {}
+        rule_guards = defaultdict(list)
+
+        def guard_formula(guard: str) -> str:
+            if re.fullmatch(r'\w+', guard): return guard
+            if guard not in guard_formulas:
+                guard_formulas[guard] = f"policy_guard_{len(guard_formulas)}"
+            return guard_formulas[guard]
+
+        setup_guard = "& !not_setup" if "not_setup" in self.ground_atoms else ""
+        commands = []
+        guard_atoms = set()
+        for rule_index, label, guard, action in self.policy_commands(policy):
+            if rule_index < 0:
+                commands.append((label, expressions.to_prism(guard), action, expressions.required_atoms(guard)))
+                continue
+            expressions.atoms(guard, guard_atoms)
+            formula = guard_formula(expressions.to_prism(guard))
+            commands.append((label, f"{formula} {setup_guard}", action, expressions.required_atoms(guard)))
+            rule_guards[rule_index].append(formula)
+
+        goal_label = self.generate_goal_label()
+        updates = {action: self.action_update_map[action] for _, _, action, _ in commands}
+        keep = None
+        if properties is not None:
+            # Guards decide which commands are enabled (and so the choice probabilities), so they stay
+            roots = guard_atoms | {"not_setup"} | self._referenced_atoms(goal_label)
+            roots |= set().union(*(self._referenced_atoms(prop) for prop in properties))
+            keep = self._cone_of_influence(roots, updates)
+            updates = {action: [(p, {atom: val for atom, val in state_map.items() if atom in keep}) for p, state_map in outcomes]
+                       for action, outcomes in updates.items()}
+
+        groups = self._find_groups([(required, updates[action]) for _, _, action, required in commands], keep)
+        group_of = self._group_index(groups)
+
+        yield "dtmc"
+        yield ""
+        formulas = self._write_parameters() + self._write_atom_formulas(groups)
+        formulas += [f"formula {name} = {guard};" for guard, name in guard_formulas.items()]
+        for i, formulas_of_rule in rule_guards.items():
+            formulas.append(f"// {policy[i]['name']}")
+            formulas.append(f"formula policy_rule_{i} = {' | '.join(dict.fromkeys(formulas_of_rule))};")
+        if formulas:
+            yield from formulas
+            yield ""
+
+        yield "module main"
+        yield from self._write_initial_state(groups, keep)
+        for label, guard, action, _ in commands:
+            yield f"\t[{label}] {guard} -> {self._render_updates(updates[action], group_of, self.action_schema_map[action])};"
 
         # 2. Add Catch-All (Stuck) Transition [Self-Loop]
         # Fires if not setup and NO user rule matches.
-        if used_guards:
-            negated_policies = " & ".join([f"!{g}" for g in used_guards])
-            setup_guard = "& !not_setup" if "not_setup" in self.ground_atoms else ""
-            lines.append(f"\t[stuck] {negated_policies} {setup_guard} -> 1.0 : true;")
+        if rule_guards:
+            negated_policies = " & ".join([f"!policy_rule_{i}" for i in rule_guards])
+            yield f"\t[stuck] {negated_policies} {setup_guard} -> 1.0 : true;"
         
-        lines.append("endmodule")
-        lines.append("")
+        yield "endmodule"
+        yield ""
         
-        if (g := self.generate_goal_label()): lines.append(g)
+        if goal_label: yield goal_label
         
         print('Done generating dtmc')
-        return "\n".join(lines)
+
+    def generate_dtmc(self, policy: dict, properties: Optional[List[str]] = None) -> str:
+        return "\n".join(self.iter_dtmc(policy, properties))
+
+    def write_dtmc(self, f: TextIO, policy: dict, properties: Optional[List[str]] = None):
+        _write_lines(f, self.iter_dtmc(policy, properties))
+
+def _write_lines(f: TextIO, lines: Iterable[str]):
+    # Same text as "\n".join(lines), without building it
+    for i, line in enumerate(lines):
+        if i: f.write("\n")
+        f.write(line)
+
+def ground_problem(domain_file: str, problem_file: str, mutex_groups: bool = True, parameters: Optional[List[str]] = None) -> PPDDLToPRISM:
+    # The grounded translator is all generate_dtmc needs, so it can be shared by every policy
+    translator = PPDDLToPRISM(domain_file, problem_file, mutex_groups, parameters)
+    with profiling.phase("ground_state_variables"):
+        translator.ground_state_variables()
+    with profiling.phase("ground_actions_logic"):
+        translator.ground_actions_logic()
+    return translator
 
 def pddl_to_mdp(domain_file: str, problem_file: str) -> Tuple[str, PPDDLToPRISM]:
-    translator = PPDDLToPRISM(domain_file, problem_file)
-    translator.ground_state_variables()
-    translator.ground_actions_logic()
+    translator = ground_problem(domain_file, problem_file)
     return translator.generate_mdp(), translator
\ No newline at end of file